@@ -0,0 +1,264 @@
+"""
+Admission control for transcription requests.
+Bounds the audio (and, optionally, the memory) a worker process takes on at
+once. Requests over the limit wait in one of two priority lanes:
+interactive requests (live microphone audio) are admitted before any bulk
+request (file uploads), and bulk requests may only use part of the budget so
+a burst of uploads can't lock live audio out. When a lane's wait queue is
+full the request is refused with 429; when it waits too long, with 503.
+Both carry a Retry-After estimate.
+"""
+import collections
+import contextlib
+import math
+import os
+import threading
+import time
+from metrics import get_metrics
+
+
+# Lanes in priority order
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = (INTERACTIVE, BULK)
+
+# Pipeline priority for each lane's jobs (lower runs first)
+LANE_PRIORITIES = {
+    INTERACTIVE: 0,
+    BULK: 10
+}
+
+# Rough peak memory per second of audio while it is transcribed: the float32
+# waveform (64 KB/s) plus mel features, padding and decoder copies
+BYTES_PER_AUDIO_SECOND = 256 * 1024
+
+# Starting estimate of wall-clock seconds per audio second, replaced by
+# observed values as requests finish
+DEFAULT_SECONDS_PER_AUDIO_SECOND = 0.25
+
+# Weight of the newest observation in the service-rate average
+SERVICE_RATE_ALPHA = 0.2
+
+# Bounds on the Retry-After hint, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 300
+
+
+def _env_number(name, default, cast=int):
+    """Read a positive number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def resident_memory_mb(pid='self'):
+    """
+    Get a process's resident memory.
+
+    Args:
+        pid (int): Process to measure (default: this one)
+
+    Returns:
+        float: Resident set size in MB, or None where /proc is unavailable
+    """
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class AdmissionRejected(RuntimeError):
+    """A request was refused because the process is saturated."""
+
+    def __init__(self, message, status_code, retry_after):
+        """
+        Args:
+            message (str): Error message for the client
+            status_code (int): 429 (lane queue full) or 503 (wait timed out)
+            retry_after (int): Seconds the client should wait before retrying
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Admits transcription requests within an audio and memory budget."""
+
+    def __init__(self, max_audio_seconds=None, max_memory_mb=None, max_waiting=None,
+                 queue_timeout=None, bulk_share=None):
+        """
+        Args:
+            max_audio_seconds (float): Audio seconds admitted at once
+                (ADMISSION_MAX_AUDIO_SECONDS, default: 1200)
+            max_memory_mb (float): Resident memory above which new requests
+                wait (ADMISSION_MAX_MEMORY_MB, default: no memory check)
+            max_waiting (int): Requests allowed to wait in each lane before
+                new ones get 429 (ADMISSION_MAX_WAITING, default: 16)
+            queue_timeout (float): Seconds a request may wait before it gets
+                503 (ADMISSION_QUEUE_TIMEOUT, default: 30)
+            bulk_share (float): Fraction of the audio budget bulk requests
+                may use (ADMISSION_BULK_SHARE, default: 0.75)
+        """
+        self.max_audio_seconds = max_audio_seconds or _env_number('ADMISSION_MAX_AUDIO_SECONDS', 1200.0, float)
+        self.max_memory_mb = max_memory_mb or _env_number('ADMISSION_MAX_MEMORY_MB', 0.0, float) or None
+        self.max_waiting = max_waiting or _env_number('ADMISSION_MAX_WAITING', 16)
+        self.queue_timeout = queue_timeout or _env_number('ADMISSION_QUEUE_TIMEOUT', 30.0, float)
+        self.bulk_share = min(1.0, bulk_share or _env_number('ADMISSION_BULK_SHARE', 0.75, float))
+
+        self._condition = threading.Condition()
+        self._in_flight_audio = 0.0
+        self._in_flight = {lane: 0 for lane in LANES}
+        self._waiting = {lane: collections.deque() for lane in LANES}  # FIFO per lane
+        self._seconds_per_audio_second = DEFAULT_SECONDS_PER_AUDIO_SECOND
+        self._metrics = get_metrics()
+
+    def _lane(self, lane):
+        if lane not in LANES:
+            raise ValueError(f"Unknown admission lane: {lane}")
+        return lane
+
+    def _retry_after(self):
+        """Seconds until the audio in flight should have drained (lock held)."""
+        seconds = math.ceil(self._in_flight_audio * self._seconds_per_audio_second)
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, seconds))
+
+    def _fits(self, lane, audio_seconds):
+        """Whether a request can start now (lock held)."""
+        # Interactive requests go first; bulk waits while any are queued
+        if lane == BULK and self._waiting[INTERACTIVE]:
+            return False
+        # A request larger than the whole budget still runs, alone
+        if not any(self._in_flight.values()):
+            return True
+        budget = self.max_audio_seconds * (self.bulk_share if lane == BULK else 1.0)
+        if self._in_flight_audio + audio_seconds > budget:
+            return False
+        if self.max_memory_mb:
+            resident = resident_memory_mb()
+            expected = audio_seconds * BYTES_PER_AUDIO_SECOND / (1024 * 1024)
+            if resident is not None and resident + expected > self.max_memory_mb:
+                return False
+        return True
+
+    def check(self, lane):
+        """
+        Refuse a request early, before its upload is read, if its lane's
+        wait queue is already full.
+
+        Args:
+            lane (str): 'interactive' or 'bulk'
+
+        Raises:
+            AdmissionRejected: With status 429 if the lane is full
+        """
+        lane = self._lane(lane)
+        with self._condition:
+            if len(self._waiting[lane]) >= self.max_waiting:
+                self._metrics.increment(f'admission.rejected.{lane}.429')
+                raise AdmissionRejected(
+                    'Too many requests are waiting to be transcribed; try again later',
+                    429, self._retry_after()
+                )
+
+    @contextlib.contextmanager
+    def admit(self, lane, audio_seconds):
+        """
+        Hold a share of the budget for the duration of the with-block,
+        waiting for one if needed.
+
+        Args:
+            lane (str): 'interactive' or 'bulk'
+            audio_seconds (float): Duration of the request's audio
+
+        Raises:
+            AdmissionRejected: 429 if the lane's wait queue is full, 503 if
+                the request waited longer than the queue timeout
+        """
+        lane = self._lane(lane)
+        wait_start = time.perf_counter()
+        with self._condition:
+            waiting = self._waiting[lane]
+            # Requests already waiting in this lane keep their place
+            if waiting or not self._fits(lane, audio_seconds):
+                if len(waiting) >= self.max_waiting:
+                    self._metrics.increment(f'admission.rejected.{lane}.429')
+                    raise AdmissionRejected(
+                        'Too many requests are waiting to be transcribed; try again later',
+                        429, self._retry_after()
+                    )
+                ticket = object()
+                waiting.append(ticket)
+                self._metrics.set_gauge(f'admission.waiting.{lane}', len(waiting))
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: waiting[0] is ticket and self._fits(lane, audio_seconds),
+                        timeout=self.queue_timeout
+                    )
+                finally:
+                    waiting.remove(ticket)
+                    self._metrics.set_gauge(f'admission.waiting.{lane}', len(waiting))
+                    # The next request in line (or a bulk one behind this
+                    # interactive one) may be able to start now
+                    self._condition.notify_all()
+                if not admitted:
+                    self._metrics.increment(f'admission.rejected.{lane}.503')
+                    raise AdmissionRejected(
+                        'Server is at capacity; try again later', 503, self._retry_after()
+                    )
+            self._in_flight_audio += audio_seconds
+            self._in_flight[lane] += 1
+            self._metrics.set_gauge('admission.in_flight_audio_seconds', round(self._in_flight_audio, 2))
+        self._metrics.increment(f'admission.admitted.{lane}')
+        self._metrics.record_timing(f'admission.{lane}_wait_seconds', time.perf_counter() - wait_start)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._condition:
+                self._in_flight_audio = max(0.0, self._in_flight_audio - audio_seconds)
+                self._in_flight[lane] -= 1
+                if audio_seconds > 0:
+                    self._seconds_per_audio_second = (
+                        (1 - SERVICE_RATE_ALPHA) * self._seconds_per_audio_second
+                        + SERVICE_RATE_ALPHA * elapsed / audio_seconds
+                    )
+                self._metrics.set_gauge('admission.in_flight_audio_seconds', round(self._in_flight_audio, 2))
+                self._condition.notify_all()
+
+    def retry_after(self):
+        """Seconds a refused client should wait before retrying."""
+        with self._condition:
+            return self._retry_after()
+
+    def status(self):
+        """Admission limits, audio in flight and waiting requests per lane."""
+        with self._condition:
+            return {
+                'max_audio_seconds': self.max_audio_seconds,
+                'max_memory_mb': self.max_memory_mb,
+                'resident_memory_mb': round(resident_memory_mb() or 0, 1) or None,
+                'in_flight_audio_seconds': round(self._in_flight_audio, 2),
+                'in_flight': dict(self._in_flight),
+                'waiting': {lane: len(waiting) for lane, waiting in self._waiting.items()},
+                'retry_after_seconds': self._retry_after()
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Get the process-wide admission controller."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
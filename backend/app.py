@@ -1,12 +1,40 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
+import contextlib
+import json
 import os
+import shutil
 import tempfile
-from werkzeug.utils import secure_filename
-from preprocess_audio import preprocess_audio
-from transcribe_whisper import WhisperTranscriber
+import time
+import uuid
+from upload_stream import receive_audio_upload, UploadError
+from preprocess_audio import AUDIO_EXTENSIONS, TARGET_SAMPLE_RATE, load_audio, audio_duration
+from decoder_service import get_decoder_service, DecoderBusyError
 from multilingual_transcribe import MultilingualTranscriber
+from transcription_pipeline import TranscriptionPipeline
+from model_router import ModelRouter
+from admission import get_admission_controller, AdmissionRejected, INTERACTIVE, BULK, LANE_PRIORITIES
+from cancellation import CancelToken, TranscriptionCancelled
+from live_sessions import LiveSessionStore, LiveSessionError
+from mel_cache import get_mel_cache
+from encoder_cache import get_encoder_cache
+import batched_decoding
+from audio_conditioning import conditioning_enabled
+from decoding_profiles import decoding_options, default_profile
+from nlp_corrector import get_corrector_manager
+from transcript_store import get_transcript_store, parse_timestamp, DEFAULT_LIMIT
+from captions import CAPTION_FORMATS, caption_options, reflow, render
+from vocabulary import get_vocabulary_store
+from batch_transcribe import BatchTranscriber, find_audio_files, extract_archive
 from translate import TextTranslator
+from response_format import (
+    parse_flag, requested_format, compact_segments, compact_transcription,
+    ndjson_line, NDJSON_MIMETYPE
+)
+from runtime_config import get_runtime_config, apply_torch_threads, effective_settings
+from model_registry import get_registry
+from metrics import get_metrics, process_start_time
 
 app = Flask(__name__)
 CORS(app)
@@ -17,201 +45,390 @@ app.config['JSON_AS_ASCII'] = False
 # Configuration
 UPLOAD_FOLDER = tempfile.gettempdir()
 OUTPUT_FOLDER = 'output'
-ALLOWED_EXTENSIONS = {'mp3', 'wav', 'webm', 'ogg', 'm4a', 'flac', 'aac', 'wma'}
+ALLOWED_EXTENSIONS = AUDIO_EXTENSIONS
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+BATCH_FOLDER = os.path.join(OUTPUT_FOLDER, 'batch')
+BATCH_INPUT_ROOT = os.environ.get('BATCH_INPUT_ROOT')  # Server directory manifests may reference
+BATCH_MAX_EXTRACTED_SIZE = 2 * 1024 * 1024 * 1024  # 2GB uncompressed per archive
+REQUEST_DEADLINE = os.environ.get('REQUEST_DEADLINE_SECONDS')  # Default per-request deadline (unset: none)
+
+# Size torch thread pools before any model work (gunicorn also does this per worker)
+runtime_config = get_runtime_config()
+apply_torch_threads(runtime_config)
 
-# Initialize transcribers (loads model once at startup)
+# Initialize the transcriber (models are shared through the registry)
 print("Loading Whisper model...")
-transcriber = WhisperTranscriber(model_size="base")  # Original transcriber
-multilingual_transcriber = MultilingualTranscriber(model_size="base")  # Advanced multilingual transcriber
+multilingual_transcriber = MultilingualTranscriber(model_size=runtime_config.model_size)
+
+# Pick a model size per request (tier, duration, language, load); with
+# ROUTER_MODELS unset only the configured model is used
+model_router = ModelRouter(default_size=runtime_config.model_size)
+model_router.preload()
+
+# Every transcription endpoint runs through this pipeline, which overlaps
+# decode, inference and NLP correction across concurrent requests
+# (worker threads start on first use, i.e. inside each forked worker)
+transcription_pipeline = TranscriptionPipeline(multilingual_transcriber, router=model_router)
+
+# Bound the audio each worker takes on at once; live audio is admitted ahead of uploads
+admission = get_admission_controller()
+
+# Incremental live sessions: each chunk only re-transcribes the uncommitted tail
+live_sessions = LiveSessionStore(multilingual_transcriber)
+
+# Per-tenant custom vocabularies (hotwords)
+vocabulary_store = get_vocabulary_store()
+
+# Searchable index of saved transcripts
+transcript_store = get_transcript_store()
 
 # Initialize translator
 translator = TextTranslator()
 
+# Start the decoder service (checks for FFmpeg once and bounds concurrent decodes)
+decoder_service = get_decoder_service()
+
 # Create output directory
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+metrics = get_metrics()
+metrics.record_startup('app_ready_seconds', round(time.time() - process_start_time(), 3))
+
+@app.after_request
+def record_first_request(response):
+    """Record time-to-first-request for this process."""
+    metrics.mark_request_complete()
+    return response
+
+def request_vocabulary(form):
+    """
+    Vocabulary for a transcription request: the tenant's stored terms
+    ('tenant' field or X-Tenant-ID header) plus any comma-separated
+    'hotwords' sent with the request.
+    
+    Raises:
+        ValueError: If the tenant id is invalid
+    """
+    tenant = form.get('tenant') or request.headers.get('X-Tenant-ID')
+    return vocabulary_store.for_request(tenant, form.get('hotwords'))
+
+def request_diarization(form, response_format):
+    """
+    Diarization options of a transcription request: 'diarize' (flag) and
+    'speakers' (known number of speakers, optional).
+    
+    Returns:
+        tuple: (diarize, num_speakers)
+    
+    Raises:
+        ValueError: If 'speakers' is not a positive integer, or diarization
+            is asked for with a streamed (ndjson) response
+    """
+    diarize = parse_flag(form.get('diarize'))
+    if not diarize:
+        return False, None
+    if response_format == 'ndjson':
+        raise ValueError('diarize is not available with format=ndjson')
+    speakers = form.get('speakers')
+    if not speakers:
+        return True, None
+    try:
+        num_speakers = int(speakers)
+    except ValueError:
+        num_speakers = 0
+    if num_speakers < 1:
+        raise ValueError('speakers must be a positive integer')
+    return True, num_speakers
+
+def route_request(form, audio_path, force_language=None):
+    """
+    Choose the model for a transcription request from its 'tier' field
+    ('fast', 'balanced' or 'accurate'), the audio duration and language,
+    and the current load. Release the decision with model_router.release().
+    
+    Raises:
+        ValueError: If the tier is invalid
+    """
+    audio = None
+    if model_router.enabled and model_router.detect_language_enabled and not force_language:
+        audio = load_audio(audio_path)
+    duration = round(len(audio) / TARGET_SAMPLE_RATE, 2) if audio is not None else audio_duration(audio_path)
+    return model_router.route(
+        duration, tier=(form.get('tier') or '').strip().lower() or None,
+        language=force_language, audio=audio
+    )
+
+def rejected_response(error):
+    """JSON error response for a request refused by admission control."""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.status_code = error.status_code
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def request_cancel_token():
+    """
+    Cancellation token for a transcription request. It trips when the
+    client disconnects or when the deadline passes: the X-Request-Deadline
+    header (seconds from now), or REQUEST_DEADLINE_SECONDS by default.
+    Call this before reading the upload so the deadline covers it.
+    
+    Raises:
+        ValueError: If the deadline is not a positive number
+    """
+    value = request.headers.get('X-Request-Deadline') or REQUEST_DEADLINE
+    deadline = None
+    if value:
+        try:
+            deadline = float(value)
+        except ValueError:
+            deadline = 0
+        if deadline <= 0:
+            raise ValueError('Invalid X-Request-Deadline: expected a positive number of seconds')
+    return CancelToken.for_request(request.environ, deadline)
+
+def cancelled_response(error):
+    """Error response for a transcription stopped by its cancel token."""
+    metrics.increment(f'requests.cancelled.{error.reason}')
+    print(f"Transcription stopped: {error}")
+    # 499: client closed the request (nobody is left to read it)
+    status_code = 504 if error.reason == 'deadline' else 499
+    return jsonify({'error': str(error)}), status_code
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/api/upload', methods=['POST'])
-def upload_audio():
-    """Handle audio file upload and transcription"""
-    uploaded_file_path = None
-    cleaned_audio_path = None
+def transcription_request(lane, respond, action, **upload_options):
+    """
+    Run a transcription endpoint: refuse early when its admission lane is
+    full, read the upload, call respond(upload, cancel, held) for the
+    endpoint's own options and response, then map errors to responses and
+    clean up. held (an ExitStack) releases what respond takes on (admission
+    slot, routing decision) once the response is done.
+    
+    Args:
+        lane (str): Admission lane (INTERACTIVE or BULK)
+        respond (callable): Builds the response from the received upload
+        action (str): What the endpoint does, for error logs
+        **upload_options: Passed to receive_audio_upload()
+    """
+    upload = None
+    held = contextlib.ExitStack()
     
     try:
-        # Check if file is present in request
-        if 'audio' not in request.files:
-            return jsonify({'error': 'No audio file provided'}), 400
-        
-        file = request.files['audio']
-        
-        # Check if file is selected
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        # Check if file type is allowed
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Allowed types: ' + ', '.join(ALLOWED_EXTENSIONS)}), 400
-        
-        # Get language preference from request (optional)
-        language = request.form.get('language', None)
-        if language == 'auto':
-            language = None
-        
-        # Save file securely
-        filename = secure_filename(file.filename)
-        uploaded_file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(uploaded_file_path)
-        
-        print(f"Processing file: {filename}")
-        if language:
-            print(f"Expected language: {language}")
-        
-        # Preprocess audio (convert to 16kHz mono WAV)
-        cleaned_audio_path = preprocess_audio(uploaded_file_path)
-        
-        # Transcribe audio using Whisper with language hint
-        result = transcriber.transcribe(cleaned_audio_path, language=language)
-        
-        # Clean up temporary files
-        if uploaded_file_path and os.path.exists(uploaded_file_path):
-            os.remove(uploaded_file_path)
-        if cleaned_audio_path and os.path.exists(cleaned_audio_path):
-            os.remove(cleaned_audio_path)
-        
-        return jsonify({
-            'success': True,
-            'transcript': result['transcript'],
-            'language': result['language'],
-            'segments': result['segments']
-        }), 200
-        
+        # Refuse before reading the body when the lane is already full
+        admission.check(lane)
+        try:
+            cancel = request_cancel_token()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stream the upload straight into the decoder (16kHz mono WAV)
+        upload = receive_audio_upload(request, **upload_options)
+        return respond(upload, cancel, held)
+        
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except TranscriptionCancelled as e:
+        return cancelled_response(e)
+    except LiveSessionError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except DecoderBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except UploadError as e:
+        # Recordings from the browser have no file name to complain about
+        missing = e.status_code == 400 and 'default_filename' in upload_options
+        return jsonify({'error': 'No audio data provided' if missing else str(e)}), e.status_code
     except Exception as e:
-        # Clean up temporary files in case of error
-        if uploaded_file_path and os.path.exists(uploaded_file_path):
-            os.remove(uploaded_file_path)
-        if cleaned_audio_path and os.path.exists(cleaned_audio_path):
-            os.remove(cleaned_audio_path)
-        
-        print(f"Error processing audio: {str(e)}")
+        print(f"Error {action}: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        held.close()
+        # Clean up temporary files
+        if upload:
+            upload.cleanup()
+
+def plain_transcription(upload, cancel, held, lane, decoding, word_timestamps=False):
+    """
+    Transcribe an upload without NLP correction or saving the transcript
+    (/api/upload and /api/live-record), on the configured model.
+    
+    Returns:
+        dict: {'transcript', 'language', 'segments'}
+    """
+    # Get language preference from request (optional)
+    language = upload.form.get('language', None)
+    if language == 'auto':
+        language = None
+    if language:
+        print(f"Expected language: {language}")
+    
+    held.enter_context(admission.admit(lane, audio_duration(upload.audio_path)))
+    result = transcription_pipeline.transcribe(
+        upload.audio_path,
+        force_language=language,
+        word_timestamps=word_timestamps,
+        priority=LANE_PRIORITIES[lane],
+        cancel=cancel,
+        decoding=decoding,
+        correct=False,
+        persist=False
+    )
+    return {
+        'transcript': result['raw_text'],
+        'language': result['language'],
+        'segments': result['raw_segments']
+    }
+
+@app.route('/api/upload', methods=['POST'])
+def upload_audio():
+    """Handle audio file upload and transcription"""
+    
+    def respond(upload, cancel, held):
+        # Optional per-word timings and compact (columnar) response
+        word_timestamps = parse_flag(upload.form.get('word_timestamps'))
+        try:
+            response_format = requested_format(upload.form)
+            _, decoding = decoding_options(upload.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if response_format == 'ndjson':
+            return jsonify({'error': 'Streamed (ndjson) responses are only available from /api/transcribe'}), 400
+        
+        print(f"Processing file: {upload.filename}")
+        result = plain_transcription(upload, cancel, held, BULK, decoding, word_timestamps)
+        
+        if response_format == 'compact':
+            body = {
+                'success': True,
+                'format': 'compact',
+                'transcript': result['transcript'],
+                'language': result['language']
+            }
+            body.update(compact_segments(result['segments']))
+            return jsonify(body), 200
+        
+        return jsonify({'success': True, **result}), 200
+    
+    return transcription_request(BULK, respond, 'processing audio', allowed_extensions=ALLOWED_EXTENSIONS)
 
 @app.route('/api/live-record', methods=['POST'])
 def live_record():
     """Handle live microphone recording and transcription"""
-    uploaded_file_path = None
-    cleaned_audio_path = None
     
-    try:
-        # Check if file is present in request
-        if 'audio' not in request.files:
-            return jsonify({'error': 'No audio data provided'}), 400
-        
-        file = request.files['audio']
-        
-        # Get language preference from request (optional)
-        language = request.form.get('language', None)
-        if language == 'auto':
-            language = None
-        
-        # Save file temporarily
-        filename = secure_filename('recording.webm')
-        uploaded_file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(uploaded_file_path)
+    def respond(upload, cancel, held):
+        try:
+            _, decoding = decoding_options(upload.form, default_profile(live=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         print("Processing live recording...")
-        if language:
-            print(f"Expected language: {language}")
-        
-        # Preprocess audio (convert to 16kHz mono WAV)
-        cleaned_audio_path = preprocess_audio(uploaded_file_path)
-        
-        # Transcribe audio using Whisper with language hint
-        result = transcriber.transcribe(cleaned_audio_path, language=language)
-        
-        # Clean up temporary files
-        if uploaded_file_path and os.path.exists(uploaded_file_path):
-            os.remove(uploaded_file_path)
-        if cleaned_audio_path and os.path.exists(cleaned_audio_path):
-            os.remove(cleaned_audio_path)
-        
-        return jsonify({
-            'success': True,
-            'transcript': result['transcript'],
-            'language': result['language'],
-            'segments': result['segments']
-        }), 200
-        
-    except Exception as e:
-        # Clean up temporary files in case of error
-        if uploaded_file_path and os.path.exists(uploaded_file_path):
-            os.remove(uploaded_file_path)
-        if cleaned_audio_path and os.path.exists(cleaned_audio_path):
-            os.remove(cleaned_audio_path)
-        
-        print(f"Error processing recording: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        result = plain_transcription(upload, cancel, held, INTERACTIVE, decoding)
+        return jsonify({'success': True, **result}), 200
+    
+    return transcription_request(INTERACTIVE, respond, 'processing recording', default_filename='recording.webm')
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'message': 'Speech-to-Text API is running'
+        'message': 'Speech-to-Text API is running',
+        'runtime': effective_settings(runtime_config),
+        'models': get_registry().status(),
+        'decoder': decoder_service.status(),
+        'pipeline': transcription_pipeline.status(),
+        'router': model_router.status(),
+        'admission': admission.status(),
+        'live_sessions': live_sessions.status(),
+        'mel_cache': get_mel_cache().status(),
+        'encoder_cache': get_encoder_cache().status(),
+        'batched_decoding': batched_decoding.status(),
+        'nlp': get_corrector_manager().status(),
+        'transcripts': transcript_store.status(),
+        'startup': metrics.startup(),
+        # Set when served by asgi.py (SERVER_MODE=asgi)
+        'asgi': app.extensions['asgi'].status() if 'asgi' in app.extensions else None
     }), 200
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Runtime metrics for this worker process"""
+    snapshot = metrics.snapshot()
+    snapshot['pipeline'] = transcription_pipeline.status()
+    snapshot['router'] = model_router.status()
+    snapshot['admission'] = admission.status()
+    snapshot['live_sessions'] = live_sessions.status()
+    snapshot['mel_cache'] = get_mel_cache().status()
+    snapshot['encoder_cache'] = get_encoder_cache().status()
+    snapshot['batched_decoding'] = batched_decoding.status()
+    snapshot['nlp'] = get_corrector_manager().status()
+    return jsonify(snapshot), 200
+
 @app.route('/api/transcribe', methods=['POST'])
 def transcribe_audio():
     """
     Advanced multilingual transcription endpoint.
     Automatically detects language and transcribes without forcing translation.
     """
-    uploaded_file_path = None
-    cleaned_audio_path = None
     
-    try:
-        # Check if file is present in request
-        if 'audio' not in request.files:
-            return jsonify({'error': 'No audio file provided'}), 400
-        
-        file = request.files['audio']
-        
-        # Check if file is selected
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        # Check if file type is allowed
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Allowed types: ' + ', '.join(ALLOWED_EXTENSIONS)}), 400
-        
+    def respond(upload, cancel, held):
         # Get optional language parameter
-        force_language = request.form.get('force_language', None)
-        
-        # Save file securely
-        filename = secure_filename(file.filename)
-        uploaded_file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(uploaded_file_path)
-        
-        print(f"Transcribing file: {filename}")
-        
-        # Preprocess audio (convert to 16kHz mono WAV)
-        cleaned_audio_path = preprocess_audio(uploaded_file_path)
-        
-        # Transcribe using advanced multilingual transcriber
-        result = multilingual_transcriber.transcribe_audio(
-            cleaned_audio_path, 
+        force_language = upload.form.get('force_language', None)
+        
+        # Optional per-word timings and response encoding (json, compact or ndjson)
+        word_timestamps = parse_flag(upload.form.get('word_timestamps'))
+        # Denoise/normalize before inference (AUDIO_CONDITIONING sets the default)
+        denoise = parse_flag(upload.form['denoise']) if upload.form.get('denoise') else conditioning_enabled()
+        try:
+            response_format = requested_format(upload.form, request.accept_mimetypes)
+            diarize, num_speakers = request_diarization(upload.form, response_format)
+            _, decoding = decoding_options(upload.form)
+            vocabulary = request_vocabulary(upload.form)
+            held.enter_context(admission.admit(BULK, audio_duration(upload.audio_path)))
+            decision = route_request(upload.form, upload.audio_path, force_language)
+            held.callback(model_router.release, decision)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # A language the router's detection pass is confident of isn't detected again
+        force_language = force_language or decision.force_language
+        print(f"Transcribing file: {upload.filename} (model: {decision.model_size})")
+        
+        if response_format == 'ndjson':
+            # The waveform is held in memory, so the upload's files can go
+            audio = load_audio(upload.audio_path)
+            response = Response(
+                stream_with_context(stream_segments(
+                    audio, force_language, word_timestamps, vocabulary, decision.model_size, cancel, decoding,
+                    denoise
+                )),
+                mimetype=NDJSON_MIMETYPE
+            )
+            # The stream outlives this call; release its slot when it ends
+            response.call_on_close(held.pop_all().close)
+            return response
+        
+        # Transcribe through the staged pipeline (decode, inference, correction, save)
+        result = transcription_pipeline.transcribe(
+            upload.audio_path, 
             detect_language=True,
-            force_language=force_language
+            force_language=force_language,
+            word_timestamps=word_timestamps,
+            vocabulary=vocabulary,
+            model_size=decision.model_size,
+            priority=LANE_PRIORITIES[BULK],
+            cancel=cancel,
+            diarize=diarize,
+            num_speakers=num_speakers,
+            condition=denoise,
+            decoding=decoding
         )
         
-        # Clean up temporary files
-        if uploaded_file_path and os.path.exists(uploaded_file_path):
-            os.remove(uploaded_file_path)
-        if cleaned_audio_path and os.path.exists(cleaned_audio_path):
-            os.remove(cleaned_audio_path)
+        if response_format == 'compact':
+            body = compact_transcription(result)
+            body['routing'] = decision.to_dict()
+            return jsonify(body), 200
         
         return jsonify({
             'success': True,
@@ -221,19 +438,211 @@ def transcribe_audio():
             'corrected_text': result['corrected_text'],
             'text': result['text'],  # For backward compatibility, points to corrected_text
             'segments': result['segments'],
-            'confidence': result['confidence']
+            'confidence': result['confidence'],
+            'vocabulary_snaps': result.get('vocabulary_snaps'),
+            'speakers': result.get('speakers'),
+            'transcript_id': result.get('transcript_id'),
+            'routing': decision.to_dict()
         }), 200
-        
+    
+    return transcription_request(BULK, respond, 'during transcription', allowed_extensions=ALLOWED_EXTENSIONS)
+
+@app.route('/api/batch', methods=['POST'])
+def batch_transcribe():
+    """
+    Batch transcription of many files in one request.
+
+    Accepts either a JSON manifest {"files": [...] or "directory": "...",
+    "job_id": "...", "force_language": "...", "decoding": "..."} naming
+    files under BATCH_INPUT_ROOT, or a multipart upload with a zip 'archive'
+    (plus optional 'job_id', 'force_language' and 'decoding' fields). Streams one JSON line
+    per file as it finishes, then a final {"summary": ...} line. Results
+    are kept in output/batch/<job_id>.jsonl, so resubmitting the same
+    job_id skips files that already succeeded.
+    """
+    work_dir = None
+
+    try:
+        if request.is_json:
+            manifest = request.get_json() or {}
+            if not BATCH_INPUT_ROOT:
+                return jsonify({'error': 'Manifest batches are disabled (BATCH_INPUT_ROOT is not set)'}), 400
+            root = os.path.realpath(BATCH_INPUT_ROOT)
+            if manifest.get('directory') is not None:
+                directory = os.path.realpath(os.path.join(root, manifest['directory']))
+                if os.path.commonpath([root, directory]) != root or not os.path.isdir(directory):
+                    return jsonify({'error': f"Invalid batch directory: {manifest['directory']}"}), 400
+                files = find_audio_files(directory)
+            else:
+                files = []
+                for name in manifest.get('files') or []:
+                    path = os.path.realpath(os.path.join(root, name))
+                    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+                        return jsonify({'error': f'Invalid batch file: {name}'}), 400
+                    files.append(path)
+            options = manifest
+        else:
+            archive = request.files.get('archive')
+            if archive is None or archive.filename == '':
+                return jsonify({'error': 'Provide a JSON manifest or a zip archive'}), 400
+            root = work_dir = tempfile.mkdtemp(prefix='batch_')
+            files = extract_archive(archive.stream, work_dir, BATCH_MAX_EXTRACTED_SIZE)
+            options = request.form
+
+        if not files:
+            return jsonify({'error': 'No audio files to transcribe'}), 400
+
+        job_id = secure_filename(options.get('job_id') or '') or uuid.uuid4().hex
+        force_language = options.get('force_language') or None
+        _, decoding = decoding_options(options)
+        results_path = os.path.join(BATCH_FOLDER, f'{job_id}.jsonl')
+        batch = BatchTranscriber(
+            multilingual_transcriber, results_path, force_language=force_language, decoding=decoding
+        )
+        print(f"Batch {job_id}: {len(files)} file(s)")
+
+    except ValueError as e:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        # Clean up temporary files in case of error
-        if uploaded_file_path and os.path.exists(uploaded_file_path):
-            os.remove(uploaded_file_path)
-        if cleaned_audio_path and os.path.exists(cleaned_audio_path):
-            os.remove(cleaned_audio_path)
-        
-        print(f"Error during transcription: {str(e)}")
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"Error starting batch: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+    def generate():
+        try:
+            for record in batch.run(files, root=root):
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+            yield json.dumps({'job_id': job_id, 'summary': batch.summary}, ensure_ascii=False) + '\n'
+        finally:
+            if work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def stream_segments(audio, force_language, word_timestamps, vocabulary=None, model_size=None, cancel=None,
+                    decoding=None, condition=False):
+    """Yield NDJSON lines for a streamed transcription: one per segment, then a summary."""
+    try:
+        for event, payload in transcription_pipeline.stream(
+                audio, force_language=force_language, word_timestamps=word_timestamps,
+                vocabulary=vocabulary, model_size=model_size, priority=LANE_PRIORITIES[BULK],
+                cancel=cancel, condition=condition, decoding=decoding):
+            if event == 'segment':
+                yield ndjson_line({'type': 'segment', **payload})
+            else:
+                yield ndjson_line({
+                    'type': 'done',
+                    'success': True,
+                    'language': payload['language'],
+                    'language_name': payload['language_name'],
+                    'raw_text': payload['raw_text'],
+                    'text': payload['corrected_text'],
+                    'confidence': payload['confidence'],
+                    'nlp_corrections': payload['nlp_corrections'],
+                    'vocabulary_snaps': payload.get('vocabulary_snaps'),
+                    'transcript_id': payload.get('transcript_id'),
+                    'model_size': model_size or multilingual_transcriber.model_size
+                })
+    except TranscriptionCancelled as e:
+        metrics.increment(f'requests.cancelled.{e.reason}')
+        print(f"Streamed transcription stopped: {e}")
+        yield ndjson_line({'type': 'error', 'error': str(e), 'reason': e.reason})
+    except Exception as e:
+        print(f"Error during streamed transcription: {str(e)}")
+        yield ndjson_line({'type': 'error', 'error': str(e)})
+
+@app.route('/api/vocabulary/<tenant>', methods=['GET'])
+def get_vocabulary(tenant):
+    """List a tenant's custom vocabulary terms."""
+    try:
+        vocabulary = vocabulary_store.get(tenant)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if vocabulary is None:
+        return jsonify({'error': f"No vocabulary for tenant '{tenant}'"}), 404
+    return jsonify({'tenant': tenant, 'terms': vocabulary.terms}), 200
+
+@app.route('/api/vocabulary/<tenant>', methods=['PUT'])
+def put_vocabulary(tenant):
+    """
+    Replace a tenant's custom vocabulary.
+    Body: {"terms": ["Xenthra", "metoprolol succinate", ...]}, most important first.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        vocabulary = vocabulary_store.save(tenant, data.get('terms'))
+        print(f"Vocabulary saved for tenant '{tenant}': {len(vocabulary.terms)} terms")
+        return jsonify({'success': True, 'tenant': tenant, 'terms': vocabulary.terms}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error saving vocabulary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/transcripts', methods=['GET'])
+def search_transcripts():
+    """
+    Find saved transcripts.
+    Query: q (words every matching segment contains; 'word*' matches a prefix),
+    language, from and to (ISO dates), limit, offset.
+    Without q, lists transcripts newest first; with q, returns the matching
+    segments (with start/end timestamps), newest first.
+    """
+    try:
+        args = request.args
+        query = args.get('q', '').strip()
+        results = transcript_store.search(
+            query=query or None,
+            language=args.get('language') or None,
+            since=parse_timestamp(args.get('from')),
+            until=parse_timestamp(args.get('to'), end_of_day=True),
+            limit=int(args.get('limit', DEFAULT_LIMIT)),
+            offset=int(args.get('offset', 0))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'query': query or None, 'results': results}), 200
+
+@app.route('/api/transcripts/<int:transcript_id>', methods=['GET'])
+def get_transcript(transcript_id):
+    """Get a saved transcript with its segments."""
+    transcript = transcript_store.get(transcript_id)
+    if transcript is None:
+        return jsonify({'error': f'No transcript with id {transcript_id}'}), 404
+    return jsonify(transcript), 200
+
+@app.route('/api/transcripts/<int:transcript_id>/captions', methods=['GET'])
+def export_captions(transcript_id):
+    """
+    Export a saved transcript as captions, without transcribing again.
+    Query: format (srt, vtt, ttml or txt; default srt), max_line_length,
+    max_lines and max_cps (reading speed, characters per second).
+    The file is streamed cue by cue.
+    """
+    caption_format = request.args.get('format', 'srt').strip().lower()
+    if caption_format not in CAPTION_FORMATS:
+        return jsonify({'error': 'Invalid format. Allowed formats: ' + ', '.join(CAPTION_FORMATS)}), 400
+    try:
+        options = caption_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    transcript = transcript_store.get(transcript_id, segments=False)
+    if transcript is None:
+        return jsonify({'error': f'No transcript with id {transcript_id}'}), 404
+
+    mimetype, extension = CAPTION_FORMATS[caption_format]
+    cues = reflow(transcript_store.iter_segments(transcript_id), **options)
+    response = Response(
+        stream_with_context(render(cues, caption_format, transcript['language'])),
+        mimetype=mimetype
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename=transcript_{transcript_id}.{extension}'
+    metrics.increment(f'captions.exported.{caption_format}')
+    return response
+
 @app.route('/api/translate', methods=['POST'])
 def translate_text_endpoint():
     """
@@ -280,43 +689,49 @@ def live_transcription():
     """
     Real-time transcription endpoint for live microphone streaming.
     Handles WebM audio chunks from browser MediaRecorder.
+
+    Without a session, each request is transcribed on its own. Send
+    'session=1' with the first chunk of a recording to open a session, then
+    'session_id' with each following chunk and 'final=1' with the last: the
+    server keeps the audio that isn't final yet and only transcribes that.
     """
-    uploaded_file_path = None
-    cleaned_audio_path = None
     
-    try:
-        # Check if file is present in request
-        if 'audio' not in request.files:
-            return jsonify({'error': 'No audio data provided'}), 400
-        
-        file = request.files['audio']
-        
+    def respond(upload, cancel, held):
         # Get optional language parameter
-        force_language = request.form.get('force_language', None)
-        
-        # Save file temporarily
-        filename = secure_filename('live_recording.webm')
-        uploaded_file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(uploaded_file_path)
+        force_language = upload.form.get('force_language', None)
+        session_id = upload.form.get('session_id')
+        if session_id:
+            return live_session_chunk(live_sessions.get(session_id), upload, held, cancel)
+        try:
+            _, decoding = decoding_options(upload.form, default_profile(live=True))
+            vocabulary = request_vocabulary(upload.form)
+            held.enter_context(admission.admit(INTERACTIVE, audio_duration(upload.audio_path)))
+            decision = route_request(upload.form, upload.audio_path, force_language)
+            held.callback(model_router.release, decision)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if parse_flag(upload.form.get('session')):
+            # The first chunk picks the model, vocabulary and decoding for the whole session
+            session = live_sessions.create(
+                force_language or decision.force_language, vocabulary, decision.model_size, decoding
+            )
+            return live_session_chunk(session, upload, held, cancel, admitted=True)
         
         print("Processing live audio stream...")
         
-        # Preprocess audio (convert to 16kHz mono WAV)
-        cleaned_audio_path = preprocess_audio(uploaded_file_path)
-        
         # Transcribe using multilingual transcriber
-        result = multilingual_transcriber.transcribe_audio(
-            cleaned_audio_path,
+        result = transcription_pipeline.transcribe(
+            upload.audio_path,
             detect_language=True,
-            force_language=force_language
+            force_language=force_language or decision.force_language,
+            vocabulary=vocabulary,
+            model_size=decision.model_size,
+            priority=LANE_PRIORITIES[INTERACTIVE],
+            cancel=cancel,
+            decoding=decoding
         )
         
-        # Clean up temporary files
-        if uploaded_file_path and os.path.exists(uploaded_file_path):
-            os.remove(uploaded_file_path)
-        if cleaned_audio_path and os.path.exists(cleaned_audio_path):
-            os.remove(cleaned_audio_path)
-        
         return jsonify({
             'success': True,
             'language': result['language'],
@@ -325,18 +740,48 @@ def live_transcription():
             'corrected_text': result['corrected_text'],
             'text': result['text'],  # For backward compatibility, points to corrected_text
             'segments': result['segments'],
-            'confidence': result['confidence']
+            'confidence': result['confidence'],
+            'vocabulary_snaps': result.get('vocabulary_snaps'),
+            'transcript_id': result.get('transcript_id'),
+            'routing': decision.to_dict()
         }), 200
-        
-    except Exception as e:
-        # Clean up temporary files in case of error
-        if uploaded_file_path and os.path.exists(uploaded_file_path):
-            os.remove(uploaded_file_path)
-        if cleaned_audio_path and os.path.exists(cleaned_audio_path):
-            os.remove(cleaned_audio_path)
-        
-        print(f"Error processing live audio: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+    
+    return transcription_request(
+        INTERACTIVE, respond, 'processing live audio', default_filename='live_recording.webm'
+    )
+
+def live_session_chunk(session, upload, held, cancel, admitted=False):
+    """
+    Add an uploaded chunk to a live session and return the transcript so far
+    (admitted: the chunk of a new session was already admitted).
+    """
+    final = parse_flag(upload.form.get('final'))
+    audio = load_audio(upload.audio_path)
+    if not admitted:
+        # Admission covers what Whisper will run on: the whole uncommitted tail
+        held.enter_context(admission.admit(
+            INTERACTIVE, (len(session.tail) + len(audio)) / TARGET_SAMPLE_RATE
+        ))
+    state = live_sessions.add_chunk(
+        session, audio, final=final,
+        word_timestamps=parse_flag(upload.form.get('word_timestamps')), cancel=cancel
+    )
+    data = state.pop('data', None)
+    body = {'success': True, 'final': final, **state}
+    if data:
+        # The final response matches a session-less /api/live response
+        body.update({
+            'language': data['language'],
+            'language_name': data['language_name'],
+            'raw_text': data['raw_text'],
+            'corrected_text': data['corrected_text'],
+            'text': data['text'],
+            'segments': data['segments'],
+            'confidence': data['confidence'],
+            'vocabulary_snaps': data.get('vocabulary_snaps'),
+            'transcript_id': data.get('transcript_id')
+        })
+    return jsonify(body), 200
 
 if __name__ == '__main__':
     # Use debug=False in production for security
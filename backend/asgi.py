@@ -0,0 +1,343 @@
+"""
+ASGI serving mode.
+Under gunicorn's sync and gthread workers a request holds a thread from its
+first byte to its last: a slow upload, a client reading its response slowly
+or a translation waiting on Google each pin one, and a worker only has a
+few. This module serves the same Flask app from an event loop instead
+(SERVER_MODE=asgi, uvicorn workers):
+  - the event loop receives request bodies (in memory up to ASGI_SPOOL_KB,
+    then spooled to disk), sends responses and watches for disconnects, so
+    an idle or slow connection costs a coroutine rather than a thread
+  - the transcription endpoints run on a dedicated inference executor of
+    ASGI_INFERENCE_THREADS threads, which keep the model busy
+  - every other endpoint (health, transcripts, captions, vocabulary,
+    translation) runs on a separate pool of ASGI_IO_THREADS, so a slow
+    translation or transcript query never waits behind inference
+  - a transcription lane that already has a full queue is refused with
+    429 before its upload is read
+
+The Flask views run unchanged, each once its request body is complete.
+
+    gunicorn -c gunicorn.conf.py asgi:app    (with SERVER_MODE=asgi)
+    python asgi.py                           (development server)
+"""
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from app import app as flask_app
+from admission import get_admission_controller, AdmissionRejected, LANES, INTERACTIVE, BULK
+from cancellation import DISCONNECTED_ENVIRON_KEY
+from runtime_config import get_runtime_config
+from metrics import get_metrics
+
+
+# POST endpoints that run inference, with their admission lane
+INFERENCE_ROUTES = {
+    '/api/upload': BULK,
+    '/api/transcribe': BULK,
+    '/api/batch': BULK,
+    '/api/live': INTERACTIVE,
+    '/api/live-record': INTERACTIVE,
+}
+
+# Response chunks a view may produce ahead of a slow client
+RESPONSE_QUEUE_CHUNKS = 8
+
+
+def _env_number(name, default, cast=int):
+    """Read a positive number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+class _Response:
+    """Status, headers and body chunks handed from a view's thread to the event loop."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(RESPONSE_QUEUE_CHUNKS)
+        self.started = False
+
+    def put(self, item):
+        """Queue an item from the view's thread (waits while the queue is full)."""
+        asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop).result()
+
+
+class FlaskASGI:
+    """ASGI application running a WSGI (Flask) app's views on thread pools."""
+
+    def __init__(self, wsgi_app, max_body_bytes=None, inference_threads=None, io_threads=None):
+        """
+        Args:
+            wsgi_app (callable): WSGI application
+            max_body_bytes (int, optional): Largest request body accepted (413 above it)
+            inference_threads (int): Threads running transcription views
+                (ASGI_INFERENCE_THREADS, default: the planned request threads
+                per worker)
+            io_threads (int): Threads running every other view (ASGI_IO_THREADS, default: 32)
+        """
+        self.wsgi_app = wsgi_app
+        self.max_body_bytes = max_body_bytes
+        self.inference_threads = inference_threads or _env_number(
+            'ASGI_INFERENCE_THREADS', get_runtime_config().threads
+        )
+        self.io_threads = io_threads or _env_number('ASGI_IO_THREADS', 32)
+        self.spool_bytes = _env_number('ASGI_SPOOL_KB', 1024) * 1024
+        # Threads start on first use, i.e. inside each forked worker
+        self._inference = concurrent.futures.ThreadPoolExecutor(
+            self.inference_threads, thread_name_prefix='asgi-inference'
+        )
+        self._io = concurrent.futures.ThreadPoolExecutor(self.io_threads, thread_name_prefix='asgi-io')
+        self._admission = get_admission_controller()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._queued = {lane: 0 for lane in LANES}
+        self._metrics = get_metrics()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'websocket':
+            await receive()
+            await send({'type': 'websocket.close', 'code': 1003})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._inference.shutdown(wait=False, cancel_futures=True)
+                self._io.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        lane = INFERENCE_ROUTES.get(scope['path']) if scope['method'] == 'POST' else None
+        if lane is not None:
+            try:
+                self._refuse_if_full(lane)
+            except AdmissionRejected as e:
+                await self._send_json(send, e.status_code, {'error': str(e), 'retry_after': e.retry_after},
+                                      [(b'retry-after', str(e.retry_after).encode())])
+                return
+
+        with self._lock:
+            self._open += 1
+            self._metrics.set_gauge('asgi.open_requests', self._open)
+        body = None
+        try:
+            body = await self._receive_body(scope, receive, send)
+            if body is None:
+                return
+            disconnected = threading.Event()
+            watcher = asyncio.ensure_future(self._watch_disconnect(receive, disconnected))
+            try:
+                environ = self._environ(scope, body, disconnected)
+                await self._respond(environ, lane, send, disconnected)
+            finally:
+                watcher.cancel()
+        finally:
+            if body is not None:
+                body.close()
+            with self._lock:
+                self._open -= 1
+                self._metrics.set_gauge('asgi.open_requests', self._open)
+
+    def _refuse_if_full(self, lane):
+        """Refuse a transcription before its upload is read when its lane can't take it."""
+        self._admission.check(lane)
+        with self._lock:
+            full = self._queued[lane] >= self._admission.max_waiting
+        if full:
+            self._metrics.increment(f'asgi.rejected.{lane}')
+            raise AdmissionRejected(
+                'Too many requests are waiting to be transcribed; try again later',
+                429, self._admission.retry_after()
+            )
+
+    async def _receive_body(self, scope, receive, send):
+        """Read the whole request body (None if the client left or it was too large)."""
+        declared = next((value for name, value in scope['headers'] if name == b'content-length'), None)
+        if declared is not None and self.max_body_bytes and int(declared) > self.max_body_bytes:
+            await self._send_json(send, 413, {'error': 'File too large'})
+            return None
+
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if self.max_body_bytes and size > self.max_body_bytes:
+                body.close()
+                await self._send_json(send, 413, {'error': 'File too large'})
+                return None
+            body.write(chunk)
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    @staticmethod
+    async def _watch_disconnect(receive, disconnected):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    def _environ(self, scope, body, disconnected):
+        """WSGI environ of a request whose body has been received."""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        body.seek(0, os.SEEK_END)
+        length = body.tell()
+        body.seek(0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+            'CONTENT_LENGTH': str(length),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            # Polled by CancelToken.for_request() instead of the client socket
+            DISCONNECTED_ENVIRON_KEY: disconnected.is_set,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    async def _respond(self, environ, lane, send, disconnected):
+        """Run the view on its pool and send what it produces."""
+        loop = asyncio.get_running_loop()
+        response = _Response(loop)
+        executor = self._inference if lane is not None else self._io
+        if lane is not None:
+            with self._lock:
+                self._queued[lane] += 1
+        queued_at = time.perf_counter()
+        future = loop.run_in_executor(executor, self._run_view, environ, response, lane, queued_at, disconnected)
+
+        while True:
+            item = await response.queue.get()
+            if item is None:
+                break
+            kind, payload = item
+            if disconnected.is_set():
+                continue  # keep draining so the view's thread isn't left waiting
+            if kind == 'start':
+                status, headers = payload
+                await send({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers]
+                })
+            else:
+                await send({'type': 'http.response.body', 'body': payload, 'more_body': True})
+        try:
+            await future
+        except Exception as e:
+            print(f"⚠️  Request failed outside its view: {e}")
+            if not response.started and not disconnected.is_set():
+                await self._send_json(send, 500, {'error': str(e)})
+                return
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    def _run_view(self, environ, response, lane, queued_at, disconnected):
+        """Call the WSGI app and queue its status, headers and body (on a pool thread)."""
+        if lane is not None:
+            with self._lock:
+                self._queued[lane] -= 1
+            self._metrics.record_timing('asgi.inference_queue_seconds', time.perf_counter() - queued_at)
+        status_headers = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            status_headers[:] = [(status, headers)]
+            return write
+
+        def write(data):
+            if not response.started:
+                response.started = True
+                response.put(('start', status_headers[0]))
+            if data:
+                response.put(('body', bytes(data)))
+
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in result:
+                    write(chunk)
+                    if disconnected.is_set():
+                        break
+                write(b'')
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            response.put(None)
+
+    @staticmethod
+    async def _send_json(send, status, body, headers=()):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(data)).encode()), *headers]
+        })
+        await send({'type': 'http.response.body', 'body': data})
+
+    def status(self):
+        """Thread pools, open requests and transcriptions waiting for a thread."""
+        with self._lock:
+            return {
+                'inference_threads': self.inference_threads,
+                'io_threads': self.io_threads,
+                'open_requests': self._open,
+                'queued': dict(self._queued)
+            }
+
+
+app = FlaskASGI(flask_app, max_body_bytes=flask_app.config.get('MAX_CONTENT_LENGTH'))
+# Lets /api/health report the serving mode
+flask_app.extensions['asgi'] = app
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
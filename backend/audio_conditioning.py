@@ -0,0 +1,321 @@
+"""
+Audio conditioning before transcription.
+Noisy phone audio sends Whisper into its temperature fallback loop: a window
+whose decode looks like a hallucination (repetitive, or low log-probability)
+is decoded again at a higher temperature, up to five more times. Cleaning
+the waveform first avoids many of those re-decodes. condition_audio() runs,
+in NumPy on the 16kHz float32 waveform:
+  - DC removal
+  - high-pass filtering (rumble and hum below HIGHPASS_HZ)
+  - spectral-gating denoise: STFT bins that don't rise above the noise floor
+    (estimated from the quietest frames) are attenuated by REDUCTION_DB
+  - loudness normalization of the active speech level to TARGET_DBFS
+
+The STFT runs over fixed-size blocks of BLOCK_FRAMES frames with buffers
+allocated once per call, so memory stays flat however long the audio is.
+
+speech_bounds() finds where the speech starts and ends, for the transcription
+pipeline's VAD stage (PIPELINE_VAD) to leave silence out of inference.
+
+Run as a script to compare Whisper's decode and fallback counts with and
+without conditioning:
+
+    python audio_conditioning.py benchmark noisy_call.wav --model base
+"""
+import argparse
+import os
+import time
+import numpy as np
+from preprocess_audio import TARGET_SAMPLE_RATE
+from metrics import get_metrics
+
+
+# STFT: 32 ms Hann frames with 75% overlap
+N_FFT = 512
+HOP = N_FFT // 4
+# Frames per block (about 2 seconds)
+BLOCK_FRAMES = 256
+
+HIGHPASS_HZ = 80.0
+# Bins above noise_floor * GATE_RATIO are kept
+GATE_RATIO = 2.0
+# Attenuation of gated bins (full removal leaves "musical noise")
+REDUCTION_DB = 15.0
+# Percentile of each block's frames taken as its noise floor
+NOISE_PERCENTILE = 20
+# Blocks, spread evenly over the audio, the noise floor is estimated from
+NOISE_BLOCKS = 32
+# Mask smoothing, in frames and bins either side
+SMOOTH_FRAMES = 2
+SMOOTH_BINS = 1
+
+TARGET_DBFS = -20.0
+MAX_GAIN_DB = 30.0
+MIN_GAIN_DB = -10.0
+PEAK_LIMIT = 0.99
+
+# Voice activity (speech_bounds): frames quieter than this are silence, as
+# are frames more than VAD_RANGE_DB below the loudest one
+VAD_SILENCE_DBFS = -55.0
+VAD_RANGE_DB = 40.0
+# Audio kept either side of the speech
+VAD_PADDING_SECONDS = 0.5
+
+_WINDOW = np.hanning(N_FFT + 1)[:-1].astype(np.float32)  # periodic Hann
+# Overlap-added squared Hann windows at 75% overlap sum to 1.5
+_OLA_SCALE = np.float32(1.0 / 1.5)
+
+
+def conditioning_enabled():
+    """Whether requests are conditioned unless they say otherwise (AUDIO_CONDITIONING, default: off)."""
+    return os.environ.get('AUDIO_CONDITIONING', '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+def _highpass_gains():
+    """Per-bin gains ramping from 0 at HIGHPASS_HZ / 2 to 1 at HIGHPASS_HZ."""
+    frequencies = np.fft.rfftfreq(N_FFT, 1.0 / TARGET_SAMPLE_RATE)
+    ramp = (frequencies - HIGHPASS_HZ / 2) / (HIGHPASS_HZ / 2)
+    return np.clip(ramp, 0.0, 1.0).astype(np.float32)
+
+
+_HIGHPASS = _highpass_gains()
+
+
+def _smooth(values, radius, axis, out):
+    """Moving average along one axis (edges average fewer values), via cumulative sums."""
+    if radius == 0:
+        np.copyto(out, values)
+        return out
+    length = values.shape[axis]
+    padded = np.cumsum(values, axis=axis, dtype=np.float32)
+    padded = np.insert(padded, 0, 0.0, axis=axis)
+    index = np.arange(length)
+    upper = np.minimum(index + radius + 1, length)
+    lower = np.maximum(index - radius, 0)
+    counts = (upper - lower).astype(np.float32)
+    shape = [1, 1]
+    shape[axis] = length
+    np.subtract(np.take(padded, upper, axis=axis), np.take(padded, lower, axis=axis), out=out)
+    out /= counts.reshape(shape)
+    return out
+
+
+class _Blocks:
+    """Framing and spectrum buffers for one conditioning run."""
+
+    def __init__(self, padded):
+        self.padded = padded
+        self.n_frames = 1 + (len(padded) - N_FFT) // HOP
+        self.frames = np.empty((BLOCK_FRAMES, N_FFT), dtype=np.float32)
+        self.magnitude = np.empty((BLOCK_FRAMES, N_FFT // 2 + 1), dtype=np.float32)
+        self.mask = np.empty_like(self.magnitude)
+        self.scratch = np.empty_like(self.magnitude)
+
+    def __iter__(self):
+        """Yield (first frame, frame count) of each block."""
+        for first in range(0, self.n_frames, BLOCK_FRAMES):
+            yield first, min(BLOCK_FRAMES, self.n_frames - first)
+
+    def spectrum(self, first, count):
+        """Windowed frames of a block and their spectrum (magnitude kept in self.magnitude)."""
+        view = np.lib.stride_tricks.as_strided(
+            self.padded[first * HOP:], shape=(count, N_FFT),
+            strides=(HOP * self.padded.strides[0], self.padded.strides[0]), writeable=False
+        )
+        frames = self.frames[:count]
+        np.multiply(view, _WINDOW, out=frames)
+        spectrum = np.fft.rfft(frames, axis=1)
+        np.abs(spectrum, out=self.magnitude[:count], casting='unsafe')
+        return spectrum
+
+
+def _noise_floor(blocks):
+    """Per-bin noise magnitude: the lowest NOISE_PERCENTILE spectrum over (up to NOISE_BLOCKS) blocks."""
+    spans = list(blocks)
+    # A short trailing block says little about the noise
+    if len(spans) > 1 and spans[-1][1] < BLOCK_FRAMES // 4:
+        spans.pop()
+    floor = None
+    for index in np.unique(np.linspace(0, len(spans) - 1, min(NOISE_BLOCKS, len(spans))).astype(int)):
+        first, count = spans[index]
+        blocks.spectrum(first, count)
+        kth = count * NOISE_PERCENTILE // 100
+        block_floor = np.partition(blocks.magnitude[:count], kth, axis=0)[kth]
+        floor = block_floor if floor is None else np.minimum(floor, block_floor)
+    return floor
+
+
+def _loudness_gain(audio):
+    """Gain that brings the active speech level to TARGET_DBFS, within the peak limit."""
+    frame = TARGET_SAMPLE_RATE // 50  # 20 ms
+    usable = len(audio) // frame * frame
+    if usable == 0:
+        return 1.0
+    power = np.square(audio[:usable].reshape(-1, frame)).mean(axis=1)
+    # Speech level: the louder half of the frames (pauses don't pull it down)
+    active = power[power >= np.median(power)]
+    level = float(np.sqrt(active.mean())) if active.size else 0.0
+    if level <= 1e-9:
+        return 1.0
+    gain_db = np.clip(TARGET_DBFS - 20 * np.log10(level), MIN_GAIN_DB, MAX_GAIN_DB)
+    gain = 10 ** (gain_db / 20)
+    peak = float(np.abs(audio).max())
+    return min(gain, PEAK_LIMIT / peak) if peak > 0 else gain
+
+
+def speech_bounds(audio):
+    """
+    Find where the speech in a waveform starts and ends (energy-based, 20 ms
+    frames), so leading and trailing silence can be left out of inference.
+
+    Args:
+        audio (np.ndarray): 16kHz mono float32 waveform
+
+    Returns:
+        tuple: (first, end) sample of the speech, padded by
+            VAD_PADDING_SECONDS; None if no frame rises above VAD_SILENCE_DBFS
+    """
+    frame = TARGET_SAMPLE_RATE // 50  # 20 ms
+    usable = len(audio) // frame * frame
+    if usable == 0:
+        return 0, len(audio)
+    power = np.square(audio[:usable].reshape(-1, frame)).mean(axis=1)
+    level = 10 * np.log10(power + 1e-12)
+    peak = float(level.max())
+    if peak < VAD_SILENCE_DBFS:
+        return None
+    voiced = np.flatnonzero(level >= max(VAD_SILENCE_DBFS, peak - VAD_RANGE_DB))
+    padding = int(VAD_PADDING_SECONDS * TARGET_SAMPLE_RATE)
+    first = max(0, voiced[0] * frame - padding)
+    end = len(audio) if voiced[-1] == len(level) - 1 else min(len(audio), (voiced[-1] + 1) * frame + padding)
+    return int(first), int(end)
+
+
+def condition_audio(audio, denoise=True, normalize=True):
+    """
+    Condition a waveform for transcription.
+
+    Args:
+        audio (np.ndarray): 16kHz mono float32 waveform
+        denoise (bool): High-pass filter and spectral-gate the audio
+        normalize (bool): Normalize the speech level to TARGET_DBFS
+
+    Returns:
+        np.ndarray: Conditioned float32 waveform, the same length as audio
+    """
+    start = time.perf_counter()
+    length = len(audio)
+    if length == 0:
+        return np.asarray(audio, dtype=np.float32)
+
+    # DC removal; padding by a frame either side lets the edges be reconstructed
+    padded = np.zeros(length + 2 * N_FFT, dtype=np.float32)
+    np.subtract(audio, np.float32(np.mean(audio, dtype=np.float64)), out=padded[N_FFT:N_FFT + length])
+
+    if denoise:
+        blocks = _Blocks(padded)
+        gate = _noise_floor(blocks) * np.float32(GATE_RATIO)
+        floor = np.float32(10 ** (-REDUCTION_DB / 20))
+        output = np.zeros_like(padded)
+        for first, count in blocks:
+            spectrum = blocks.spectrum(first, count)
+            magnitude, mask, scratch = blocks.magnitude[:count], blocks.mask[:count], blocks.scratch[:count]
+
+            # Soft gate, smoothed over time and frequency, then the high-pass
+            np.greater(magnitude, gate, out=mask, casting='unsafe')
+            _smooth(mask, SMOOTH_FRAMES, 0, scratch)
+            _smooth(scratch, SMOOTH_BINS, 1, mask)
+            mask *= np.float32(1.0 - floor)
+            mask += floor
+            mask *= _HIGHPASS
+            spectrum *= mask
+
+            # Overlap-add: each frame spans 4 hops
+            frames = np.fft.irfft(spectrum, n=N_FFT, axis=1).astype(np.float32, copy=False)
+            frames *= _WINDOW
+            base = first * HOP
+            for quarter in range(4):
+                segment = frames[:, quarter * HOP:(quarter + 1) * HOP].reshape(-1)
+                offset = base + quarter * HOP
+                output[offset:offset + segment.size] += segment
+        output *= _OLA_SCALE
+        padded = output
+
+    result = padded[N_FFT:N_FFT + length]
+    if normalize:
+        result *= np.float32(_loudness_gain(result))
+    get_metrics().record_timing('conditioning.seconds', time.perf_counter() - start)
+    return np.ascontiguousarray(result)
+
+
+def _add_noise(audio, snr_db, seed=0):
+    """Mix in pink-ish noise (white noise, low-passed) at an SNR."""
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal(len(audio)).astype(np.float32)
+    noise = np.convolve(noise, np.ones(8, dtype=np.float32) / 8, mode='same')
+    signal_power = float(np.mean(np.square(audio))) or 1e-9
+    noise *= np.sqrt(signal_power / (10 ** (snr_db / 10)) / float(np.mean(np.square(noise))))
+    return (audio + noise).astype(np.float32)
+
+
+def benchmark(path, model_size='base', snr_db=None, language=None):
+    """
+    Transcribe a file with and without conditioning, counting Whisper's decodes.
+
+    Every decode after the first of a window runs at a higher temperature,
+    so the decodes at temperature > 0 are the fallback re-decodes.
+
+    Args:
+        path (str): Audio file
+        model_size (str): Whisper model to run
+        snr_db (float, optional): Mix in noise at this SNR first
+        language (str, optional): Language code (skips detection)
+
+    Returns:
+        dict: Per variant ('raw', 'conditioned'): decodes, fallbacks,
+            conditioning and transcription seconds, and the text
+    """
+    from preprocess_audio import load_audio
+    from model_registry import get_registry
+    from decode_hooks import install, count_decodes
+
+    audio = load_audio(path)
+    if snr_db is not None:
+        audio = _add_noise(audio, snr_db)
+    model = get_registry().get(model_size)
+    install(model)
+
+    results = {}
+    for variant in ('raw', 'conditioned'):
+        start = time.perf_counter()
+        samples = condition_audio(audio) if variant == 'conditioned' else audio
+        conditioning_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        with count_decodes() as counts:
+            result = model.transcribe(samples, language=language, fp16=False)
+        results[variant] = dict(
+            counts,
+            conditioning_seconds=round(conditioning_seconds, 3),
+            transcribe_seconds=round(time.perf_counter() - start, 3),
+            text=result['text'].strip()
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audio conditioning tools")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    bench = subcommands.add_parser('benchmark', help="Compare fallback re-decodes with and without conditioning")
+    bench.add_argument('audio', help="Audio file")
+    bench.add_argument('--model', default='base', help="Whisper model size (default: base)")
+    bench.add_argument('--snr', type=float, default=None, help="Mix in noise at this SNR (dB) first")
+    bench.add_argument('--language', default=None, help="Language code (default: detect)")
+    args = parser.parse_args()
+
+    results = benchmark(args.audio, args.model, args.snr, args.language)
+    print(f"{'':<12}{'decodes':>9}{'fallbacks':>11}{'condition s':>13}{'transcribe s':>14}")
+    for variant, row in results.items():
+        print(f"{variant:<12}{row['decodes']:>9}{row['fallbacks']:>11}"
+              f"{row['conditioning_seconds']:>13}{row['transcribe_seconds']:>14}")
+    for variant, row in results.items():
+        print(f"\n{variant}: {row['text']}")
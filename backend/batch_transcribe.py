@@ -0,0 +1,302 @@
+"""
+Batch transcription of many audio files.
+Decoding, inference, NLP correction and persistence run as overlapping
+pipeline stages, results are appended to a JSONL file one line per file, and
+a rerun with the same results file resumes where the last run stopped.
+"""
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import zipfile
+from werkzeug.utils import secure_filename
+from preprocess_audio import AUDIO_EXTENSIONS
+from transcription_pipeline import TranscriptionPipeline
+from decoding_profiles import DECODING_PROFILES, default_profile
+
+
+def find_audio_files(input_dir, recursive=True):
+    """
+    List audio files under a directory.
+
+    Args:
+        input_dir (str): Directory to scan
+        recursive (bool): Include subdirectories
+
+    Returns:
+        list: Sorted file paths with a supported audio extension
+    """
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in files:
+            if '.' in name and name.rsplit('.', 1)[1].lower() in AUDIO_EXTENSIONS:
+                found.append(os.path.join(root, name))
+        if not recursive:
+            break
+    return sorted(found)
+
+
+def read_completed(results_path):
+    """
+    Read which files a previous run already finished.
+
+    Args:
+        results_path (str): JSONL results file
+
+    Returns:
+        set: 'file' keys of records with status 'ok'
+    """
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A run killed mid-write leaves a partial last line
+                continue
+            if record.get('status') == 'ok':
+                completed.add(record.get('file'))
+    return completed
+
+
+def extract_archive(archive, dest_dir, max_total_size):
+    """
+    Extract the audio files of a zip archive.
+
+    Entry paths are flattened to sanitized basenames, so nothing can be
+    written outside dest_dir.
+
+    Args:
+        archive (str or file): Zip archive path or file object
+        dest_dir (str): Directory to extract into
+        max_total_size (int): Largest total uncompressed size accepted (bytes)
+
+    Returns:
+        list: Paths of the extracted audio files
+
+    Raises:
+        ValueError: If the archive is not a zip or is too large once extracted
+    """
+    try:
+        bundle = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ValueError('Archive is not a valid zip file')
+
+    with bundle:
+        entries = [
+            info for info in bundle.infolist()
+            if not info.is_dir() and '.' in info.filename
+            and info.filename.rsplit('.', 1)[1].lower() in AUDIO_EXTENSIONS
+        ]
+        if sum(info.file_size for info in entries) > max_total_size:
+            raise ValueError('Archive is too large once extracted')
+
+        extracted = []
+        for info in entries:
+            name = secure_filename(os.path.basename(info.filename))
+            if not name:
+                continue
+            path = os.path.join(dest_dir, name)
+            stem, extension = os.path.splitext(name)
+            suffix = 1
+            while os.path.exists(path):
+                path = os.path.join(dest_dir, f"{stem}_{suffix}{extension}")
+                suffix += 1
+            with bundle.open(info) as source, open(path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            extracted.append(path)
+    return sorted(extracted)
+
+
+class BatchTranscriber:
+    """Runs a MultilingualTranscriber over many files as a staged pipeline."""
+
+    def __init__(self, transcriber, results_path, force_language=None,
+                 decode_workers=2, correction_workers=1, queue_size=4, decoding=None):
+        """
+        Args:
+            transcriber (MultilingualTranscriber): Transcriber providing the
+                inference, correction and persistence steps
+            results_path (str): JSONL file receiving one record per file
+                (doubles as the resume checkpoint)
+            force_language (str, optional): Language code for every file
+            decode_workers (int): Parallel decode threads
+            correction_workers (int): Parallel NLP correction threads
+            queue_size (int): Jobs allowed to wait in front of each stage
+            decoding (dict, optional): Whisper decoding options for every file
+                (see decoding_profiles.py)
+        """
+        self.transcriber = transcriber
+        self.results_path = results_path
+        self.force_language = force_language
+        self.decoding = decoding
+        self.summary = None
+        self._pipeline_options = {
+            'decode_workers': decode_workers,
+            'correction_workers': correction_workers,
+            'persistence_workers': 1,
+            'queue_size': queue_size
+        }
+
+    def run(self, files, root=None, resume=True):
+        """
+        Transcribe files, yielding one result record per file as it finishes.
+
+        Args:
+            files (list): Audio file paths
+            root (str, optional): Directory that record 'file' keys are relative to
+            resume (bool): Skip files recorded as done in the results file
+
+        Yields:
+            dict: Result record (also appended to the results file)
+        """
+        def key_for(path):
+            return os.path.relpath(path, root) if root else path
+
+        completed = read_completed(self.results_path) if resume else set()
+        pending = [path for path in files if key_for(path) not in completed]
+        skipped = len(files) - len(pending)
+        if skipped:
+            print(f"Resuming: {skipped} file(s) already done, {len(pending)} to go")
+
+        pipeline = TranscriptionPipeline(self.transcriber, name='batch', **self._pipeline_options)
+        finished = queue.Queue()
+        stop_feeding = threading.Event()
+
+        def feed():
+            for path in pending:
+                if stop_feeding.is_set():
+                    break
+                job = {'file': key_for(path), 'started': time.perf_counter()}
+                future = pipeline.submit(path, force_language=self.force_language, decoding=self.decoding)
+                future.add_done_callback(lambda f, job=job: finished.put((job, f)))
+
+        start = time.perf_counter()
+        feeder = threading.Thread(target=feed, name='batch-feeder', daemon=True)
+        feeder.start()
+
+        totals = {'completed': 0, 'failed': 0, 'audio_seconds': 0.0}
+        os.makedirs(os.path.dirname(os.path.abspath(self.results_path)), exist_ok=True)
+        try:
+            with open(self.results_path, 'a', encoding='utf-8') as results:
+                for _ in range(len(pending)):
+                    job, future = finished.get()
+                    record = self._make_record(job, future)
+                    if record['status'] == 'ok':
+                        totals['completed'] += 1
+                        totals['audio_seconds'] += record['duration']
+                    else:
+                        totals['failed'] += 1
+                    # One durable line per file is the resume checkpoint
+                    results.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    results.flush()
+                    os.fsync(results.fileno())
+                    yield record
+        finally:
+            # If the consumer stopped early, let in-flight jobs finish but start no more
+            stop_feeding.set()
+            feeder.join()
+            pipeline.close()
+            wall_seconds = time.perf_counter() - start
+            self.summary = {
+                'files_total': len(files),
+                'skipped': skipped,
+                'completed': totals['completed'],
+                'failed': totals['failed'],
+                'audio_seconds': round(totals['audio_seconds'], 2),
+                'wall_seconds': round(wall_seconds, 2),
+                'files_per_minute': round(60 * (totals['completed'] + totals['failed']) / wall_seconds, 2) if wall_seconds else 0.0,
+                'realtime_factor': round(totals['audio_seconds'] / wall_seconds, 2) if wall_seconds else 0.0
+            }
+
+    def _make_record(self, job, future):
+        """Build the JSONL record for a finished job."""
+        record = {
+            'file': job['file'],
+            'elapsed_seconds': round(time.perf_counter() - job['started'], 2)
+        }
+        error = future.exception()
+        if error is not None:
+            record.update(status='error', error=str(error))
+            return record
+
+        done = future.result()
+        data = done['data']
+        record.update(
+            status='ok',
+            duration=done['duration'],
+            language=data['language'],
+            language_name=data['language_name'],
+            confidence=data['confidence'],
+            text=data['text'],
+            segments=data['segments'],
+            transcript_path=done['transcript_path']
+        )
+        return record
+
+
+def print_summary(summary):
+    """Print aggregate throughput for a batch run."""
+    print("=" * 60)
+    print(f"Files:       {summary['completed']} done, {summary['failed']} failed, "
+          f"{summary['skipped']} skipped (of {summary['files_total']})")
+    print(f"Audio:       {summary['audio_seconds']:.1f}s in {summary['wall_seconds']:.1f}s wall time")
+    print(f"Throughput:  {summary['files_per_minute']} files/min, {summary['realtime_factor']}x realtime")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    import argparse
+    from runtime_config import get_runtime_config, apply_torch_threads
+    from multilingual_transcribe import MultilingualTranscriber
+
+    parser = argparse.ArgumentParser(description="Transcribe every audio file in a directory")
+    parser.add_argument('input_dir', help="Directory of audio files")
+    parser.add_argument('--results', default=None,
+                        help="JSONL results file (default: <input_dir>/transcripts.jsonl)")
+    parser.add_argument('--model', default=None, help="Whisper model size (default: WHISPER_MODEL_SIZE or base)")
+    parser.add_argument('--language', default=None, help="Force a language code for every file")
+    parser.add_argument('--decoding', default=None, choices=sorted(DECODING_PROFILES),
+                        help="Decoding profile (default: DECODING_PROFILE or balanced)")
+    parser.add_argument('--no-resume', action='store_true', help="Redo files already in the results file")
+    parser.add_argument('--no-correction', action='store_true', help="Skip NLP correction")
+    parser.add_argument('--no-recursive', action='store_true', help="Don't descend into subdirectories")
+    parser.add_argument('--decode-workers', type=int, default=2)
+    parser.add_argument('--correction-workers', type=int, default=1)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Not a directory: {args.input_dir}")
+        raise SystemExit(1)
+
+    runtime = get_runtime_config()
+    apply_torch_threads(runtime)
+    transcriber = MultilingualTranscriber(
+        model_size=args.model or runtime.model_size,
+        enable_nlp_correction=not args.no_correction
+    )
+
+    results_path = args.results or os.path.join(args.input_dir, 'transcripts.jsonl')
+    files = find_audio_files(args.input_dir, recursive=not args.no_recursive)
+    print(f"Found {len(files)} audio file(s) in {args.input_dir}")
+
+    batch = BatchTranscriber(
+        transcriber, results_path,
+        force_language=args.language,
+        decode_workers=args.decode_workers,
+        correction_workers=args.correction_workers,
+        decoding=DECODING_PROFILES[args.decoding or default_profile()]
+    )
+    for record in batch.run(files, root=args.input_dir, resume=not args.no_resume):
+        if record['status'] == 'ok':
+            print(f"✓ {record['file']} [{record['language']}] {record['duration']}s in {record['elapsed_seconds']}s")
+        else:
+            print(f"❌ {record['file']}: {record['error']}")
+
+    print_summary(batch.summary)
+    print(f"Results: {results_path}")
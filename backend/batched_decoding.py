@@ -0,0 +1,739 @@
+"""
+Batched greedy decoding of Whisper windows.
+model.transcribe() decodes one 30-second window at a time, and on a CPU its
+decoder loop spends most of its time moving memory rather than computing:
+every token streams the decoder's weights (and the large vocabulary
+projection) through the cache for a single row, and concatenates the new
+keys/values onto the cache, reallocating it. This engine decodes many
+windows at once instead:
+  - windows of the same file, and windows of concurrent requests on the same
+    model (WindowBatcher), share one decoder pass per token
+  - self-attention keys/values are written into buffers preallocated per
+    model and reused by every batch; cross-attention keys/values are
+    projected once per batch into buffers of the same kind
+  - rows that reach end-of-text are dropped from the batch, so short
+    windows don't pay for long ones
+
+Decoding is greedy (temperature 0) with Whisper's own logit filters. A
+window that fails Whisper's compression-ratio or log-probability checks is
+decoded again by model.decode() at the next temperatures, as
+model.transcribe() does. Windows are decoded independently, so a file is
+cut at fixed 30-second boundaries and no window is conditioned on the text
+before it. Transcribers therefore only use it (BATCHED_DECODING=1) for
+greedy requests without conditioning, prompts, vocabulary or word
+timestamps, such as the 'fast' decoding profile.
+
+Run as a script to compare decoder throughput with the per-window loop:
+
+    python batched_decoding.py benchmark sample.wav --model base
+"""
+import argparse
+import collections
+import os
+import threading
+import time
+import torch
+import torch.nn.functional as F
+from whisper.audio import N_FRAMES, N_SAMPLES, HOP_LENGTH, SAMPLE_RATE
+from whisper.decoding import (
+    DecodingOptions, DecodingResult, SuppressBlank, SuppressTokens, ApplyTimestampRules
+)
+from whisper.tokenizer import get_tokenizer
+from whisper.utils import compression_ratio
+from cancellation import TranscriptionCancelled, cancellable
+from mel_cache import get_mel_cache
+from metrics import get_metrics
+
+
+# Whisper's own defaults for model.transcribe()
+MAX_INITIAL_TIMESTAMP = 1.0
+SECONDS_PER_WINDOW = N_FRAMES * HOP_LENGTH / SAMPLE_RATE
+# Seconds per timestamp token (one encoder output frame)
+TIME_PRECISION = SECONDS_PER_WINDOW / (N_FRAMES // 2)
+
+# How often a waiting caller checks its cancel token
+CANCEL_POLL_SECONDS = 0.1
+
+
+def _env_number(name, default, cast=int):
+    """Read a non-negative number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value >= 0 else default
+
+
+def batched_decoding_enabled():
+    """Whether transcribers may batch windows (BATCHED_DECODING, default: off)."""
+    return os.environ.get('BATCHED_DECODING', '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+def max_batch_windows():
+    """Windows decoded together per batch (BATCHED_DECODING_MAX_WINDOWS, default: 4)."""
+    return max(1, _env_number('BATCHED_DECODING_MAX_WINDOWS', 4))
+
+
+def supports(options, prompt=None):
+    """
+    Whether a request's decoding can run batched.
+
+    Args:
+        options (dict): Keyword arguments for model.transcribe()
+        prompt (str, optional): Text the first window is conditioned on
+
+    Returns:
+        bool: True for greedy decoding without conditioning, prompt or word timestamps
+    """
+    temperature = options.get('temperature', 0.0)
+    first = temperature[0] if isinstance(temperature, (list, tuple)) else temperature
+    return (
+        first == 0
+        and options.get('beam_size') is None
+        and options.get('condition_on_previous_text') is False
+        and not options.get('word_timestamps')
+        and not options.get('initial_prompt')
+        and not prompt
+    )
+
+
+class BatchedDecoder:
+    """Greedy decoder loop over a batch of windows, with reusable key/value buffers."""
+
+    def __init__(self, model):
+        """
+        Args:
+            model (whisper.model.Whisper): Model whose text decoder runs the batches
+        """
+        self.model = model
+        dims = model.dims
+        self.n_head = dims.n_text_head
+        self.head_dim = dims.n_text_state // dims.n_text_head
+        self.n_ctx = dims.n_text_ctx
+        self.sample_len = dims.n_text_ctx // 2
+        self.capacity = 0
+        self.length = 0
+        self._self_kv = []
+        self._cross_kv = []
+        self._tokens = None
+
+    def tokenizer(self, language):
+        """Transcription tokenizer of the model for a language."""
+        return get_tokenizer(
+            self.model.is_multilingual, num_languages=self.model.num_languages,
+            language=language, task='transcribe'
+        )
+
+    def _reserve(self, rows, length, audio_features):
+        """Grow the buffers to hold rows windows of length tokens (they never shrink)."""
+        n_audio_ctx = audio_features.shape[1]
+        dtype, device = audio_features.dtype, audio_features.device
+        if (rows <= self.capacity and length <= self.length and self._self_kv
+                and self._self_kv[0][0].dtype == dtype and self._cross_kv[0][0].shape[2] == n_audio_ctx):
+            return
+        self.capacity = max(rows, self.capacity)
+        self.length = max(length, self.length)
+        self._self_kv = [
+            tuple(torch.empty(self.capacity, self.n_head, self.length, self.head_dim, dtype=dtype, device=device)
+                  for _ in range(2))
+            for _ in self.model.decoder.blocks
+        ]
+        self._cross_kv = [
+            tuple(torch.empty(self.capacity, self.n_head, n_audio_ctx, self.head_dim, dtype=dtype, device=device)
+                  for _ in range(2))
+            for _ in self.model.decoder.blocks
+        ]
+        self._tokens = torch.empty(self.capacity, self.length, dtype=torch.long, device=device)
+
+    def buffer_mb(self):
+        """Memory held by the key/value and token buffers."""
+        tensors = [t for pair in self._self_kv + self._cross_kv for t in pair]
+        if self._tokens is not None:
+            tensors.append(self._tokens)
+        return round(sum(t.numel() * t.element_size() for t in tensors) / (1024 * 1024), 2)
+
+    def _heads(self, x):
+        """(rows, tokens, n_state) -> (rows, heads, tokens, head_dim)"""
+        return x.view(x.shape[0], x.shape[1], self.n_head, self.head_dim).transpose(1, 2)
+
+    def _merge(self, x):
+        """(rows, heads, tokens, head_dim) -> (rows, tokens, n_state)"""
+        return x.transpose(1, 2).flatten(start_dim=2)
+
+    def _project_cross(self, rows, audio_features):
+        for block, (keys, values) in zip(self.model.decoder.blocks, self._cross_kv):
+            keys[:rows].copy_(self._heads(block.cross_attn.key(audio_features)))
+            values[:rows].copy_(self._heads(block.cross_attn.value(audio_features)))
+
+    def _forward(self, tokens, rows, position):
+        """
+        Run new tokens through the decoder, appending their keys/values to the buffers.
+
+        Args:
+            tokens (torch.Tensor): New tokens, shape (rows, new)
+            rows (int): Rows in the batch
+            position (int): Tokens already in the buffers
+
+        Returns:
+            torch.Tensor: Final hidden states, shape (rows, new, n_state)
+        """
+        decoder = self.model.decoder
+        count = tokens.shape[1]
+        end = position + count
+        x = decoder.token_embedding(tokens) + decoder.positional_embedding[position:end]
+        x = x.to(self._cross_kv[0][0].dtype)
+        # The prompt attends causally within itself; a single new token sees everything
+        causal = count > 1
+        for block, (keys, values), (cross_keys, cross_values) in zip(
+                decoder.blocks, self._self_kv, self._cross_kv):
+            attn = block.attn
+            h = block.attn_ln(x)
+            keys[:rows, :, position:end].copy_(self._heads(attn.key(h)))
+            values[:rows, :, position:end].copy_(self._heads(attn.value(h)))
+            # Default scale 1/sqrt(head_dim) equals Whisper's head_dim**-0.25 on both q and k
+            out = F.scaled_dot_product_attention(
+                self._heads(attn.query(h)), keys[:rows, :, :end], values[:rows, :, :end],
+                is_causal=causal
+            )
+            x = x + attn.out(self._merge(out))
+            h = block.cross_attn_ln(x)
+            out = F.scaled_dot_product_attention(
+                self._heads(block.cross_attn.query(h)), cross_keys[:rows], cross_values[:rows]
+            )
+            x = x + block.cross_attn.out(self._merge(out))
+            x = x + block.mlp(block.mlp_ln(x))
+        return decoder.ln(x)
+
+    def _logits(self, hidden):
+        weight = self.model.decoder.token_embedding.weight
+        return (hidden @ weight.to(hidden.dtype).T).float()
+
+    def _compact(self, keep, rows, position):
+        """Move the rows in keep to the front of every buffer."""
+        index = torch.tensor(keep, device=self._tokens.device)
+        count = len(keep)
+        for keys, values in self._self_kv:
+            keys[:count, :, :position].copy_(keys[:rows, :, :position].index_select(0, index))
+            values[:count, :, :position].copy_(values[:rows, :, :position].index_select(0, index))
+        for keys, values in self._cross_kv:
+            keys[:count].copy_(keys[:rows].index_select(0, index))
+            values[:count].copy_(values[:rows].index_select(0, index))
+        self._tokens[:count, :position].copy_(self._tokens[:rows, :position].index_select(0, index))
+
+    @torch.no_grad()
+    def decode(self, audio_features, languages, stop=None):
+        """
+        Greedily decode a batch of encoded windows.
+
+        Args:
+            audio_features (torch.Tensor): Encoder output, shape (windows, n_audio_ctx, n_audio_state)
+            languages (list): Language code of each window (windows of
+                different languages can share a batch)
+            stop (callable, optional): stop(window index) -> True to abandon
+                a window (checked every token)
+
+        Returns:
+            list: whisper.decoding.DecodingResult per window (temperature 0),
+                or None for abandoned windows
+        """
+        total = audio_features.shape[0]
+        # Start sequences differ only in their language token
+        initial_tokens = [self.tokenizer(language).sot_sequence for language in languages]
+        tokenizer = self.tokenizer(languages[0])
+        sample_begin = len(initial_tokens[0])
+        max_length = min(sample_begin + self.sample_len, self.n_ctx)
+        self._reserve(total, max_length, audio_features)
+        self._project_cross(total, audio_features)
+
+        eot = tokenizer.eot
+        filters = [
+            SuppressBlank(tokenizer, sample_begin),
+            SuppressTokens(self._suppress_tokens(tokenizer)),
+            ApplyTimestampRules(tokenizer, sample_begin, round(MAX_INITIAL_TIMESTAMP / TIME_PRECISION)),
+        ]
+
+        tokens = self._tokens
+        tokens[:total, :sample_begin] = torch.tensor(initial_tokens, device=tokens.device)
+        rows = list(range(total))  # window of each batch row
+        sum_logprobs = torch.zeros(total)
+        no_speech_probs = [float('nan')] * total
+        finished = {}
+        length = sample_begin
+        new = tokens[:total, :sample_begin]
+
+        while rows and length < max_length:
+            count = len(rows)
+            hidden = self._forward(new, count, length - new.shape[1])
+            if length == sample_begin and tokenizer.no_speech is not None:
+                # No-speech probability is read at the start-of-transcript token
+                probs = self._logits(hidden[:, 0]).softmax(dim=-1)
+                no_speech_probs = probs[:, tokenizer.no_speech].tolist()
+            logits = self._logits(hidden[:, -1])
+            current = tokens[:count, :length]
+            for logit_filter in filters:
+                logit_filter.apply(logits, current)
+
+            next_tokens = logits.argmax(dim=-1)
+            logprobs = F.log_softmax(logits, dim=-1)
+            sum_logprobs[:count] += logprobs[torch.arange(count), next_tokens].cpu()
+            tokens[:count, length] = next_tokens
+            length += 1
+
+            done = (next_tokens == eot).tolist()
+            if stop is not None:
+                done = [d or stop(window) for d, window in zip(done, rows)]
+            keep = [index for index, d in enumerate(done) if not d]
+            for index, d in enumerate(done):
+                if d:
+                    finished[rows[index]] = (tokens[index, sample_begin:length].tolist(),
+                                             float(sum_logprobs[index]), no_speech_probs[index])
+            if len(keep) < count:
+                if keep:
+                    self._compact(keep, count, length)
+                    index = torch.tensor(keep)
+                    sum_logprobs[:len(keep)] = sum_logprobs[:count][index]
+                    no_speech_probs = [no_speech_probs[i] for i in keep]
+                rows = [rows[i] for i in keep]
+            new = tokens[:len(rows), length - 1:length]
+
+        # Windows that ran out of room end where they stopped
+        for index, window in enumerate(rows):
+            finished[window] = (tokens[index, sample_begin:length].tolist(),
+                                float(sum_logprobs[index]), no_speech_probs[index])
+
+        results = []
+        for window in range(total):
+            sampled, sum_logprob, no_speech_prob = finished[window]
+            if stop is not None and stop(window):
+                results.append(None)
+                continue
+            if eot in sampled:
+                sampled = sampled[:sampled.index(eot)]
+            text = tokenizer.decode(sampled).strip()
+            results.append(DecodingResult(
+                audio_features=audio_features[window],
+                language=languages[window],
+                tokens=sampled,
+                text=text,
+                avg_logprob=sum_logprob / (len(sampled) + 1),
+                no_speech_prob=no_speech_prob,
+                temperature=0.0,
+                compression_ratio=compression_ratio(text)
+            ))
+        return results
+
+    @staticmethod
+    def _suppress_tokens(tokenizer):
+        """Whisper's default suppression ('-1': non-speech symbols, plus the special tokens)."""
+        suppress = list(tokenizer.non_speech_tokens) + [
+            tokenizer.transcribe, tokenizer.translate, tokenizer.sot,
+            tokenizer.sot_prev, tokenizer.sot_lm
+        ]
+        if tokenizer.no_speech is not None:
+            suppress.append(tokenizer.no_speech)
+        return sorted(set(suppress))
+
+
+class _Window:
+    """One window waiting to be decoded."""
+
+    def __init__(self, mel, language, cancel):
+        self.mel = mel
+        self.language = language
+        self.cancel = cancel
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class WindowBatcher:
+    """
+    Decodes the windows of every transcription running on one model in
+    shared batches, on a thread of its own.
+    """
+
+    def __init__(self, model, inference_lock, max_windows=None, wait_ms=None):
+        """
+        Args:
+            model (whisper.model.Whisper): Model to decode with
+            inference_lock (threading.Lock): The model's inference lock, held
+                while a batch runs
+            max_windows (int): Windows per batch (BATCHED_DECODING_MAX_WINDOWS,
+                default: 4); bounds the key/value buffers
+            wait_ms (float): How long a batch waits for windows of other
+                requests to join it (BATCHED_DECODING_WAIT_MS, default: 20)
+        """
+        self.model = model
+        self.inference_lock = inference_lock
+        self.max_windows = max_windows if max_windows is not None else max_batch_windows()
+        self.wait_seconds = (wait_ms if wait_ms is not None
+                             else _env_number('BATCHED_DECODING_WAIT_MS', 20.0, float)) / 1000
+        self.decoder = BatchedDecoder(model)
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._batches = 0
+        self._windows = 0
+        self._tokens = 0
+        self._decode_seconds = 0.0
+        self._metrics = get_metrics()
+
+    def decode(self, mels, languages, cancel=None):
+        """
+        Decode windows greedily, batched with whatever other requests send.
+
+        Args:
+            mels (torch.Tensor): Features, shape (windows, n_mels, N_FRAMES)
+            languages (list): Language code of each window
+            cancel (CancelToken, optional): Abandons the windows when it trips
+
+        Returns:
+            list: whisper.decoding.DecodingResult per window
+
+        Raises:
+            TranscriptionCancelled: If cancel trips
+        """
+        windows = [_Window(mel, language, cancel) for mel, language in zip(mels, languages)]
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='window-batcher', daemon=True)
+                self._thread.start()
+            self._queue.extend(windows)
+            self._condition.notify()
+        for window in windows:
+            while not window.done.wait(CANCEL_POLL_SECONDS):
+                if cancel is not None:
+                    cancel.check()
+            if window.error is not None:
+                raise window.error
+        return [window.result for window in windows]
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            deadline = time.monotonic() + self.wait_seconds
+            while len(self._queue) < self.max_windows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_windows, len(self._queue)))]
+
+    def _run(self):
+        while True:
+            batch = []
+            for window in self._next_batch():
+                if window.cancel is not None and window.cancel.cancelled:
+                    window.error = TranscriptionCancelled(window.cancel.reason)
+                    window.done.set()
+                else:
+                    batch.append(window)
+            if not batch:
+                continue
+            try:
+                self._decode_batch(batch)
+            except Exception as e:
+                print(f"⚠️  Batched decoding failed: {e}")
+                for window in batch:
+                    window.error = e
+            for window in batch:
+                window.done.set()
+
+    def _decode_batch(self, batch):
+        def stop(index):
+            cancel = batch[index].cancel
+            return cancel is not None and cancel.cancelled
+
+        with self.inference_lock, torch.no_grad():
+            mel = torch.stack([window.mel for window in batch]).to(self.model.device)
+            audio_features = self.model.encoder(mel)
+            start = time.perf_counter()
+            results = self.decoder.decode(audio_features, [window.language for window in batch], stop)
+            seconds = time.perf_counter() - start
+        tokens = 0
+        for window, result in zip(batch, results):
+            if result is None:
+                window.error = TranscriptionCancelled(window.cancel.reason)
+            else:
+                window.result = result
+                tokens += len(result.tokens) + 1
+        with self._condition:
+            self._batches += 1
+            self._windows += len(batch)
+            self._tokens += tokens
+            self._decode_seconds += seconds
+        self._metrics.increment('batched_decoding.batches')
+        self._metrics.increment('batched_decoding.windows', len(batch))
+        self._metrics.increment('batched_decoding.tokens', tokens)
+        self._metrics.record_timing('batched_decoding.seconds', seconds)
+
+    def transcribe(self, audio, language=None, options=None, cancel=None):
+        """
+        Transcribe a waveform in fixed 30-second windows, decoded in batches.
+
+        The language is detected on the first window when not given. Windows
+        that fail Whisper's checks are decoded again by model.decode() at the
+        next temperatures of options['temperature'].
+
+        Args:
+            audio (np.ndarray): 16kHz mono float32 waveform
+            language (str, optional): Language code (detected when None)
+            options (dict): Keyword arguments for model.transcribe() (see supports())
+            cancel (CancelToken, optional): Stops the transcription early
+
+        Returns:
+            dict: Result shaped like model.transcribe()'s: 'text', 'segments', 'language'
+
+        Raises:
+            TranscriptionCancelled: If cancel trips
+        """
+        options = options or {}
+        model = self.model
+        mel = get_mel_cache().features(audio, model.dims.n_mels, padding=N_SAMPLES)
+        content_frames = mel.shape[-1] - N_FRAMES
+        starts = list(range(0, max(content_frames, 1), N_FRAMES))
+        mels = torch.stack([self._window(mel, start) for start in starts])
+
+        if language is None:
+            if model.is_multilingual:
+                with self.inference_lock:
+                    _, probs = model.detect_language(mels[0].to(model.device))
+                language = max(probs, key=probs.get)
+            else:
+                language = 'en'
+
+        results = self.decode(mels, [language] * len(starts), cancel)
+        results = self._fallback(mels, results, language, options, cancel)
+
+        tokenizer = self.decoder.tokenizer(language)
+        segments = []
+        for start, result in zip(starts, results):
+            if result is None:
+                continue
+            offset = start * HOP_LENGTH / SAMPLE_RATE
+            duration = min(N_FRAMES, content_frames - start) * HOP_LENGTH / SAMPLE_RATE
+            for segment in window_segments(result, tokenizer, offset, duration):
+                segment.update(id=len(segments), seek=start)
+                segments.append(segment)
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': language
+        }
+
+    @staticmethod
+    def _window(mel, start):
+        window = mel[:, start:start + N_FRAMES]
+        if window.shape[-1] < N_FRAMES:
+            window = F.pad(window, (0, N_FRAMES - window.shape[-1]))
+        return window
+
+    def _fallback(self, mels, results, language, options, cancel):
+        """Re-decode failed windows at the next temperatures; drop silent ones."""
+        temperature = options.get('temperature', 0.0)
+        temperatures = list(temperature) if isinstance(temperature, (list, tuple)) else [temperature]
+        compression_threshold = options.get('compression_ratio_threshold', 2.4)
+        logprob_threshold = options.get('logprob_threshold', -1.0)
+        no_speech_threshold = options.get('no_speech_threshold', 0.6)
+
+        def failed(result):
+            needs_fallback = (
+                (compression_threshold is not None and result.compression_ratio > compression_threshold)
+                or (logprob_threshold is not None and result.avg_logprob < logprob_threshold)
+            )
+            if no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold:
+                needs_fallback = False
+            return needs_fallback
+
+        final = []
+        for mel, result in zip(mels, results):
+            for temperature in temperatures[1:]:
+                if not failed(result):
+                    break
+                self._metrics.increment('batched_decoding.fallbacks')
+                with self.inference_lock, cancellable(cancel):
+                    result = self.model.decode(mel.to(self.model.device), DecodingOptions(
+                        language=language, temperature=temperature,
+                        best_of=options.get('best_of'), fp16=False
+                    ))
+            silent = (no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold
+                      and not (logprob_threshold is not None and result.avg_logprob > logprob_threshold))
+            final.append(None if silent else result)
+        return final
+
+    def status(self):
+        """Batches, windows and decoder throughput so far."""
+        with self._condition:
+            return {
+                'max_windows': self.max_windows,
+                'wait_ms': round(self.wait_seconds * 1000, 1),
+                'queued_windows': len(self._queue),
+                'batches': self._batches,
+                'windows': self._windows,
+                'average_batch': round(self._windows / self._batches, 2) if self._batches else None,
+                'tokens_per_second': round(self._tokens / self._decode_seconds, 1) if self._decode_seconds else None,
+                'buffer_mb': self.decoder.buffer_mb()
+            }
+
+
+def window_segments(result, tokenizer, offset, duration):
+    """
+    Split one window's decode into segments at its timestamp tokens, as
+    model.transcribe() does, except that text after the last timestamp pair
+    (cut off at the window's end) is kept rather than decoded again.
+
+    Args:
+        result (whisper.decoding.DecodingResult): Decode of the window
+        tokenizer (whisper.tokenizer.Tokenizer): Tokenizer of the model
+        offset (float): Seconds into the audio where the window starts
+        duration (float): Seconds of audio in the window
+
+    Returns:
+        list: Segment dicts like model.transcribe()'s (without 'id' and 'seek')
+    """
+    tokens = list(result.tokens)
+    timestamp_begin = tokenizer.timestamp_begin
+
+    def seconds(token):
+        return (token - timestamp_begin) * TIME_PRECISION
+
+    # A segment ends at every pair of consecutive timestamps
+    is_timestamp = [token >= timestamp_begin for token in tokens]
+    boundaries = [i + 1 for i in range(len(tokens) - 1) if is_timestamp[i] and is_timestamp[i + 1]]
+    if not boundaries:
+        stamps = [token for token in tokens if token >= timestamp_begin]
+        end = seconds(stamps[-1]) if stamps and stamps[-1] != timestamp_begin else duration
+        pieces = [(0.0, end, tokens)]
+    else:
+        pieces = []
+        previous = 0
+        for boundary in boundaries:
+            piece = tokens[previous:boundary]
+            pieces.append((seconds(piece[0]), seconds(piece[-1]), piece))
+            previous = boundary
+        rest = tokens[previous:]
+        if rest:
+            start = seconds(rest[0]) if is_timestamp[previous] else pieces[-1][1]
+            end = seconds(rest[-1]) if len(rest) > 1 and rest[-1] >= timestamp_begin else duration
+            pieces.append((start, end, rest))
+
+    segments = []
+    for start, end, piece in pieces:
+        text = tokenizer.decode([token for token in piece if token < tokenizer.eot])
+        end = min(end, duration)
+        if not text.strip() or end <= start:
+            continue
+        segments.append({
+            'start': round(offset + start, 3),
+            'end': round(offset + end, 3),
+            'text': text,
+            'tokens': piece,
+            'temperature': result.temperature,
+            'avg_logprob': result.avg_logprob,
+            'compression_ratio': result.compression_ratio,
+            'no_speech_prob': result.no_speech_prob
+        })
+    return segments
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_size):
+    """Get the process-wide window batcher of a model size."""
+    from model_registry import get_registry
+
+    with _batchers_lock:
+        batcher = _batchers.get(model_size)
+        if batcher is None:
+            registry = get_registry()
+            batcher = WindowBatcher(registry.get(model_size), registry.inference_lock(model_size))
+            _batchers[model_size] = batcher
+        return batcher
+
+
+def status():
+    """Whether batching is on, and each model's batcher."""
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {
+        'enabled': batched_decoding_enabled(),
+        'models': {size: batcher.status() for size, batcher in batchers.items()}
+    }
+
+
+def benchmark(path, model_size='base', language=None, max_windows=None):
+    """
+    Decode a file's windows greedily with model.decode() one at a time, then
+    batched, and compare the decoder's tokens per second.
+
+    The windows are encoded once up front, so only the decoder is timed.
+
+    Args:
+        path (str): Audio file
+        model_size (str): Whisper model to run
+        language (str, optional): Language code (detected when None)
+        max_windows (int, optional): Windows per batch
+
+    Returns:
+        dict: Per mode ('per_window', 'batched'): seconds, tokens and
+            tokens_per_second; plus 'windows' and 'matching_windows' (same text)
+    """
+    from preprocess_audio import load_audio
+    from model_registry import get_registry
+
+    audio = load_audio(path)
+    registry = get_registry()
+    model = registry.get(model_size)
+    batcher = WindowBatcher(model, registry.inference_lock(model_size), max_windows=max_windows, wait_ms=0)
+    mel = get_mel_cache().features(audio, model.dims.n_mels, padding=N_SAMPLES)
+    starts = range(0, max(mel.shape[-1] - N_FRAMES, 1), N_FRAMES)
+    mels = torch.stack([batcher._window(mel, start) for start in starts])
+    with torch.no_grad():
+        features = model.encoder(mels)
+        if language is None:
+            _, probs = model.detect_language(features[:1])
+            language = max(probs[0], key=probs[0].get)
+
+    results = {}
+    start = time.perf_counter()
+    per_window = [model.decode(row.unsqueeze(0), DecodingOptions(language=language, fp16=False))[0]
+                  for row in features]
+    seconds = time.perf_counter() - start
+    tokens = sum(len(result.tokens) + 1 for result in per_window)
+    results['per_window'] = {'seconds': round(seconds, 3), 'tokens': tokens,
+                             'tokens_per_second': round(tokens / seconds, 1)}
+
+    start = time.perf_counter()
+    batched = []
+    for first in range(0, len(features), batcher.max_windows):
+        rows = features[first:first + batcher.max_windows]
+        batched.extend(batcher.decoder.decode(rows, [language] * len(rows)))
+    seconds = time.perf_counter() - start
+    tokens = sum(len(result.tokens) + 1 for result in batched)
+    results['batched'] = {'seconds': round(seconds, 3), 'tokens': tokens,
+                          'tokens_per_second': round(tokens / seconds, 1)}
+
+    results['windows'] = len(features)
+    results['matching_windows'] = sum(a.text == b.text for a, b in zip(per_window, batched))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched decoding tools")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    bench = subcommands.add_parser('benchmark', help="Compare decoder tokens/second with the per-window loop")
+    bench.add_argument('audio', help="Audio file")
+    bench.add_argument('--model', default='base', help="Whisper model size (default: base)")
+    bench.add_argument('--language', default=None, help="Language code (default: detect)")
+    bench.add_argument('--windows', type=int, default=None, help="Windows per batch (default: 4)")
+    args = parser.parse_args()
+
+    results = benchmark(args.audio, args.model, args.language, args.windows)
+    print(f"{'':<12}{'seconds':>9}{'tokens':>8}{'tokens/s':>10}")
+    for mode in ('per_window', 'batched'):
+        row = results[mode]
+        print(f"{mode:<12}{row['seconds']:>9}{row['tokens']:>8}{row['tokens_per_second']:>10}")
+    print(f"\n{results['matching_windows']}/{results['windows']} windows decoded to the same text")
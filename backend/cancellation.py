@@ -0,0 +1,195 @@
+"""
+Cooperative cancellation of transcriptions.
+A CancelToken travels with a request through decode, inference and NLP
+correction. It trips when the request's deadline passes, when the client
+disconnects, or when cancel() is called, and each step checks it often
+enough to stop within moments:
+  - FFmpeg decodes are killed (DecoderService.run)
+  - every encoder/decoder forward pass of a model checks the token of the
+    thread running it, so Whisper stops mid-window, between tokens
+  - NLP correction checks it between segments
+"""
+import contextlib
+import select
+import socket
+import threading
+import time
+
+
+# How often (seconds) a token may poll the client's socket
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# WSGI environ key of a callable telling whether the client has gone, set by
+# servers that track connections themselves (asgi.py)
+DISCONNECTED_ENVIRON_KEY = 'stt.client_disconnected'
+
+
+class TranscriptionCancelled(RuntimeError):
+    """A transcription was stopped before it finished."""
+
+    def __init__(self, reason):
+        """
+        Args:
+            reason (str): 'deadline', 'disconnected' or 'cancelled'
+        """
+        messages = {
+            'deadline': 'Transcription exceeded its deadline',
+            'disconnected': 'Client disconnected'
+        }
+        super().__init__(messages.get(reason, 'Transcription was cancelled'))
+        self.reason = reason
+
+
+def socket_closed(sock):
+    """
+    Check whether the peer has closed a connection, without consuming data.
+
+    Args:
+        sock (socket.socket): Client connection
+
+    Returns:
+        bool: True if the peer hung up (or the socket is unusable)
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except OSError:
+        return True
+    except ValueError:
+        # TLS sockets don't support MSG_PEEK; assume the client is still there
+        return False
+
+
+def client_socket(environ):
+    """Client connection of a WSGI request, where the server exposes it."""
+    return environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+
+
+class CancelToken:
+    """Cancellation state shared by every step of one transcription."""
+
+    def __init__(self, deadline=None, disconnected=None):
+        """
+        Args:
+            deadline (float, optional): Seconds from now until the
+                transcription is abandoned
+            disconnected (callable, optional): Returns True once the client
+                has gone (polled at most every DISCONNECT_POLL_INTERVAL)
+        """
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self._disconnected = disconnected
+        self._next_poll = 0.0
+        self._reason = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_request(cls, environ, deadline=None):
+        """
+        Token for a WSGI request: its deadline plus disconnect detection when
+        the server reports disconnects or exposes the client socket.
+
+        Args:
+            environ (dict): WSGI environ
+            deadline (float, optional): Seconds the request may take
+        """
+        disconnected = environ.get(DISCONNECTED_ENVIRON_KEY)
+        if disconnected is None:
+            sock = client_socket(environ)
+            disconnected = (lambda: socket_closed(sock)) if sock is not None else None
+        return cls(deadline, disconnected)
+
+    def cancel(self, reason='cancelled'):
+        """Trip the token (the first reason sticks)."""
+        with self._lock:
+            if self._reason is None:
+                self._reason = reason
+
+    @property
+    def reason(self):
+        """Why the token tripped, or None while the work should continue."""
+        if self._reason is None:
+            now = time.monotonic()
+            if self.deadline is not None and now >= self.deadline:
+                self.cancel('deadline')
+            elif self._disconnected is not None and now >= self._next_poll:
+                self._next_poll = now + DISCONNECT_POLL_INTERVAL
+                if self._disconnected():
+                    self.cancel('disconnected')
+        return self._reason
+
+    @property
+    def cancelled(self):
+        """Whether the work should stop."""
+        return self.reason is not None
+
+    def remaining(self):
+        """Seconds until the deadline (None without one)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """
+        Raises:
+            TranscriptionCancelled: If the token has tripped
+        """
+        reason = self.reason
+        if reason is not None:
+            raise TranscriptionCancelled(reason)
+
+
+_local = threading.local()
+
+
+def current_token():
+    """Token of the work running on this thread, if any."""
+    return getattr(_local, 'token', None)
+
+
+@contextlib.contextmanager
+def cancellable(token):
+    """
+    Make token the current thread's token inside the with-block (no-op for None).
+
+    Args:
+        token (CancelToken): Token to check from checkpoint()
+    """
+    if token is None:
+        yield
+        return
+    token.check()
+    previous = current_token()
+    _local.token = token
+    try:
+        yield
+    finally:
+        _local.token = previous
+
+
+def checkpoint():
+    """
+    Stop here if this thread's work has been cancelled.
+
+    Raises:
+        TranscriptionCancelled: If the current token has tripped
+    """
+    token = current_token()
+    if token is not None:
+        token.check()
+
+
+def install(model):
+    """
+    Check the current thread's token before every encoder and decoder
+    forward pass of a model (idempotent).
+
+    Args:
+        model (whisper.model.Whisper): Model to instrument
+    """
+    if getattr(model, '_cancellation_installed', False):
+        return
+    for module in (model.encoder, model.decoder):
+        module.register_forward_pre_hook(lambda module, args: checkpoint())
+    model._cancellation_installed = True
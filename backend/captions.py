@@ -0,0 +1,201 @@
+"""
+Caption export.
+Renders saved transcript segments as SRT, WebVTT, TTML or plain text,
+without running the model again. Segments are reflowed into cues that fit
+the caption conventions:
+  - at most max_lines lines of max_line_length characters per cue (long
+    segments are split at word boundaries, their time shared out by length)
+  - at most max_cps characters per second: a cue that would flash by too
+    fast is held on screen into the gap before the next one
+
+Output is produced cue by cue, so long transcripts can be streamed.
+"""
+from xml.sax.saxutils import escape, quoteattr
+
+
+# format -> (mimetype, file extension)
+CAPTION_FORMATS = {
+    'srt': ('application/x-subrip', 'srt'),
+    'vtt': ('text/vtt', 'vtt'),
+    'ttml': ('application/ttml+xml', 'ttml'),
+    'txt': ('text/plain', 'txt'),
+}
+
+# Broadcast caption defaults (BBC/Netflix style guides)
+DEFAULT_MAX_LINE_LENGTH = 42
+DEFAULT_MAX_LINES = 2
+DEFAULT_MAX_CPS = 17.0
+
+# Bounds accepted from requests
+LINE_LENGTH_RANGE = (10, 200)
+MAX_LINES_RANGE = (1, 5)
+CPS_RANGE = (5.0, 60.0)
+
+
+def caption_options(args):
+    """
+    Read reflow options from request arguments.
+
+    Args:
+        args (dict): 'max_line_length', 'max_lines' and 'max_cps' (all optional)
+
+    Returns:
+        dict: Keyword arguments for reflow()
+
+    Raises:
+        ValueError: If an option is not a number in its allowed range
+    """
+    options = {}
+    for name, cast, default, (low, high) in (
+            ('max_line_length', int, DEFAULT_MAX_LINE_LENGTH, LINE_LENGTH_RANGE),
+            ('max_lines', int, DEFAULT_MAX_LINES, MAX_LINES_RANGE),
+            ('max_cps', float, DEFAULT_MAX_CPS, CPS_RANGE)):
+        value = args.get(name)
+        try:
+            value = cast(value) if value not in (None, '') else default
+        except ValueError:
+            value = None
+        if value is None or not low <= value <= high:
+            raise ValueError(f'{name} must be a number between {low} and {high}')
+        options[name] = value
+    return options
+
+
+def _wrap(text, max_line_length):
+    """Break text into lines at word boundaries (over-long words are cut)."""
+    lines = []
+    line = ''
+    for word in text.split():
+        # Scripts without spaces (CJK) arrive as one long "word"
+        while len(word) > max_line_length:
+            if line:
+                lines.append(line)
+                line = ''
+            lines.append(word[:max_line_length])
+            word = word[max_line_length:]
+        if not word:
+            continue
+        if line and len(line) + 1 + len(word) > max_line_length:
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}' if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _split_segment(segment, max_line_length, max_lines):
+    """Split one segment into cues, sharing its time out by text length."""
+    lines = _wrap(segment['text'], max_line_length)
+    groups = [lines[i:i + max_lines] for i in range(0, len(lines), max_lines)]
+    total = sum(len(' '.join(group)) for group in groups)
+    start, duration = segment['start'], max(segment['end'] - segment['start'], 0.0)
+    cues = []
+    for group in groups:
+        share = duration * len(' '.join(group)) / total if total else 0.0
+        cues.append({'start': start, 'end': start + share, 'lines': group,
+                     'speaker': segment.get('speaker')})
+        start += share
+    return cues
+
+
+def reflow(segments, max_line_length=DEFAULT_MAX_LINE_LENGTH, max_lines=DEFAULT_MAX_LINES,
+           max_cps=DEFAULT_MAX_CPS):
+    """
+    Turn segments into caption cues.
+
+    Args:
+        segments (iterable): Segment dicts with 'start', 'end', 'text' and
+            optionally 'speaker', in time order (read lazily)
+        max_line_length (int): Characters per line
+        max_lines (int): Lines per cue
+        max_cps (float): Reading speed limit, in characters per second
+
+    Yields:
+        dict: Cue with 'start', 'end', 'lines' and 'speaker'
+    """
+    pending = None
+    for segment in segments:
+        if not (segment.get('text') or '').strip():
+            continue
+        for cue in _split_segment(segment, max_line_length, max_lines):
+            if pending is not None:
+                yield _hold(pending, cue['start'], max_cps)
+            pending = cue
+    if pending is not None:
+        yield _hold(pending, None, max_cps)
+
+
+def _hold(cue, next_start, max_cps):
+    """Extend a cue that is too short to read, up to the next cue's start."""
+    characters = sum(len(line) for line in cue['lines'])
+    needed = cue['start'] + characters / max_cps
+    if cue['end'] < needed:
+        cue['end'] = needed if next_start is None else max(cue['end'], min(needed, next_start))
+    return cue
+
+
+def _timestamp(seconds, separator):
+    milliseconds = int(round(max(seconds, 0.0) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}'
+
+
+def render(cues, caption_format, language=None):
+    """
+    Render cues in a caption format.
+
+    Speakers (from diarization) are shown as WebVTT voice spans, and in the
+    other formats as a 'SPEAKER_1:' prefix whenever the speaker changes.
+
+    Args:
+        cues (iterable): Cues from reflow()
+        caption_format (str): One of CAPTION_FORMATS
+        language (str, optional): Language code (VTT/TTML headers)
+
+    Yields:
+        str: Output, one cue at a time
+    """
+    if caption_format not in CAPTION_FORMATS:
+        raise ValueError('Invalid format. Allowed formats: ' + ', '.join(CAPTION_FORMATS))
+
+    if caption_format == 'vtt':
+        yield 'WEBVTT\n' + (f'Language: {language}\n' if language else '') + '\n'
+    elif caption_format == 'ttml':
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               f'<tt xmlns="http://www.w3.org/ns/ttml" xml:lang={quoteattr(language or "")}>\n'
+               '<body>\n<div>\n')
+
+    previous_speaker = None
+    for index, cue in enumerate(cues, start=1):
+        lines = cue['lines']
+        speaker = cue.get('speaker')
+        changed = speaker is not None and speaker != previous_speaker
+        previous_speaker = speaker
+
+        if caption_format == 'srt':
+            text = '\n'.join(lines)
+            if changed:
+                text = f'{speaker}: {text}'
+            yield (f"{index}\n{_timestamp(cue['start'], ',')} --> {_timestamp(cue['end'], ',')}\n"
+                   f"{text}\n\n")
+        elif caption_format == 'vtt':
+            text = '\n'.join(escape(line) for line in lines)
+            if speaker is not None:
+                text = f'<v {escape(speaker)}>{text}'
+            yield f"{_timestamp(cue['start'], '.')} --> {_timestamp(cue['end'], '.')}\n{text}\n\n"
+        elif caption_format == 'ttml':
+            text = '<br/>'.join(escape(line) for line in lines)
+            if changed:
+                text = f'{escape(speaker)}: {text}'
+            yield (f'<p begin="{_timestamp(cue["start"], ".")}" end="{_timestamp(cue["end"], ".")}">'
+                   f'{text}</p>\n')
+        else:
+            text = ' '.join(lines)
+            yield f'{speaker}: {text}\n' if changed else f'{text}\n'
+
+    if caption_format == 'ttml':
+        yield '</div>\n</body>\n</tt>\n'
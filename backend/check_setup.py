@@ -69,7 +69,7 @@ def main():
     required_files = [
         'app.py',
         'preprocess_audio.py',
-        'transcribe_whisper.py',
+        'multilingual_transcribe.py',
         'requirements.txt'
     ]
     
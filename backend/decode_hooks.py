@@ -0,0 +1,91 @@
+"""
+Per-thread hooks around Whisper's decode step.
+model.transcribe() calls model.decode() once per 30-second window (and again
+for each temperature fallback). Models are shared between threads through
+the registry, so rather than patching a model for the duration of one
+request, a single wrapper is installed on each model and runs whichever
+hooks the calling thread has pushed.
+
+A hook is a callable hook(model, mel, options, decode) that may change the
+DecodingOptions, inspect the result, or raise, and must return
+decode(mel, options) (or its own DecodingResult).
+"""
+import contextlib
+import dataclasses
+import threading
+from whisper.decoding import DecodingOptions
+
+
+_local = threading.local()
+
+
+def _active_hooks():
+    return getattr(_local, 'hooks', ())
+
+
+def install(model):
+    """
+    Route a model's decode() through the current thread's hooks (idempotent).
+
+    Args:
+        model (whisper.model.Whisper): Model to wrap
+    """
+    if getattr(model, '_decode_hooks_installed', False):
+        return
+    original = model.decode
+
+    def decode(mel, options=None, **kwargs):
+        hooks = _active_hooks()
+        options = options or DecodingOptions()
+        if kwargs:
+            options = dataclasses.replace(options, **kwargs)
+
+        def call(index, mel, options):
+            if index == len(hooks):
+                return original(mel, options)
+            return hooks[index](model, mel, options, lambda m, o: call(index + 1, m, o))
+
+        return call(0, mel, options)
+
+    # Instance attribute shadows Whisper.decode for this model only
+    model.decode = decode
+    model._decode_hooks_installed = True
+
+
+@contextlib.contextmanager
+def decode_hook(hook):
+    """
+    Run hook around every decode() this thread makes inside the with-block.
+
+    Args:
+        hook (callable): hook(model, mel, options, decode) -> DecodingResult
+    """
+    previous = _active_hooks()
+    _local.hooks = previous + (hook,)
+    try:
+        yield
+    finally:
+        _local.hooks = previous
+
+
+@contextlib.contextmanager
+def count_decodes():
+    """
+    Count this thread's decode() calls inside the with-block.
+
+    Each 30-second window is decoded once at temperature 0; every further
+    decode of it is one of Whisper's temperature fallbacks.
+
+    Yields:
+        dict: {'decodes', 'fallbacks'}, updated as decodes run
+    """
+    counts = {'decodes': 0, 'fallbacks': 0}
+
+    def hook(model, mel, options, decode):
+        counts['decodes'] += 1
+        if options.temperature > 0:
+            counts['fallbacks'] += 1
+        return decode(mel, options)
+
+    with decode_hook(hook):
+        yield counts
@@ -0,0 +1,265 @@
+"""
+FFmpeg decoder service.
+Resolves the FFmpeg binary once at startup and runs every decode through a
+bounded set of decode slots: at most a fixed number of FFmpeg processes run
+at once, bursts wait in a bounded queue, and each job has a timeout.
+
+FFmpeg handles one input per process, so processes can't be reused across
+files; the pool bounds how many exist instead of letting every request fork
+its own.
+"""
+import contextlib
+import os
+import shutil
+import subprocess
+import threading
+import time
+from metrics import get_metrics
+from cancellation import current_token
+
+
+class DecoderError(Exception):
+    """FFmpeg exited with an error."""
+
+
+class DecoderBusyError(RuntimeError):
+    """All decode slots are busy and the wait queue is full (or the wait timed out)."""
+
+
+class DecoderTimeoutError(DecoderError):
+    """A decode job ran longer than its timeout and was killed."""
+
+
+# How often (seconds) a running decode checks for cancellation
+CANCEL_POLL_INTERVAL = 0.25
+
+
+def _env_number(name, default, cast=int):
+    """Read a positive number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+class DecoderService:
+    """Bounded pool of FFmpeg decode slots with per-job timeouts."""
+
+    def __init__(self, max_concurrent=None, max_queue=None, job_timeout=None, queue_timeout=None,
+                 max_streaming=None):
+        """
+        Initialize the service and check for FFmpeg once.
+
+        Args:
+            max_concurrent (int): FFmpeg processes allowed at once
+                (DECODER_MAX_CONCURRENT, default: CPU count)
+            max_queue (int): Jobs allowed to wait for a slot
+                (DECODER_MAX_QUEUE, default: 4 x max_concurrent)
+            job_timeout (float): Seconds a decode may run (DECODER_JOB_TIMEOUT, default: 300)
+            queue_timeout (float): Seconds a job may wait for a slot
+                (DECODER_QUEUE_TIMEOUT, default: 60)
+            max_streaming (int): FFmpeg processes fed by uploads while they
+                arrive (DECODER_MAX_STREAMING, default: max_concurrent)
+        """
+        self.max_concurrent = max_concurrent or _env_number('DECODER_MAX_CONCURRENT', os.cpu_count() or 1)
+        self.max_queue = max_queue or _env_number('DECODER_MAX_QUEUE', 4 * self.max_concurrent)
+        self.job_timeout = job_timeout or _env_number('DECODER_JOB_TIMEOUT', 300.0, float)
+        self.queue_timeout = queue_timeout or _env_number('DECODER_QUEUE_TIMEOUT', 60.0, float)
+        self.max_streaming = max_streaming or _env_number('DECODER_MAX_STREAMING', self.max_concurrent)
+
+        self.ffmpeg_path = shutil.which("ffmpeg")
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._streaming = 0
+        self._metrics = get_metrics()
+
+        if self.ffmpeg_path:
+            print(f"✓ FFmpeg found: {self.ffmpeg_path} ({self.max_concurrent} decode slots)")
+        else:
+            print("⚠️  FFmpeg not found in PATH; only 16kHz mono PCM input can be decoded")
+
+    @property
+    def ffmpeg_available(self):
+        """Whether FFmpeg was found at startup."""
+        return self.ffmpeg_path is not None
+
+    def acquire_slot(self):
+        """
+        Wait for a free decode slot.
+
+        Raises:
+            DecoderBusyError: If the wait queue is full or no slot frees up in time
+        """
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._metrics.increment('decoder.rejected')
+                raise DecoderBusyError("Audio decoder is busy, please retry shortly")
+            self._waiting += 1
+            self._metrics.set_gauge('decoder.queued', self._waiting)
+
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+
+        with self._lock:
+            self._waiting -= 1
+            if acquired:
+                self._active += 1
+            self._metrics.set_gauge('decoder.queued', self._waiting)
+            self._metrics.set_gauge('decoder.active', self._active)
+
+        self._metrics.record_timing('decoder.wait_seconds', time.perf_counter() - start)
+        if not acquired:
+            self._metrics.increment('decoder.rejected')
+            raise DecoderBusyError("Audio decoder is busy, please retry shortly")
+
+    def release_slot(self):
+        """Return a decode slot taken with acquire_slot()."""
+        with self._lock:
+            self._active -= 1
+            self._metrics.set_gauge('decoder.active', self._active)
+        self._slots.release()
+
+    def try_acquire_stream(self):
+        """
+        Take a streaming slot, without waiting. Streaming decodes (FFmpeg fed
+        by an upload as it arrives) are limited separately from decode slots:
+        a slow client keeps its FFmpeg idle for as long as the upload takes,
+        and mustn't hold back decodes that are ready to run.
+
+        Returns:
+            bool: Whether a slot was free (if not, receive the upload first
+                and decode it in a decode slot afterwards)
+        """
+        with self._lock:
+            if self._streaming >= self.max_streaming:
+                self._metrics.increment('decoder.streaming_full')
+                return False
+            self._streaming += 1
+            self._metrics.set_gauge('decoder.streaming', self._streaming)
+            return True
+
+    def release_stream(self):
+        """Return a streaming slot taken with try_acquire_stream()."""
+        with self._lock:
+            self._streaming -= 1
+            self._metrics.set_gauge('decoder.streaming', self._streaming)
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Hold a decode slot for the duration of a with-block."""
+        self.acquire_slot()
+        try:
+            yield
+        finally:
+            self.release_slot()
+
+    def _require_ffmpeg(self):
+        if not self.ffmpeg_available:
+            raise RuntimeError(
+                "FFmpeg is not installed or not in PATH.\n"
+                "Please install FFmpeg and restart the server (verify with: ffmpeg -version)"
+            )
+
+    def command(self, args):
+        """
+        Build a full FFmpeg command line using the resolved binary.
+
+        Args:
+            args (list): FFmpeg arguments, with or without a leading 'ffmpeg'
+
+        Returns:
+            list: Command line
+        """
+        self._require_ffmpeg()
+        if args and args[0] == 'ffmpeg':
+            args = args[1:]
+        return [self.ffmpeg_path] + list(args)
+
+    def run(self, args, timeout=None):
+        """
+        Run one FFmpeg job in a decode slot.
+
+        If the calling thread's transcription is cancelled (see
+        cancellation.py), FFmpeg is killed within CANCEL_POLL_INTERVAL.
+
+        Args:
+            args (list): FFmpeg arguments (see command())
+            timeout (float, optional): Seconds before the job is killed
+                (default: the service's job timeout)
+
+        Returns:
+            bytes: Everything FFmpeg wrote to stdout
+
+        Raises:
+            RuntimeError: If FFmpeg is not installed
+            DecoderBusyError: If no slot is available
+            DecoderTimeoutError: If the job times out
+            DecoderError: If FFmpeg fails
+            TranscriptionCancelled: If the transcription was cancelled
+        """
+        cmd = self.command(args)
+        token = current_token()
+        if token is not None:
+            token.check()
+        with self.slot():
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            deadline = start + (timeout or self.job_timeout)
+            try:
+                while True:
+                    # Wake up periodically to notice cancellation
+                    wait = deadline - time.perf_counter()
+                    if token is not None:
+                        wait = min(wait, CANCEL_POLL_INTERVAL)
+                    try:
+                        stdout, stderr = process.communicate(timeout=max(wait, 0))
+                        break
+                    except subprocess.TimeoutExpired:
+                        if time.perf_counter() >= deadline:
+                            raise
+                        if token is not None and token.cancelled:
+                            process.kill()
+                            process.communicate()
+                            self._metrics.increment('decoder.cancelled')
+                            token.check()
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                self._metrics.increment('decoder.timeouts')
+                raise DecoderTimeoutError(f"Audio decoding timed out after {timeout or self.job_timeout:.0f}s")
+            finally:
+                self._metrics.increment('decoder.jobs')
+                self._metrics.record_timing('decoder.job_seconds', time.perf_counter() - start)
+
+        if process.returncode != 0:
+            raise DecoderError(stderr.decode(errors='replace').strip())
+        return stdout
+
+    def status(self):
+        """Service state as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                'ffmpeg_available': self.ffmpeg_available,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'queued': self._waiting,
+                'max_streaming': self.max_streaming,
+                'streaming': self._streaming
+            }
+
+
+# Global decoder service instance
+_decoder_service = None
+
+def get_decoder_service():
+    """Get or create global decoder service."""
+    global _decoder_service
+    if _decoder_service is None:
+        _decoder_service = DecoderService()
+    return _decoder_service
@@ -0,0 +1,250 @@
+"""
+Decoding profiles.
+Named sets of Whisper decoding options, trading latency for accuracy:
+  - fast: greedy decoding, three fallback temperatures, and no conditioning
+    on the previous window (so one bad window can't derail the next)
+  - balanced: the defaults of Whisper's model.transcribe(), so a request
+    without 'decoding' decodes exactly as before
+  - accurate: beam search (5 beams) with the full fallback schedule
+
+Each endpoint has a default profile (DECODING_PROFILE, LIVE_DECODING_PROFILE).
+A request picks another with 'decoding' (or its router 'tier'), and may
+override single options within the bounds below.
+
+Run as a script to compare the profiles on a file (with a reference
+transcript for the word error rate):
+
+    python decoding_profiles.py benchmark sample.wav --model base --reference sample.txt
+"""
+import argparse
+import os
+import re
+import time
+
+
+WHISPER_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+# Keyword arguments for model.transcribe()
+DECODING_PROFILES = {
+    'fast': {
+        'beam_size': None,
+        'best_of': 1,
+        'temperature': (0.0, 0.4, 0.8),
+        'condition_on_previous_text': False,
+        'compression_ratio_threshold': 2.4,
+        'logprob_threshold': -1.0,
+        'no_speech_threshold': 0.6,
+    },
+    'balanced': {
+        'beam_size': None,
+        'best_of': None,  # model.transcribe()'s default: one sample per fallback temperature
+        'temperature': WHISPER_TEMPERATURES,
+        'condition_on_previous_text': True,
+        'compression_ratio_threshold': 2.4,
+        'logprob_threshold': -1.0,
+        'no_speech_threshold': 0.6,
+    },
+    'accurate': {
+        'beam_size': 5,
+        'best_of': 5,
+        'temperature': WHISPER_TEMPERATURES,
+        'condition_on_previous_text': True,
+        'compression_ratio_threshold': 2.4,
+        'logprob_threshold': -1.0,
+        'no_speech_threshold': 0.6,
+    },
+}
+
+DEFAULT_PROFILE = 'balanced'
+
+# Options a request may override, with their bounds
+BEAM_SIZE_RANGE = (1, 10)
+BEST_OF_RANGE = (1, 10)
+TEMPERATURE_RANGE = (0.0, 1.0)
+MAX_TEMPERATURES = 6
+THRESHOLD_RANGES = {
+    'compression_ratio_threshold': (1.0, 10.0),
+    'logprob_threshold': (-10.0, 0.0),
+    'no_speech_threshold': (0.0, 1.0),
+}
+
+
+def default_profile(live=False):
+    """
+    Get an endpoint's default profile name.
+
+    Args:
+        live (bool): For live microphone audio (LIVE_DECODING_PROFILE,
+            falling back to DECODING_PROFILE)
+
+    Returns:
+        str: Profile name
+    """
+    name = os.environ.get('DECODING_PROFILE', DEFAULT_PROFILE)
+    if live:
+        name = os.environ.get('LIVE_DECODING_PROFILE', name)
+    name = name.strip().lower()
+    return name if name in DECODING_PROFILES else DEFAULT_PROFILE
+
+
+def _number(args, name, cast, low, high):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = cast(value)
+    except ValueError:
+        value = None
+    if value is None or not low <= value <= high:
+        raise ValueError(f'{name} must be a number between {low} and {high}')
+    return value
+
+
+def decoding_options(args, default=None):
+    """
+    Read a request's decoding profile and overrides.
+
+    Args:
+        args (dict): 'decoding' (profile name; else a 'tier' that names a
+            profile; else default), and optionally 'beam_size', 'best_of',
+            'temperature' (fallback schedule, comma-separated),
+            'condition_on_previous_text' and the three thresholds
+        default (str): Profile used when the request names none
+            (default: default_profile())
+
+    Returns:
+        tuple: (profile name, keyword arguments for model.transcribe())
+
+    Raises:
+        ValueError: If the profile is unknown or an override is out of range
+    """
+    name = (args.get('decoding') or '').strip().lower()
+    if not name:
+        tier = (args.get('tier') or '').strip().lower()
+        name = tier if tier in DECODING_PROFILES else (default or default_profile())
+    if name not in DECODING_PROFILES:
+        raise ValueError('Invalid decoding profile. Allowed profiles: ' + ', '.join(DECODING_PROFILES))
+    options = dict(DECODING_PROFILES[name])
+
+    beam_size = _number(args, 'beam_size', int, *BEAM_SIZE_RANGE)
+    if beam_size is not None:
+        # One beam is greedy decoding
+        options['beam_size'] = beam_size if beam_size > 1 else None
+    best_of = _number(args, 'best_of', int, *BEST_OF_RANGE)
+    if best_of is not None:
+        options['best_of'] = best_of
+    for threshold, (low, high) in THRESHOLD_RANGES.items():
+        value = _number(args, threshold, float, low, high)
+        if value is not None:
+            options[threshold] = value
+
+    temperature = args.get('temperature')
+    if temperature not in (None, ''):
+        # A comma-separated string from a form, or a list from a JSON manifest
+        values = temperature if isinstance(temperature, (list, tuple)) else str(temperature).split(',')
+        try:
+            schedule = tuple(float(value) for value in values)
+        except ValueError:
+            schedule = ()
+        low, high = TEMPERATURE_RANGE
+        if not 0 < len(schedule) <= MAX_TEMPERATURES or not all(low <= value <= high for value in schedule):
+            raise ValueError(f'temperature must be up to {MAX_TEMPERATURES} comma-separated '
+                             f'numbers between {low} and {high}')
+        options['temperature'] = schedule
+
+    condition = args.get('condition_on_previous_text')
+    if condition not in (None, ''):
+        options['condition_on_previous_text'] = str(condition).strip().lower() in ('1', 'true', 'yes', 'on')
+
+    return name, options
+
+
+def _words(text):
+    return re.findall(r"\w+(?:'\w+)?", text.lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word error rate of a transcript (case and punctuation ignored).
+
+    Args:
+        reference (str): Correct transcript
+        hypothesis (str): Transcript to score
+
+    Returns:
+        float: (substitutions + deletions + insertions) / reference words
+    """
+    reference, hypothesis = _words(reference), _words(hypothesis)
+    if not reference:
+        return float(bool(hypothesis))
+    previous = list(range(len(hypothesis) + 1))
+    for i, word in enumerate(reference, start=1):
+        current = [i] + [0] * len(hypothesis)
+        for j, other in enumerate(hypothesis, start=1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def benchmark(path, model_size='base', reference=None, language=None, profiles=None):
+    """
+    Transcribe a file with each profile, timing it and counting Whisper's decodes.
+
+    Args:
+        path (str): Audio file
+        model_size (str): Whisper model to run
+        reference (str, optional): Correct transcript, for the word error rate
+        language (str, optional): Language code (skips detection)
+        profiles (list, optional): Profile names (default: all)
+
+    Returns:
+        dict: Per profile: seconds, decodes, fallbacks, wer (None without a
+            reference) and the text
+    """
+    from preprocess_audio import load_audio
+    from model_registry import get_registry
+    from decode_hooks import install, count_decodes
+
+    audio = load_audio(path)
+    model = get_registry().get(model_size)
+    install(model)
+
+    results = {}
+    for name in profiles or DECODING_PROFILES:
+        start = time.perf_counter()
+        with count_decodes() as counts:
+            result = model.transcribe(audio, language=language, fp16=False, **DECODING_PROFILES[name])
+        text = result['text'].strip()
+        results[name] = dict(
+            counts,
+            seconds=round(time.perf_counter() - start, 3),
+            wer=round(word_error_rate(reference, text), 4) if reference is not None else None,
+            text=text
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decoding profile tools")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    bench = subcommands.add_parser('benchmark', help="Compare the profiles' latency and accuracy")
+    bench.add_argument('audio', help="Audio file")
+    bench.add_argument('--model', default='base', help="Whisper model size (default: base)")
+    bench.add_argument('--reference', default=None, help="Text file with the correct transcript")
+    bench.add_argument('--language', default=None, help="Language code (default: detect)")
+    bench.add_argument('--profiles', default=None, help="Comma-separated profiles (default: all)")
+    args = parser.parse_args()
+
+    reference = None
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as f:
+            reference = f.read()
+    profiles = args.profiles.split(',') if args.profiles else None
+    results = benchmark(args.audio, args.model, reference, args.language, profiles)
+
+    print(f"{'':<10}{'seconds':>9}{'decodes':>9}{'fallbacks':>11}{'WER':>8}")
+    for name, row in results.items():
+        wer = f"{row['wer']:.1%}" if row['wer'] is not None else '-'
+        print(f"{name:<10}{row['seconds']:>9}{row['decodes']:>9}{row['fallbacks']:>11}{wer:>8}")
+    for name, row in results.items():
+        print(f"\n{name}: {row['text']}")
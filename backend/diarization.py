@@ -0,0 +1,395 @@
+"""
+Speaker diarization.
+Labels who spoke when, so each transcript segment can carry a 'speaker':
+  - voice activity: frames whose smoothed log-mel energy stands out from
+    the recording's noise floor
+  - embeddings: mean and spread of the MFCCs over 1.5-second windows of
+    voiced audio (computed with cumulative sums, so one pass over the
+    features no matter how many windows)
+  - clustering: agglomerative, merging the two most similar clusters until
+    none are similar enough (or the requested speaker count is reached).
+    Long recordings are clustered block by block and the block clusters
+    clustered again, which keeps memory and time bounded for multi-hour audio.
+
+The features are the log-mel spectrogram Whisper uses (taken from the mel
+cache), so diarizing and transcribing the same audio share one STFT.
+Diarization runs on its own threads, next to Whisper's inference.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from whisper.audio import N_SAMPLES, HOP_LENGTH, SAMPLE_RATE
+from mel_cache import get_mel_cache
+from cancellation import cancellable, checkpoint
+from metrics import get_metrics
+
+
+FRAMES_PER_SECOND = SAMPLE_RATE // HOP_LENGTH   # 100
+
+# Embedding window and hop, in mel frames
+WINDOW_FRAMES = 150
+HOP_FRAMES = 75
+
+# MFCCs per frame (c0, the loudness, is left out; the higher ones keep
+# some of the pitch harmonics)
+N_MFCC = 40
+
+# Energy smoothing, in frames, and share of a window that must be voiced
+VAD_SMOOTHING_FRAMES = 25
+MIN_VOICED_SHARE = 0.5
+
+# Clusters with less speech than this are folded into their nearest speaker
+MIN_SPEAKER_SECONDS = 3.0
+
+# Windows clustered at once; longer recordings are clustered in blocks
+MAX_CLUSTER_ITEMS = 1000
+
+# Windows on each side whose majority label a window takes (speaker turns
+# last seconds, so single-window flips are noise)
+SMOOTHING_WINDOWS = 2
+
+DEFAULT_THRESHOLD = 0.1
+
+
+def _env_number(name, default, cast=int):
+    """Read a positive number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def _dct_matrix(n_mels, n_mfcc):
+    """Orthonormal DCT-II rows 1..n_mfcc (MFCCs from log-mel energies)."""
+    k = np.arange(1, n_mfcc + 1)[:, None]
+    n = np.arange(n_mels)[None, :]
+    return (np.sqrt(2.0 / n_mels) * np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels))).astype(np.float32)
+
+
+def voiced_frames(mel):
+    """
+    Energy-based voice activity.
+
+    Args:
+        mel (np.ndarray): Log-mel features, shape (n_mels, frames)
+
+    Returns:
+        np.ndarray: bool per frame
+    """
+    energy = mel.mean(axis=0)
+    kernel = np.ones(VAD_SMOOTHING_FRAMES, dtype=np.float32) / VAD_SMOOTHING_FRAMES
+    energy = np.convolve(energy, kernel, mode='same')
+    floor, peak = np.percentile(energy, [10, 95])
+    if peak - floor < 0.1:
+        # Flat energy: all speech (or all silence); let clustering decide
+        return np.ones_like(energy, dtype=bool)
+    return energy > floor + 0.3 * (peak - floor)
+
+
+def window_embeddings(mel, voiced):
+    """
+    Embed every mostly-voiced window.
+
+    Args:
+        mel (np.ndarray): Log-mel features, shape (n_mels, frames)
+        voiced (np.ndarray): bool per frame from voiced_frames()
+
+    Returns:
+        tuple: (embeddings (windows, 2 * N_MFCC), unit length;
+            window start frames)
+    """
+    mfcc = _dct_matrix(mel.shape[0], N_MFCC) @ mel                    # (N_MFCC, frames)
+    frames = mfcc.shape[1]
+    if frames < WINDOW_FRAMES:
+        starts = np.array([0]) if voiced.any() else np.array([], dtype=int)
+        width = frames
+    else:
+        starts = np.arange(0, frames - WINDOW_FRAMES + 1, HOP_FRAMES)
+        width = WINDOW_FRAMES
+    if not len(starts):
+        return np.zeros((0, 2 * N_MFCC), dtype=np.float32), starts
+
+    # Window sums from cumulative sums: O(frames) for all windows
+    pad = np.zeros((1,), dtype=np.float64)
+    voiced_sum = np.concatenate([pad, np.cumsum(voiced, dtype=np.float64)])
+    voiced_share = (voiced_sum[starts + width] - voiced_sum[starts]) / width
+    starts = starts[voiced_share >= MIN_VOICED_SHARE]
+    if not len(starts):
+        return np.zeros((0, 2 * N_MFCC), dtype=np.float32), starts
+
+    weighted = mfcc * voiced                                           # unvoiced frames count as zero
+    zeros = np.zeros((N_MFCC, 1))
+    sums = np.concatenate([zeros, np.cumsum(weighted, axis=1, dtype=np.float64)], axis=1)
+    squares = np.concatenate([zeros, np.cumsum(weighted ** 2, axis=1, dtype=np.float64)], axis=1)
+    counts = voiced_sum[starts + width] - voiced_sum[starts]
+    mean = (sums[:, starts + width] - sums[:, starts]) / counts
+    spread = np.sqrt(np.maximum((squares[:, starts + width] - squares[:, starts]) / counts - mean ** 2, 0))
+
+    embeddings = np.concatenate([mean, spread]).T                      # (windows, 2 * N_MFCC)
+    # Normalize per recording, so channel and loudness don't dominate
+    embeddings = (embeddings - embeddings.mean(axis=0)) / (embeddings.std(axis=0) + 1e-6)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-9
+    return embeddings.astype(np.float32), starts
+
+
+def agglomerate(sums, threshold, num_speakers=None):
+    """
+    Centroid-linkage agglomerative clustering under cosine similarity.
+
+    Each step merges the two clusters whose summed embeddings point most
+    alike. Every row's best partner is kept, so a merge only rescans the
+    rows it affects instead of the whole similarity matrix.
+
+    Args:
+        sums (np.ndarray): (items, dims) embedding sums (unit embeddings for
+            single windows, cluster sums when re-clustering blocks)
+        threshold (float): Stop once no pair is more similar than this
+        num_speakers (int, optional): Stop at exactly this many clusters
+            instead (threshold ignored)
+
+    Returns:
+        np.ndarray: Cluster index per item (0..clusters-1)
+    """
+    n = len(sums)
+    if n <= 1:
+        return np.zeros(n, dtype=int)
+    sums = sums.astype(np.float64).copy()
+    unit = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12)
+    similarity = unit @ unit.T
+    np.fill_diagonal(similarity, -np.inf)
+    best_partner = similarity.argmax(axis=1)
+    best = similarity[np.arange(n), best_partner]
+    parent = np.arange(n)
+    active = np.ones(n, dtype=bool)
+    clusters = n
+
+    while clusters > 1:
+        i = int(best.argmax())
+        if num_speakers:
+            if clusters <= num_speakers:
+                break
+        elif best[i] < threshold:
+            break
+        j = int(best_partner[i])
+        # Merge j into i
+        sums[i] += sums[j]
+        parent[parent == j] = i
+        active[j] = False
+        clusters -= 1
+        similarity[j, :] = -np.inf
+        similarity[:, j] = -np.inf
+        best[j] = -np.inf
+        row = (sums @ (sums[i] / np.linalg.norm(sums[i]))) / (np.linalg.norm(sums, axis=1) + 1e-12)
+        row[~active] = -np.inf
+        row[i] = -np.inf
+        similarity[i, :] = row
+        similarity[:, i] = row
+        best_partner[i] = row.argmax()
+        best[i] = row[best_partner[i]]
+        # Rows whose best partner was i or j need a rescan; others may now prefer i
+        stale = np.flatnonzero(((best_partner == i) | (best_partner == j)) & active)
+        stale = stale[stale != i]
+        if len(stale):
+            best_partner[stale] = similarity[stale].argmax(axis=1)
+            best[stale] = similarity[stale, best_partner[stale]]
+        better = row > best
+        best[better] = row[better]
+        best_partner[better] = i
+
+    _, labels = np.unique(parent, return_inverse=True)
+    return labels
+
+
+def smooth_labels(labels, radius=SMOOTHING_WINDOWS):
+    """
+    Give each window the most common label among its neighbours.
+
+    Args:
+        labels (np.ndarray): Cluster index per window, in time order
+        radius (int): Neighbours on each side
+
+    Returns:
+        np.ndarray: Smoothed labels (renumbered 0..clusters-1)
+    """
+    if len(labels) <= 2 * radius + 1:
+        return labels
+    one_hot = np.eye(labels.max() + 1)[labels]                          # (windows, clusters)
+    counts = np.cumsum(np.vstack([np.zeros((1, one_hot.shape[1])), one_hot]), axis=0)
+    index = np.arange(len(labels))
+    low = np.maximum(index - radius, 0)
+    high = np.minimum(index + radius + 1, len(labels))
+    votes = counts[high] - counts[low]
+    # Ties keep the window's own label
+    votes[index, labels] += 0.5
+    _, smoothed = np.unique(votes.argmax(axis=1), return_inverse=True)
+    return smoothed
+
+
+class Diarizer:
+    """Assigns speaker labels to audio, on its own worker threads."""
+
+    def __init__(self, threshold=None, workers=None):
+        """
+        Args:
+            threshold (float): Cosine similarity above which clusters merge
+                (DIARIZATION_THRESHOLD, default: 0.1; lower finds fewer speakers)
+            workers (int): Diarization threads (DIARIZATION_WORKERS, default: 1)
+        """
+        if threshold is None:
+            try:
+                threshold = float(os.environ.get('DIARIZATION_THRESHOLD', DEFAULT_THRESHOLD))
+            except ValueError:
+                threshold = DEFAULT_THRESHOLD
+        self.threshold = threshold
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or _env_number('DIARIZATION_WORKERS', 1),
+            thread_name_prefix='diarize'
+        )
+        self._metrics = get_metrics()
+
+    def submit(self, audio, num_speakers=None, cancel=None):
+        """
+        Diarize in the background (e.g. while Whisper transcribes the same audio).
+
+        Returns:
+            Future: Resolves to diarize()'s speaker turns
+        """
+        def run():
+            with cancellable(cancel):
+                return self.diarize(audio, num_speakers)
+        return self._executor.submit(run)
+
+    def diarize(self, audio, num_speakers=None):
+        """
+        Find who spoke when.
+
+        Args:
+            audio (np.ndarray): 16kHz mono float32 waveform
+            num_speakers (int, optional): Known number of speakers
+
+        Returns:
+            list: Speaker turns [{'start', 'end', 'speaker'}], in time order;
+                speakers are named 'SPEAKER_1', 'SPEAKER_2', ... by first appearance
+        """
+        start = time.perf_counter()
+        frames = len(audio) // HOP_LENGTH
+        # The padded features are the ones transcription caches; slicing is free
+        mel = get_mel_cache().features(audio, 80, padding=N_SAMPLES)[:, :frames].numpy()
+        checkpoint()
+        voiced = voiced_frames(mel)
+        embeddings, starts = window_embeddings(mel, voiced)
+        checkpoint()
+        labels = self._cluster(embeddings, num_speakers)
+        turns = self._turns(labels, starts, voiced)
+        self._metrics.increment('diarization.runs')
+        self._metrics.record_timing('diarization.seconds', time.perf_counter() - start)
+        return turns
+
+    def _cluster(self, embeddings, num_speakers):
+        """Cluster window embeddings, block by block for long recordings."""
+        if len(embeddings) <= MAX_CLUSTER_ITEMS:
+            labels = agglomerate(embeddings, self.threshold, num_speakers)
+        else:
+            # Over-cluster each block, then cluster the blocks' clusters
+            block_labels = np.empty(len(embeddings), dtype=int)
+            sums = []
+            for start in range(0, len(embeddings), MAX_CLUSTER_ITEMS):
+                checkpoint()
+                block = embeddings[start:start + MAX_CLUSTER_ITEMS]
+                local = agglomerate(block, self.threshold)
+                block_labels[start:start + len(block)] = local + len(sums)
+                for label in range(local.max() + 1):
+                    sums.append(block[local == label].sum(axis=0))
+            labels = agglomerate(np.array(sums), self.threshold, num_speakers)[block_labels]
+        return smooth_labels(self._absorb_small(embeddings, labels, num_speakers))
+
+    def _absorb_small(self, embeddings, labels, num_speakers):
+        """Fold clusters with too little speech into their nearest speaker."""
+        if not len(labels) or num_speakers:
+            return labels
+        min_windows = MIN_SPEAKER_SECONDS * FRAMES_PER_SECOND / HOP_FRAMES
+        counts = np.bincount(labels)
+        large = np.flatnonzero(counts >= min_windows)
+        if len(large) == 0 or len(large) == len(counts):
+            return labels
+        centroids = np.array([embeddings[labels == label].sum(axis=0) for label in range(len(counts))])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+        nearest = large[(centroids @ centroids[large].T).argmax(axis=1)]
+        nearest[large] = large
+        _, labels = np.unique(nearest[labels], return_inverse=True)
+        return labels
+
+    def _turns(self, labels, starts, voiced):
+        """Merge consecutive windows of the same speaker into turns."""
+        turns = []
+        names = {}
+        previous_end = None
+        for label, start in zip(labels, starts):
+            # Each window speaks for its middle hop; silence splits turns
+            begin = int(start) + (WINDOW_FRAMES - HOP_FRAMES) // 2 if turns else int(start)
+            end = int(start) + (WINDOW_FRAMES + HOP_FRAMES) // 2
+            speaker = names.setdefault(int(label), f'SPEAKER_{len(names) + 1}')
+            if turns and turns[-1]['speaker'] == speaker and begin <= previous_end:
+                turns[-1]['end'] = end / FRAMES_PER_SECOND
+            else:
+                turns.append({'start': begin / FRAMES_PER_SECOND, 'end': end / FRAMES_PER_SECOND,
+                              'speaker': speaker})
+            previous_end = end
+        if turns:
+            turns[-1]['end'] = max(turns[-1]['end'], len(voiced) / FRAMES_PER_SECOND)
+        for turn in turns:
+            turn['start'], turn['end'] = round(turn['start'], 2), round(turn['end'], 2)
+        return turns
+
+
+def assign_speakers(segments, turns):
+    """
+    Label each segment with the speaker who talks most during it (or, if
+    nobody does, the nearest turn's speaker).
+
+    Args:
+        segments (list): Segment dicts with 'start' and 'end' (a 'speaker'
+            key is added in place)
+        turns (list): Speaker turns from Diarizer.diarize()
+
+    Returns:
+        list: segments
+    """
+    if not turns:
+        return segments
+    first = 0
+    for segment in segments:
+        start, end = segment['start'], segment['end']
+        # Turns and segments are both in time order: skip turns that ended
+        while first < len(turns) - 1 and turns[first]['end'] <= start:
+            first += 1
+        talk = {}
+        index = first
+        while index < len(turns) and turns[index]['start'] < end:
+            overlap = min(end, turns[index]['end']) - max(start, turns[index]['start'])
+            if overlap > 0:
+                talk[turns[index]['speaker']] = talk.get(turns[index]['speaker'], 0) + overlap
+            index += 1
+        if talk:
+            segment['speaker'] = max(talk, key=talk.get)
+        else:
+            nearest = min(turns[max(0, first - 1):first + 2],
+                          key=lambda turn: min(abs(turn['start'] - end), abs(turn['end'] - start)))
+            segment['speaker'] = nearest['speaker']
+    return segments
+
+
+_diarizer = None
+_diarizer_lock = threading.Lock()
+
+
+def get_diarizer():
+    """Get the process-wide diarizer."""
+    global _diarizer
+    with _diarizer_lock:
+        if _diarizer is None:
+            _diarizer = Diarizer()
+        return _diarizer
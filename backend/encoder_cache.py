@@ -0,0 +1,177 @@
+"""
+Whisper encoder output cache.
+The encoder is most of the CPU cost of the smaller models, and the same
+30-second window often goes through it more than once: language detection
+and the first decode share a window, every temperature fallback encodes its
+window again, word timestamps run the encoder once more for the alignment,
+and repeated or re-sent audio repeats every window. install() wraps a
+model's encoder so each distinct window is encoded once per model.
+
+Entries are keyed by model and a hash of the window's mel features, kept at
+full precision (so decoding is unchanged) in an LRU bounded by
+ENCODER_CACHE_MB.
+"""
+import collections
+import hashlib
+import os
+import threading
+import torch
+from metrics import get_metrics
+
+
+def _env_number(name, default, cast=int):
+    """Read a non-negative number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value >= 0 else default
+
+
+def window_fingerprint(mel):
+    """
+    Hash one window's features.
+
+    Args:
+        mel (torch.Tensor): CPU features, shape (n_mels, frames)
+
+    Returns:
+        str: Hex digest identifying the features
+    """
+    samples = mel.detach().contiguous().numpy()
+    return hashlib.blake2b(memoryview(samples).cast('B'), digest_size=16).hexdigest()
+
+
+class EncoderCache:
+    """LRU of encoder outputs, one entry per (model, window)."""
+
+    def __init__(self, max_mb=None):
+        """
+        Args:
+            max_mb (float): Memory the cached outputs may use
+                (ENCODER_CACHE_MB, default: 128; 0 disables the cache)
+        """
+        max_mb = _env_number('ENCODER_CACHE_MB', 128.0, float) if max_mb is None else max_mb
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self._metrics = get_metrics()
+
+    def encode(self, model_key, mel, encoder):
+        """
+        Get the encoder output of a batch of windows, encoding only the ones
+        not cached.
+
+        Args:
+            model_key (str): Model the encoder belongs to (e.g. its size)
+            mel (torch.Tensor): Features, shape (batch, n_mels, frames)
+            encoder (callable): The encoder's own forward()
+
+        Returns:
+            torch.Tensor: Encoder output, shape (batch, n_audio_ctx, n_audio_state)
+        """
+        if self.max_bytes <= 0 or mel.device.type != 'cpu' or mel.dim() != 3:
+            return encoder(mel)
+
+        keys = [(model_key, mel.dtype, window_fingerprint(window)) for window in mel]
+        outputs = [None] * len(keys)
+        with self._lock:
+            for index, key in enumerate(keys):
+                cached = self._entries.get(key)
+                if cached is not None:
+                    self._entries.move_to_end(key)
+                    outputs[index] = cached
+        missing = [index for index, output in enumerate(outputs) if output is None]
+        self._count(len(keys) - len(missing), len(missing))
+
+        if missing:
+            encoded = encoder(mel[missing] if len(missing) < len(keys) else mel)
+            for position, index in enumerate(missing):
+                # A row of a larger batch is copied so the entry doesn't pin the whole batch
+                output = encoded[position] if len(encoded) == 1 else encoded[position].clone()
+                outputs[index] = output
+                self._store(keys[index], output)
+            if len(missing) == len(keys):
+                return encoded
+        return torch.stack(outputs)
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self._hits += hits
+            self._misses += misses
+        if hits:
+            self._metrics.increment('encoder_cache.hits', hits)
+        if misses:
+            self._metrics.increment('encoder_cache.misses', misses)
+
+    def _store(self, key, output):
+        size = output.numel() * output.element_size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = output
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.numel() * evicted.element_size()
+                self._metrics.increment('encoder_cache.evictions')
+            self._metrics.set_gauge('encoder_cache.mb', round(self._bytes / (1024 * 1024), 2))
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._metrics.set_gauge('encoder_cache.mb', 0)
+
+    def status(self):
+        """Entries, memory in use and hit rate."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'mb': round(self._bytes / (1024 * 1024), 2),
+                'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else None
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_encoder_cache():
+    """Get the process-wide encoder cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EncoderCache()
+        return _cache
+
+
+def install(model, model_key):
+    """
+    Route a model's encoder through the cache (idempotent).
+
+    Args:
+        model (whisper.model.Whisper): Model to wrap
+        model_key (str): Name its entries are kept under (e.g. its size)
+    """
+    encoder = model.encoder
+    if getattr(encoder, '_encoder_cache_installed', False):
+        return
+    original = encoder.forward
+
+    def forward(x):
+        return get_encoder_cache().encode(model_key, x, original)
+
+    # Instance attribute shadows AudioEncoder.forward; module hooks still run
+    encoder.forward = forward
+    encoder._encoder_cache_installed = True
@@ -0,0 +1,68 @@
+"""
+Gunicorn configuration.
+Workers, threads and torch thread pools are planned by runtime_config from the
+core count and model size; see RENDER_DEPLOYMENT_GUIDE.md for the overrides.
+"""
+import os
+import threading
+from runtime_config import get_runtime_config, apply_torch_threads, pin_worker
+
+runtime = get_runtime_config()
+
+# Native thread pools read these when torch is first imported
+for _name, _value in runtime.thread_env().items():
+    os.environ.setdefault(_name, _value)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = runtime.workers
+threads = runtime.threads
+# SERVER_MODE=asgi: uvicorn workers serving asgi:app from an event loop
+server_mode = os.environ.get('SERVER_MODE', 'wsgi').strip().lower()
+if server_mode == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    worker_class = 'gthread' if runtime.threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+
+# Load the models once in the master; workers inherit the weights copy-on-write,
+# so extra workers and recycled workers (max_requests) never reload from disk
+preload_app = os.environ.get('PRELOAD_MODELS', '1').strip().lower() in ('1', 'true', 'yes', 'on')
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+
+def when_ready(server):
+    """Freeze the preloaded models before the first worker is forked."""
+    if preload_app:
+        from model_registry import get_registry
+        get_registry().freeze()
+
+
+def pre_fork(server, worker):
+    """Give the new worker the lowest core slot not held by a live worker."""
+    taken = {getattr(w, 'core_slot', None) for w in server.WORKERS.values()}
+    worker.core_slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    """
+    Pin the worker to its cores, size its torch thread pools and start its
+    English LanguageTool server (each worker owns its servers; one started
+    in the master would be killed by the first worker to close or exit).
+    """
+    cores = pin_worker(runtime, worker.core_slot)
+    apply_torch_threads(runtime)
+    threading.Thread(target=_start_english_corrector, name='nlp-warmup', daemon=True).start()
+    server.log.info(
+        f"Worker {worker.pid}: slot {worker.core_slot}, cores {cores or 'unpinned'}, "
+        f"torch threads {runtime.intra_op_threads}/{runtime.inter_op_threads}"
+    )
+
+
+def _start_english_corrector():
+    from nlp_corrector import get_corrector_manager
+    try:
+        with get_corrector_manager().acquire('en'):
+            pass
+    except Exception as e:
+        print(f"⚠️  NLP corrector warm-up failed: {e}")
@@ -0,0 +1,386 @@
+"""
+Session-based incremental live transcription.
+A live recording is sent as a series of short chunks. The session keeps the
+decoded audio that is not yet final, the final segments so far and the
+decoder context (language and prompt), so each chunk only costs a
+transcription of the uncommitted tail instead of the whole recording again.
+Audio behind the last final segment is dropped, which keeps a session's
+size bounded by its tail.
+
+Sessions are kept on disk (LIVE_SESSION_DIR), not in a worker's memory:
+gunicorn workers share one listening socket, so consecutive chunks of a
+recording can reach different workers. Each chunk loads the session, holds
+its file lock while transcribing, and writes it back.
+
+Sessions expire after LIVE_SESSION_IDLE_SECONDS without a chunk. If the
+buffered audio of all sessions passes LIVE_SESSIONS_MAX_MEMORY_MB, the least
+recently used ones are closed.
+"""
+import contextlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import numpy as np
+from preprocess_audio import TARGET_SAMPLE_RATE
+from vocabulary import Vocabulary
+from metrics import get_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: sessions are then only locked within one process
+    fcntl = None
+
+
+# Tail shorter than this is buffered without running Whisper (unless final)
+MIN_TAIL_SECONDS = 1.0
+
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _env_number(name, default, cast=int):
+    """Read a positive number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+class LiveSessionError(ValueError):
+    """Unknown or expired live session."""
+
+    def __init__(self, message, status_code=404):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LiveSession:
+    """State of one live recording between chunks."""
+
+    def __init__(self, session_id, force_language=None, vocabulary=None, model_size=None, decoding=None):
+        """
+        Args:
+            session_id (str): Session id
+            force_language (str, optional): Language code (detected on the
+                first transcription otherwise)
+            vocabulary (Vocabulary, optional): Terms to bias decoding towards
+            model_size (str, optional): Model used for every chunk
+            decoding (dict, optional): Whisper decoding options for every chunk
+        """
+        self.session_id = session_id
+        self.language = force_language
+        self.vocabulary = vocabulary
+        self.model_size = model_size
+        self.decoding = decoding
+        self.tail = np.zeros(0, dtype=np.float32)   # audio after the last final segment
+        self.tail_start = 0.0                       # where the tail starts, in seconds
+        self.whisper_segments = []
+        self.raw_segments = []
+        self.corrected_segments = []
+        self.tentative_segments = []
+
+    @property
+    def nbytes(self):
+        """Bytes of audio buffered."""
+        return self.tail.nbytes
+
+    @property
+    def duration(self):
+        """Seconds of audio received so far."""
+        return self.tail_start + len(self.tail) / TARGET_SAMPLE_RATE
+
+    def append(self, audio):
+        """Add a decoded chunk to the tail."""
+        self.tail = np.concatenate([self.tail, audio.astype(np.float32, copy=False)])
+
+    def state(self):
+        """Transcript so far: final segments plus the tentative tail."""
+        committed_text = ' '.join(seg['text'].strip() for seg in self.corrected_segments).strip()
+        tentative_text = ' '.join(seg['text'].strip() for seg in self.tentative_segments).strip()
+        return {
+            'session_id': self.session_id,
+            'language': self.language,
+            'committed_text': committed_text,
+            'tentative_text': tentative_text,
+            'text': ' '.join(part for part in (committed_text, tentative_text) if part),
+            'segments': self.corrected_segments + [
+                dict(seg, tentative=True) for seg in self.tentative_segments
+            ],
+            'committed_seconds': round(self.tail_start, 2),
+            'received_seconds': round(self.duration, 2)
+        }
+
+    def to_dict(self):
+        """Everything but the tail audio, JSON-serializable."""
+        return {
+            'session_id': self.session_id,
+            'language': self.language,
+            'vocabulary': self.vocabulary.terms if self.vocabulary else None,
+            'model_size': self.model_size,
+            'decoding': self.decoding,
+            'tail_start': self.tail_start,
+            'whisper_segments': self.whisper_segments,
+            'raw_segments': self.raw_segments,
+            'corrected_segments': self.corrected_segments,
+            'tentative_segments': self.tentative_segments
+        }
+
+    @classmethod
+    def from_dict(cls, data, tail):
+        """Rebuild a session from to_dict() and its tail audio."""
+        session = cls(
+            data['session_id'], data['language'],
+            Vocabulary(data['vocabulary']) if data['vocabulary'] else None,
+            data['model_size'], data['decoding']
+        )
+        session.tail = tail
+        session.tail_start = data['tail_start']
+        session.whisper_segments = data['whisper_segments']
+        session.raw_segments = data['raw_segments']
+        session.corrected_segments = data['corrected_segments']
+        session.tentative_segments = data['tentative_segments']
+        return session
+
+
+class LiveSessionStore:
+    """Live sessions shared by every worker process, with idle expiry and a size cap."""
+
+    def __init__(self, transcriber, idle_seconds=None, max_memory_mb=None, max_tail_seconds=None,
+                 directory=None):
+        """
+        Args:
+            transcriber (MultilingualTranscriber): Transcriber running the windows
+            idle_seconds (float): Seconds without a chunk before a session
+                expires (LIVE_SESSION_IDLE_SECONDS, default: 300)
+            max_memory_mb (float): Audio all sessions may buffer
+                (LIVE_SESSIONS_MAX_MEMORY_MB, default: 256)
+            max_tail_seconds (float): Uncommitted audio after which every
+                segment is made final, even the possibly cut off last one
+                (LIVE_MAX_TAIL_SECONDS, default: 30, Whisper's window)
+            directory (str): Where sessions are kept; every worker must see
+                the same directory (LIVE_SESSION_DIR, default: a folder in
+                the system temp directory)
+        """
+        self.transcriber = transcriber
+        self.idle_seconds = idle_seconds or _env_number('LIVE_SESSION_IDLE_SECONDS', 300.0, float)
+        self.max_memory_mb = max_memory_mb or _env_number('LIVE_SESSIONS_MAX_MEMORY_MB', 256.0, float)
+        self.max_tail_seconds = max_tail_seconds or _env_number('LIVE_MAX_TAIL_SECONDS', 30.0, float)
+        self.directory = directory or os.environ.get('LIVE_SESSION_DIR') or os.path.join(
+            tempfile.gettempdir(), 'stt_live_sessions'
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        # Without fcntl, sessions are locked per process only
+        self._local_locks = {}
+        self._lock = threading.Lock()
+        self._metrics = get_metrics()
+
+    def _path(self, session_id, extension):
+        return os.path.join(self.directory, f'{session_id}.{extension}')
+
+    @contextlib.contextmanager
+    def _locked(self, session_id):
+        """Hold a session's lock, across threads and worker processes."""
+        if fcntl is None:
+            with self._lock:
+                lock = self._local_locks.setdefault(session_id, threading.Lock())
+            with lock:
+                yield
+            return
+        with open(self._path(session_id, 'lock'), 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _save(self, session):
+        """Write a session out (each file replaced atomically)."""
+        for extension, write in (
+            ('npy', lambda f: np.save(f, session.tail, allow_pickle=False)),
+            ('json', lambda f: f.write(json.dumps(session.to_dict(), default=float).encode('utf-8'))),
+        ):
+            path = self._path(session.session_id, extension)
+            temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp, 'wb') as f:
+                write(f)
+            os.replace(temp, path)
+
+    def _load(self, session_id):
+        """Read a session (None if it doesn't exist)."""
+        try:
+            with open(self._path(session_id, 'json'), encoding='utf-8') as f:
+                data = json.load(f)
+            tail = np.load(self._path(session_id, 'npy'), allow_pickle=False)
+        except (FileNotFoundError, ValueError):
+            return None
+        return LiveSession.from_dict(data, tail)
+
+    def _remove(self, session_id):
+        for extension in ('json', 'npy', 'lock'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(session_id, extension))
+        with self._lock:
+            self._local_locks.pop(session_id, None)
+
+    def _sessions(self):
+        """(session_id, last used, tail bytes) of every stored session."""
+        sessions = []
+        for name in os.listdir(self.directory):
+            session_id, _, extension = name.partition('.')
+            if extension != 'json':
+                continue
+            try:
+                used = os.path.getmtime(self._path(session_id, 'json'))
+                size = os.path.getsize(self._path(session_id, 'npy'))
+            except FileNotFoundError:
+                continue
+            sessions.append((session_id, used, size))
+        return sessions
+
+    def create(self, force_language=None, vocabulary=None, model_size=None, decoding=None):
+        """
+        Open a new session.
+
+        Returns:
+            LiveSession: The session (its session_id goes back to the client)
+        """
+        self._expire()
+        session = LiveSession(uuid.uuid4().hex, force_language, vocabulary, model_size, decoding)
+        self._save(session)
+        self._metrics.increment('live.sessions_created')
+        return session
+
+    def get(self, session_id):
+        """
+        Look up an open session.
+
+        Raises:
+            LiveSessionError: If the session is unknown or has expired
+        """
+        self._expire()
+        session = self._load(session_id) if SESSION_ID_PATTERN.match(session_id or '') else None
+        if session is None:
+            raise LiveSessionError('Live session not found or expired; start a new recording')
+        return session
+
+    def close(self, session):
+        """Forget a session."""
+        self._remove(session.session_id)
+        self._update_gauges()
+
+    def add_chunk(self, session, audio, final=False, word_timestamps=False, cancel=None):
+        """
+        Append a decoded chunk and transcribe the uncommitted tail.
+
+        Chunks of one session are processed one at a time, in arrival order,
+        whichever worker receives them.
+
+        Args:
+            session (LiveSession): Session from create() or get()
+            audio (np.ndarray): 16kHz mono float32 waveform of the chunk
+            final (bool): Last chunk: make every segment final, save the
+                transcript and close the session
+            word_timestamps (bool): Also time each word (slower)
+            cancel (CancelToken, optional): Stops the transcription early
+                (the chunk stays buffered for the next one)
+
+        Returns:
+            dict: session.state(), plus 'new_segments' (segments made final
+                by this chunk) and, when final, 'data' (the transcription
+                data of the whole recording)
+
+        Raises:
+            LiveSessionError: If the session was closed meanwhile
+        """
+        with self._locked(session.session_id):
+            # Another chunk may have changed the session since it was looked up
+            session = self._load(session.session_id)
+            if session is None:
+                raise LiveSessionError('Live session not found or expired; start a new recording')
+            session.append(audio)
+            try:
+                state = self._transcribe_tail(session, final, word_timestamps, cancel)
+            finally:
+                # A cancelled chunk stays buffered for the next one
+                if not final and os.path.exists(self._path(session.session_id, 'json')):
+                    self._save(session)
+        self._enforce_memory(keep=session.session_id)
+        return state
+
+    def _transcribe_tail(self, session, final, word_timestamps, cancel):
+        new_segments = []
+        tail_seconds = len(session.tail) / TARGET_SAMPLE_RATE
+        if final or tail_seconds >= MIN_TAIL_SECONDS:
+            start = time.perf_counter()
+            window = self.transcriber.transcribe_window(
+                session.tail, session.tail_start, language=session.language,
+                prompt=self.transcriber.prompt_from(session.whisper_segments, session.decoding),
+                final=final or tail_seconds >= self.max_tail_seconds,
+                word_timestamps=word_timestamps, vocabulary=session.vocabulary,
+                model_size=session.model_size, cancel=cancel, decoding=session.decoding
+            )
+            self._metrics.record_timing('live.window_seconds', time.perf_counter() - start)
+            self._metrics.record_timing('live.window_audio_seconds', tail_seconds)
+
+            session.language = window['language']
+            session.whisper_segments.extend(window['segments'])
+            session.raw_segments.extend(window['raw_segments'])
+            session.corrected_segments.extend(window['corrected_segments'])
+            session.tentative_segments = window['tentative_segments']
+            new_segments = window['corrected_segments']
+            # Drop the audio that is now final
+            session.tail = session.tail[window['consumed']:].copy()
+            session.tail_start += window['consumed'] / TARGET_SAMPLE_RATE
+
+        state = session.state()
+        state['new_segments'] = new_segments
+        if final:
+            state['data'] = self.transcriber.finish_transcription(
+                session.language, session.whisper_segments, session.raw_segments,
+                session.corrected_segments, session.vocabulary, cancel
+            )
+            self.close(session)
+        return state
+
+    def _expire(self):
+        """Close sessions idle for longer than idle_seconds."""
+        cutoff = time.time() - self.idle_seconds
+        for session_id, used, _ in self._sessions():
+            if used < cutoff:
+                self._remove(session_id)
+
+    def _enforce_memory(self, keep):
+        """Close least recently used sessions until the buffered audio fits."""
+        limit = self.max_memory_mb * 1024 * 1024
+        sessions = self._sessions()
+        total = sum(size for _, _, size in sessions)
+        for session_id, _, size in sorted(sessions, key=lambda s: s[1]):
+            if total <= limit:
+                break
+            if session_id == keep:
+                continue
+            total -= size
+            self._remove(session_id)
+        self._update_gauges(sessions)
+
+    def _update_gauges(self, sessions=None):
+        """Publish session count and buffered audio."""
+        sessions = self._sessions() if sessions is None else sessions
+        self._metrics.set_gauge('live.sessions', len(sessions))
+        self._metrics.set_gauge('live.buffered_mb', round(sum(size for _, _, size in sessions) / (1024 * 1024), 2))
+
+    def status(self):
+        """Open sessions and the audio they buffer."""
+        self._expire()
+        sessions = self._sessions()
+        return {
+            'sessions': len(sessions),
+            'buffered_mb': round(sum(size for _, _, size in sessions) / (1024 * 1024), 2),
+            'max_memory_mb': self.max_memory_mb,
+            'idle_seconds': self.idle_seconds,
+            'directory': self.directory
+        }
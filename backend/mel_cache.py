@@ -0,0 +1,178 @@
+"""
+Log-mel spectrogram cache.
+Whisper computes the log-mel features of the whole (padded) waveform at the
+start of every model.transcribe() call, so detecting the language first,
+transcribing again with another language, or translating the same audio each
+redo the STFT. install() routes Whisper's transcribe through a cache keyed
+by a hash of the waveform, so each distinct audio is featurized once.
+
+Entries are kept as the float32 tensors Whisper computed, so a hit gives
+exactly the features a miss does, in an LRU bounded by MEL_CACHE_MB (about
+2 MB per minute of audio at 80 mel bins). Callers that need only part of the
+features (e.g. the first 30 seconds for language detection) slice the cached
+tensor, which is a view rather than a copy.
+"""
+import collections
+import hashlib
+import os
+import sys
+import threading
+import numpy as np
+import whisper
+import whisper.transcribe  # noqa: F401 (makes the module reachable through sys.modules)
+from whisper.audio import N_SAMPLES, N_FRAMES
+from metrics import get_metrics
+
+
+def _env_number(name, default, cast=int):
+    """Read a non-negative number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value >= 0 else default
+
+
+def audio_fingerprint(audio):
+    """
+    Hash a waveform's samples.
+
+    Args:
+        audio (np.ndarray): float32 waveform
+
+    Returns:
+        str: Hex digest identifying the samples
+    """
+    samples = np.ascontiguousarray(audio, dtype=np.float32)
+    return hashlib.blake2b(memoryview(samples).cast('B'), digest_size=16).hexdigest()
+
+
+class MelCache:
+    """LRU of log-mel features."""
+
+    def __init__(self, max_mb=None):
+        """
+        Args:
+            max_mb (float): Memory the cached features may use
+                (MEL_CACHE_MB, default: 64; 0 disables the cache)
+        """
+        max_mb = _env_number('MEL_CACHE_MB', 64.0, float) if max_mb is None else max_mb
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._metrics = get_metrics()
+
+    def features(self, audio, n_mels, padding=0):
+        """
+        Get the log-mel features of a waveform, computing them on a miss.
+
+        Args:
+            audio (np.ndarray): 16kHz mono float32 waveform
+            n_mels (int): Mel bins (the model's dims.n_mels)
+            padding (int): Zero samples appended before the STFT (Whisper's
+                transcribe uses N_SAMPLES)
+
+        Returns:
+            torch.Tensor: float32 features, shape (n_mels, frames); shared
+                with the cache, so not to be modified in place
+        """
+        if self.max_bytes <= 0:
+            return _original_log_mel_spectrogram(audio, n_mels, padding)
+
+        key = (audio_fingerprint(audio), n_mels, padding)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+        if cached is not None:
+            self._metrics.increment('mel_cache.hits')
+            return cached
+
+        self._metrics.increment('mel_cache.misses')
+        mel = _original_log_mel_spectrogram(audio, n_mels, padding)
+        self._store(key, mel)
+        return mel
+
+    def _store(self, key, mel):
+        size = mel.numel() * mel.element_size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = mel
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.numel() * evicted.element_size()
+                self._metrics.increment('mel_cache.evictions')
+            self._metrics.set_gauge('mel_cache.mb', round(self._bytes / (1024 * 1024), 2))
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._metrics.set_gauge('mel_cache.mb', 0)
+
+    def status(self):
+        """Entries and memory in use."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'mb': round(self._bytes / (1024 * 1024), 2),
+                'max_mb': round(self.max_bytes / (1024 * 1024), 2)
+            }
+
+
+def _original_log_mel_spectrogram(audio, n_mels, padding):
+    return whisper.audio.log_mel_spectrogram(audio, n_mels, padding=padding)
+
+
+def detection_features(audio, n_mels):
+    """
+    Features Whisper's transcribe uses to detect the language: the first
+    30 seconds of the padded features, as a view of the cached tensor (so a
+    transcription of the same audio afterwards is a cache hit).
+
+    Args:
+        audio (np.ndarray): 16kHz mono float32 waveform
+        n_mels (int): Mel bins
+
+    Returns:
+        torch.Tensor: float32 features, shape (n_mels, N_FRAMES)
+    """
+    return get_mel_cache().features(audio, n_mels, padding=N_SAMPLES)[:, :N_FRAMES]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_installed = False
+
+
+def get_mel_cache():
+    """Get the process-wide mel cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MelCache()
+        return _cache
+
+
+def install():
+    """Make Whisper's transcribe() take its features from the cache (idempotent)."""
+    global _installed
+    with _cache_lock:
+        if _installed:
+            return
+        _installed = True
+
+    def log_mel_spectrogram(audio, n_mels=80, padding=0, device=None):
+        # Paths and tensors (and device placement) keep Whisper's own behaviour
+        if not isinstance(audio, np.ndarray) or device is not None:
+            return _original_log_mel_spectrogram(audio, n_mels, padding)
+        return get_mel_cache().features(audio, n_mels, padding)
+
+    # transcribe() calls the name it imported into its own module
+    sys.modules['whisper.transcribe'].log_mel_spectrogram = log_mel_spectrogram
@@ -0,0 +1,150 @@
+"""
+In-process metrics collection.
+Thread-safe counters, gauges and timings that the API exposes as JSON,
+plus process startup milestones (model load, time to first request).
+"""
+import os
+import threading
+import time
+
+
+def process_start_time():
+    """
+    Get the wall-clock time this process started.
+
+    Uses /proc so a forked gunicorn worker reports its own fork time rather
+    than the master's start time; falls back to the metrics import time.
+
+    Returns:
+        float: Unix timestamp
+    """
+    try:
+        with open(f'/proc/{os.getpid()}/stat') as f:
+            # Field 22 (after the parenthesised command name) is start time in ticks
+            fields = f.read().rsplit(')', 1)[1].split()
+        start_ticks = int(fields[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        ticks_per_second = os.sysconf('SC_CLK_TCK')
+        return time.time() - uptime + start_ticks / ticks_per_second
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _IMPORT_TIME
+
+
+_IMPORT_TIME = time.time()
+
+
+class Metrics:
+    """Registry of named counters, gauges and timing summaries."""
+
+    def __init__(self):
+        """Initialize empty metrics."""
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+        self._startup = {}
+        self._first_request_pid = None
+
+    def increment(self, name, value=1):
+        """
+        Add to a counter.
+
+        Args:
+            name (str): Counter name
+            value (int): Amount to add (default: 1)
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """
+        Set a gauge to its current value.
+
+        Args:
+            name (str): Gauge name
+            value (float): Current value
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def record_timing(self, name, seconds):
+        """
+        Record one duration observation.
+
+        Args:
+            name (str): Timing name
+            seconds (float): Observed duration in seconds
+        """
+        with self._lock:
+            timing = self._timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    def record_startup(self, name, value):
+        """
+        Record a startup milestone (kept as-is, not aggregated).
+
+        Args:
+            name (str): Milestone name
+            value: JSON-serializable value
+        """
+        with self._lock:
+            self._startup[name] = value
+
+    def mark_request_complete(self):
+        """
+        Record time-to-first-request the first time a request completes in
+        this process. Later calls are cheap no-ops.
+        """
+        pid = os.getpid()
+        if self._first_request_pid == pid:
+            return
+        with self._lock:
+            if self._first_request_pid == pid:
+                return
+            self._first_request_pid = pid
+            self._startup['time_to_first_request_seconds'] = round(
+                time.time() - process_start_time(), 3
+            )
+
+    def startup(self):
+        """Startup milestones for this process."""
+        with self._lock:
+            startup = dict(self._startup)
+        if self._first_request_pid != os.getpid():
+            # Inherited from the preloading master; this worker hasn't served yet
+            startup.pop('time_to_first_request_seconds', None)
+        startup['process_uptime_seconds'] = round(time.time() - process_start_time(), 3)
+        return startup
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict."""
+        with self._lock:
+            timings = {
+                name: {
+                    'count': t['count'],
+                    'avg': round(t['total'] / t['count'], 4) if t['count'] else 0.0,
+                    'max': round(t['max'], 4)
+                }
+                for name, t in self._timings.items()
+            }
+            snapshot = {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': timings
+            }
+        snapshot['startup'] = self.startup()
+        return snapshot
+
+
+# Global metrics instance
+_metrics = None
+
+def get_metrics():
+    """Get or create global metrics instance."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
@@ -0,0 +1,159 @@
+"""
+Memory-mapped Whisper checkpoint cache.
+Converts each official `.pt` checkpoint once into a safetensors file holding
+float32 weights, then builds models directly on the memory-mapped file so a
+cold start maps pages instead of unpickling and copying every tensor.
+"""
+import contextlib
+import json
+import os
+import time
+import torch
+import whisper
+from whisper.model import ModelDimensions, Whisper
+
+
+def _default_cache_dir():
+    """Default cache location, next to whisper's own download directory."""
+    default = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(os.getenv("XDG_CACHE_HOME", default), "whisper", "safetensors")
+
+
+def cache_enabled():
+    """Check whether the mmap cache is enabled (MODEL_MMAP_CACHE, default on)."""
+    return os.environ.get('MODEL_MMAP_CACHE', '1').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def cache_dir():
+    """Get the directory holding converted checkpoints (MODEL_CACHE_DIR)."""
+    return os.environ.get('MODEL_CACHE_DIR') or _default_cache_dir()
+
+
+def cached_checkpoint_path(model_size):
+    """
+    Get the path of a converted checkpoint.
+
+    Args:
+        model_size (str): Whisper model size
+
+    Returns:
+        str: Path to the `.safetensors` file (may not exist yet)
+    """
+    return os.path.join(cache_dir(), f"{model_size}.safetensors")
+
+
+def convert_checkpoint(model_size):
+    """
+    Convert an official Whisper checkpoint into the mmap-friendly cache format.
+
+    Downloads the checkpoint if needed (same location as whisper.load_model),
+    upcasts the fp16 weights to the float32 the CPU model runs in, and writes
+    them with the model dimensions as safetensors metadata.
+
+    Args:
+        model_size (str): Whisper model size
+
+    Returns:
+        str: Path to the converted checkpoint
+
+    Raises:
+        RuntimeError: If the model size is unknown
+    """
+    from safetensors.torch import save_file
+
+    if model_size not in whisper._MODELS:
+        raise RuntimeError(f"Model {model_size} not found; available models = {whisper.available_models()}")
+
+    download_root = os.path.dirname(_default_cache_dir())
+    checkpoint_file = whisper._download(whisper._MODELS[model_size], download_root, False)
+
+    print(f"Converting Whisper checkpoint '{model_size}' to safetensors...")
+    start = time.perf_counter()
+    with open(checkpoint_file, "rb") as fp:
+        checkpoint = torch.load(fp, map_location="cpu")
+
+    state_dict = {
+        name: tensor.float().contiguous() if tensor.is_floating_point() else tensor.contiguous()
+        for name, tensor in checkpoint["model_state_dict"].items()
+    }
+
+    output_path = cached_checkpoint_path(model_size)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Write then rename, so concurrent workers never map a half-written file
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    save_file(state_dict, temp_path, metadata={'dims': json.dumps(checkpoint["dims"])})
+    os.replace(temp_path, output_path)
+
+    print(f"✓ Cached checkpoint written in {time.perf_counter() - start:.2f}s: {output_path}")
+    return output_path
+
+
+@contextlib.contextmanager
+def _skip_weight_init():
+    """
+    Skip random weight initialization while building a model skeleton.
+
+    Parameters are still allocated, but their pages are never touched and are
+    released as soon as the mapped checkpoint tensors are assigned in their
+    place. Buffers Whisper computes itself (attention mask, alignment heads)
+    are built normally.
+    """
+    names = ['uniform_', 'normal_', 'kaiming_uniform_', 'kaiming_normal_',
+             'xavier_uniform_', 'xavier_normal_', 'trunc_normal_', 'ones_', 'zeros_']
+    originals = {name: getattr(torch.nn.init, name) for name in names}
+    try:
+        for name in names:
+            setattr(torch.nn.init, name, lambda tensor, *args, **kwargs: tensor)
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(torch.nn.init, name, original)
+
+
+def load_model(model_size):
+    """
+    Load a Whisper model, mapping weights from the cache when possible.
+
+    Falls back to whisper.load_model when the cache is disabled, a GPU is in
+    use (weights must be copied to the device anyway) or safetensors is not
+    installed.
+
+    Args:
+        model_size (str): Whisper model size
+
+    Returns:
+        tuple: (model, load_mode) where load_mode is 'mmap' or 'checkpoint'
+    """
+    if not cache_enabled() or torch.cuda.is_available():
+        return whisper.load_model(model_size), 'checkpoint'
+
+    try:
+        from safetensors import safe_open
+    except ImportError:
+        print("⚠️  safetensors not installed; loading the full checkpoint")
+        return whisper.load_model(model_size), 'checkpoint'
+
+    path = cached_checkpoint_path(model_size)
+    if not os.path.exists(path):
+        path = convert_checkpoint(model_size)
+
+    with safe_open(path, framework="pt", device="cpu") as f:
+        dims = ModelDimensions(**json.loads(f.metadata()['dims']))
+        state_dict = {name: f.get_tensor(name) for name in f.keys()}
+
+    # Build the module tree without initializing weights, then adopt the mapped tensors
+    with _skip_weight_init():
+        model = Whisper(dims)
+    model.load_state_dict(state_dict, assign=True)
+    if model_size in whisper._ALIGNMENT_HEADS:
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[model_size])
+    return model, 'mmap'
+
+
+if __name__ == "__main__":
+    # Pre-convert checkpoints (e.g. during a build step)
+    import sys
+
+    sizes = sys.argv[1:] or [os.environ.get('WHISPER_MODEL_SIZE', 'base')]
+    for size in sizes:
+        print(f"Cached: {convert_checkpoint(size)}")
@@ -0,0 +1,139 @@
+"""
+Process-wide Whisper model registry.
+Loads each model size once and shares it between all transcribers. Under
+gunicorn with preload enabled the master process loads the weights before
+forking, so workers share them copy-on-write instead of loading their own.
+"""
+import gc
+import threading
+import time
+import whisper
+import model_cache
+import decode_hooks
+import cancellation
+import mel_cache
+import encoder_cache
+from metrics import get_metrics
+
+
+class ModelRegistry:
+    """Loads Whisper models on first use and hands out the shared instance."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._models = {}
+        self._load_modes = {}
+        self._inference_locks = {}
+        self._lock = threading.Lock()
+        self._frozen = False
+
+    def get(self, model_size):
+        """
+        Get a loaded model, loading it on first request.
+
+        Args:
+            model_size (str): Whisper model size (tiny, base, small, medium, large)
+
+        Returns:
+            whisper.model.Whisper: The shared model instance
+
+        Raises:
+            Exception: If the model cannot be loaded
+        """
+        model = self._models.get(model_size)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if model_size not in self._models:
+                print(f"Loading Whisper model '{model_size}' into registry...")
+                start = time.perf_counter()
+                try:
+                    model, load_mode = model_cache.load_model(model_size)
+                except Exception as e:
+                    print(f"⚠️  Cached model load failed ({e}); loading the full checkpoint")
+                    model, load_mode = whisper.load_model(model_size), 'checkpoint'
+                load_seconds = round(time.perf_counter() - start, 3)
+                get_metrics().record_startup(f'model_load_seconds.{model_size}', load_seconds)
+                # Inference only: drop autograd bookkeeping so shared pages stay clean
+                model.eval()
+                for param in model.parameters():
+                    param.requires_grad_(False)
+                decode_hooks.install(model)
+                cancellation.install(model)
+                encoder_cache.install(model, model_size)
+                mel_cache.install()
+                self._models[model_size] = model
+                self._load_modes[model_size] = load_mode
+                self._inference_locks[model_size] = threading.Lock()
+                print(f"✓ Whisper model '{model_size}' registered ({load_mode}, {load_seconds}s)")
+            return self._models[model_size]
+
+    def inference_lock(self, model_size):
+        """
+        Get the lock that serializes inference on a shared model.
+
+        Whisper's decoder installs KV-cache hooks on the model's modules for
+        the duration of a decode, so two threads must not run the same model
+        at once.
+
+        Args:
+            model_size (str): Whisper model size
+
+        Returns:
+            threading.Lock: Lock for the model
+        """
+        self.get(model_size)
+        return self._inference_locks[model_size]
+
+    def loaded_models(self):
+        """Get the model sizes currently loaded in this process."""
+        return sorted(self._models)
+
+    def freeze(self):
+        """
+        Prepare the loaded models to be inherited by forked workers.
+
+        Moves every object allocated so far into the garbage collector's
+        permanent generation, so collections in the workers don't write to
+        (and un-share) the pages holding the model objects.
+        """
+        if self._frozen:
+            return
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+        self._frozen = True
+        print(f"✓ Model registry frozen for fork: {', '.join(self.loaded_models()) or 'no models'}")
+
+    def status(self):
+        """Registry state as a JSON-serializable dict."""
+        return {
+            'loaded_models': self.loaded_models(),
+            'load_modes': dict(self._load_modes),
+            'frozen_for_fork': self._frozen
+        }
+
+
+# Global registry instance
+_registry = None
+
+def get_registry():
+    """Get or create global model registry."""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
+
+
+def get_model(model_size):
+    """
+    Quick access to a shared model.
+
+    Args:
+        model_size (str): Whisper model size
+
+    Returns:
+        whisper.model.Whisper: The shared model instance
+    """
+    return get_registry().get(model_size)
@@ -0,0 +1,300 @@
+"""
+Adaptive Whisper model-size routing.
+Picks a model size per request from the caller's quality tier, the audio
+duration, the spoken language and the current backlog. When the backlog
+would push a request past the latency target, it steps down to smaller
+models until the estimate fits.
+"""
+import os
+import threading
+import time
+from model_registry import get_registry
+from mel_cache import detection_features
+from metrics import get_metrics
+
+
+# Model sizes from fastest to most accurate
+MODEL_ORDER = ['tiny', 'base', 'small', 'medium', 'large']
+
+# Model each quality tier asks for
+TIER_MODELS = {
+    'fast': 'tiny',
+    'balanced': 'base',
+    'accurate': 'small'
+}
+
+# Languages the smaller models already handle well; others get one size up
+WELL_SUPPORTED_LANGUAGES = {
+    'en', 'es', 'fr', 'de', 'it', 'pt', 'nl', 'ru', 'pl', 'ja', 'zh', 'ko', 'ca', 'sv', 'tr'
+}
+
+# Starting estimates of inference seconds per second of audio on one worker,
+# replaced by observed values as requests complete
+DEFAULT_REALTIME_FACTORS = {
+    'tiny': 0.08,
+    'base': 0.15,
+    'small': 0.45,
+    'medium': 1.2,
+    'large': 2.5
+}
+
+# Weight of the newest observation in the realtime-factor average
+REALTIME_FACTOR_ALPHA = 0.2
+
+# Detection probability above which the chosen model is told the language
+# instead of detecting it again
+DEFAULT_LANGUAGE_CONFIDENCE = 0.8
+
+
+class RoutingDecision:
+    """The model chosen for one request and why."""
+
+    def __init__(self, model_size, duration, language=None, reasons=None, estimated_seconds=None,
+                 language_probability=None, force_language=None):
+        self.model_size = model_size
+        self.duration = duration
+        self.language = language
+        self.reasons = reasons or []
+        self.estimated_seconds = estimated_seconds
+        # Probability of a detected language (None when the caller gave it)
+        self.language_probability = language_probability
+        # Language the chosen model should decode in (None: it detects its own)
+        self.force_language = force_language
+
+    def to_dict(self):
+        """Decision as a JSON-serializable dict."""
+        return {
+            'model_size': self.model_size,
+            'language': self.language,
+            'language_probability': self.language_probability,
+            'reasons': self.reasons,
+            'estimated_seconds': self.estimated_seconds
+        }
+
+
+class ModelRouter:
+    """Chooses a Whisper model size per request."""
+
+    def __init__(self, default_size='base', models=None, latency_slo=None,
+                 long_audio_seconds=None, detect_language=None, language_confidence=None):
+        """
+        Args:
+            default_size (str): Model used when the caller asks for no tier
+            models (list, optional): Sizes the router may use
+                (ROUTER_MODELS, comma-separated; default: only default_size,
+                which turns routing off)
+            latency_slo (float, optional): Target seconds from routing to
+                result (ROUTER_LATENCY_SLO, default: 60)
+            long_audio_seconds (float, optional): Audio longer than this
+                steps down one size unless the tier is 'accurate'
+                (ROUTER_LONG_AUDIO_SECONDS, default: 900)
+            detect_language (bool, optional): Run a language-detection pass
+                on the smallest model when the caller didn't give a language
+                (ROUTER_DETECT_LANGUAGE, default: on)
+            language_confidence (float, optional): Detection probability from
+                which the detected language is passed on to the chosen model
+                and can step it up; below it, the chosen model detects again
+                (ROUTER_LANGUAGE_CONFIDENCE, default: 0.8)
+        """
+        configured = models or [
+            size.strip() for size in os.environ.get('ROUTER_MODELS', '').split(',') if size.strip()
+        ]
+        sizes = {size for size in configured if size in MODEL_ORDER} or {default_size}
+        sizes.add(default_size)
+        self.models = [size for size in MODEL_ORDER if size in sizes]
+        self.default_size = default_size
+        self.latency_slo = latency_slo or float(os.environ.get('ROUTER_LATENCY_SLO', 60))
+        self.long_audio_seconds = long_audio_seconds or float(os.environ.get('ROUTER_LONG_AUDIO_SECONDS', 900))
+        if detect_language is None:
+            detect_language = os.environ.get('ROUTER_DETECT_LANGUAGE', '1').strip().lower() in ('1', 'true', 'yes', 'on')
+        self.detect_language_enabled = detect_language
+        self.language_confidence = language_confidence or float(
+            os.environ.get('ROUTER_LANGUAGE_CONFIDENCE', DEFAULT_LANGUAGE_CONFIDENCE)
+        )
+
+        self._realtime_factors = {size: DEFAULT_REALTIME_FACTORS[size] for size in self.models}
+        # Audio routed to each model and not finished yet: what runs ahead of a
+        # new request on that model (each model has its own inference lane)
+        self._in_flight_audio = {size: 0.0 for size in self.models}
+        self._lock = threading.Lock()
+        self._metrics = get_metrics()
+
+    @property
+    def enabled(self):
+        """Whether there is more than one model to choose from."""
+        return len(self.models) > 1
+
+    def preload(self):
+        """Load every routable model now (before forking, under gunicorn preload)."""
+        for size in self.models:
+            get_registry().get(size)
+
+    def _step(self, size, steps):
+        """Move steps sizes up (positive) or down (negative) within the routable models."""
+        index = self.models.index(size) + steps
+        return self.models[max(0, min(len(self.models) - 1, index))]
+
+    def _nearest(self, size):
+        """Closest routable model to a requested size (rounding down)."""
+        wanted = MODEL_ORDER.index(size)
+        smaller = [s for s in self.models if MODEL_ORDER.index(s) <= wanted]
+        return smaller[-1] if smaller else self.models[0]
+
+    def estimate_seconds(self, size, duration):
+        """
+        Estimate seconds until a new request would finish on a model.
+
+        Args:
+            size (str): Model size
+            duration (float): Audio seconds of the new request
+
+        Returns:
+            float: The audio already routed to that model plus this request,
+                at the model's realtime factor
+        """
+        with self._lock:
+            backlog = self._in_flight_audio[size]
+            factor = self._realtime_factors[size]
+        return (backlog + duration) * factor
+
+    def detect_language(self, audio):
+        """
+        Detect the spoken language with the smallest routable model.
+
+        Args:
+            audio (np.ndarray): 16kHz mono float32 waveform (only the first
+                30 seconds are used)
+
+        Returns:
+            tuple: (language code, its probability)
+        """
+        size = self.models[0]
+        registry = get_registry()
+        model = registry.get(size)
+        start = time.perf_counter()
+        with registry.inference_lock(size):
+            # Same features transcribe() computes, so its pass reuses them
+            mel = detection_features(audio, model.dims.n_mels)
+            _, probs = model.detect_language(mel.to(model.device))
+        self._metrics.record_timing('router.detect_seconds', time.perf_counter() - start)
+        language = max(probs, key=probs.get)
+        return language, float(probs[language])
+
+    def route(self, duration, tier=None, language=None, audio=None):
+        """
+        Choose a model size for a request and count it as in flight.
+
+        Call release() with the decision once the request has finished.
+
+        Args:
+            duration (float): Audio seconds
+            tier (str, optional): 'fast', 'balanced' or 'accurate'
+            language (str, optional): Language code given by the caller
+            audio (np.ndarray, optional): Waveform for the language-detection
+                pass (skipped when None or a language is given)
+
+        Returns:
+            RoutingDecision: Chosen model and the reasons
+
+        Raises:
+            ValueError: If tier is not a known tier
+        """
+        if tier and tier not in TIER_MODELS:
+            raise ValueError('Invalid tier. Allowed tiers: ' + ', '.join(TIER_MODELS))
+
+        reasons = []
+        probability = None
+        if tier:
+            size = self._nearest(TIER_MODELS[tier])
+            reasons.append(f'tier:{tier}')
+        else:
+            size = self.default_size
+
+        if self.enabled:
+            if not language and audio is not None and self.detect_language_enabled:
+                language, probability = self.detect_language(audio)
+                reasons.append(f'detected:{language}')
+
+            if duration > self.long_audio_seconds and tier != 'accurate':
+                stepped = self._step(size, -1)
+                if stepped != size:
+                    size = stepped
+                    reasons.append('long_audio')
+
+            # The smallest model's guess only counts when it is confident
+            confident = language and (probability is None or probability >= self.language_confidence)
+            if confident and language not in WELL_SUPPORTED_LANGUAGES and tier != 'fast':
+                stepped = self._step(size, 1)
+                if stepped != size:
+                    size = stepped
+                    reasons.append('language')
+
+            # Hold the latency target: degrade while the estimate is too long
+            degraded = False
+            while self.estimate_seconds(size, duration) > self.latency_slo and size != self.models[0]:
+                size = self._step(size, -1)
+                degraded = True
+            if degraded:
+                reasons.append('load')
+                self._metrics.increment('router.degraded')
+
+        estimated = round(self.estimate_seconds(size, duration), 2)
+        with self._lock:
+            self._in_flight_audio[size] += duration
+            self._set_in_flight_gauges(size)
+
+        self._metrics.increment(f'router.decisions.{size}')
+        for reason in reasons:
+            self._metrics.increment(f"router.reasons.{reason.split(':')[0]}")
+        confident = probability is None or probability >= self.language_confidence
+        return RoutingDecision(
+            size, duration, language, reasons, estimated,
+            language_probability=round(probability, 3) if probability is not None else None,
+            force_language=language if confident else None
+        )
+
+    def release(self, decision):
+        """
+        Remove a finished request from the backlog.
+
+        Args:
+            decision (RoutingDecision): Decision returned by route()
+        """
+        with self._lock:
+            size = decision.model_size
+            self._in_flight_audio[size] = max(0.0, self._in_flight_audio[size] - decision.duration)
+            self._set_in_flight_gauges(size)
+
+    def _set_in_flight_gauges(self, size):
+        """Publish a model's in-flight audio and the total (with the lock held)."""
+        self._metrics.set_gauge(f'router.in_flight_audio_seconds.{size}', round(self._in_flight_audio[size], 2))
+        self._metrics.set_gauge('router.in_flight_audio_seconds', round(sum(self._in_flight_audio.values()), 2))
+
+    def observe(self, size, audio_seconds, inference_seconds):
+        """
+        Update a model's realtime factor from a finished inference.
+
+        Args:
+            size (str): Model size
+            audio_seconds (float): Audio transcribed
+            inference_seconds (float): Time inference took
+        """
+        if size not in self._realtime_factors or audio_seconds <= 0:
+            return
+        factor = inference_seconds / audio_seconds
+        with self._lock:
+            previous = self._realtime_factors[size]
+            self._realtime_factors[size] = (1 - REALTIME_FACTOR_ALPHA) * previous + REALTIME_FACTOR_ALPHA * factor
+            self._metrics.set_gauge(f'router.realtime_factor.{size}', round(self._realtime_factors[size], 4))
+
+    def status(self):
+        """Router state as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'models': self.models,
+                'default_model': self.default_size,
+                'latency_slo_seconds': self.latency_slo,
+                'in_flight_audio_seconds': {size: round(s, 2) for size, s in self._in_flight_audio.items()},
+                'realtime_factors': {size: round(f, 4) for size, f in self._realtime_factors.items()}
+            }
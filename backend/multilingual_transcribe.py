@@ -2,11 +2,23 @@
 Multilingual transcription module with automatic language detection.
 Uses OpenAI Whisper for speech recognition.
 """
-import whisper
 import os
 import json
+import contextlib
 from datetime import datetime
-from nlp_corrector import NLPCorrector
+from nlp_corrector import get_corrector_manager
+from model_registry import get_registry
+from preprocess_audio import load_audio, TARGET_SAMPLE_RATE
+from cancellation import cancellable, TranscriptionCancelled
+from transcript_store import get_transcript_store
+import batched_decoding
+
+
+# Audio per Whisper call when streaming segments (Whisper's own window size)
+STREAM_CHUNK_SECONDS = 30
+
+# Previous segments passed as the prompt for the next streamed chunk
+STREAM_PROMPT_SEGMENTS = 8
 
 
 class MultilingualTranscriber:
@@ -56,14 +68,18 @@ class MultilingualTranscriber:
         """
         self.model_size = model_size
         self.model = None
+        self._inference_lock = None
         self.enable_nlp_correction = enable_nlp_correction
-        self.nlp_corrector = None
+        self.nlp_correctors = None
         self._load_model()
         
         if enable_nlp_correction:
             print("Initializing NLP corrector...")
             try:
-                self.nlp_corrector = NLPCorrector('en-US')
+                # Correctors are per language and shared by every transcriber,
+                # started on first use (gunicorn workers start English once
+                # forked, so no server is shared with a preloading master)
+                self.nlp_correctors = get_corrector_manager()
                 print("✓ NLP correction enabled")
             except Exception as e:
                 print(f"⚠️  NLP corrector initialization failed: {e}")
@@ -71,12 +87,15 @@ class MultilingualTranscriber:
                 self.enable_nlp_correction = False
     
     def _load_model(self):
-        """Load the Whisper model."""
+        """Load the Whisper model (shared through the model registry)."""
         print(f"Loading Whisper model: {self.model_size}")
-        self.model = whisper.load_model(self.model_size)
-        print(f"Model loaded successfully")
+        registry = get_registry()
+        self.model = registry.get(self.model_size)
+        self._inference_lock = registry.inference_lock(self.model_size)
+        print("Model loaded successfully")
     
-    def transcribe_audio(self, audio_path, detect_language=True, force_language=None):
+    def transcribe_audio(self, audio_path, detect_language=True, force_language=None, word_timestamps=False,
+                         vocabulary=None, model_size=None, cancel=None, decoding=None):
         """
         Transcribe audio with automatic language detection.
         
@@ -84,6 +103,15 @@ class MultilingualTranscriber:
             audio_path (str): Path to audio file
             detect_language (bool): Whether to auto-detect language
             force_language (str): Force specific language code (optional)
+            word_timestamps (bool): Add per-word timings to each segment ('words')
+            vocabulary (Vocabulary, optional): Terms to bias decoding towards
+                and snap near misses to
+            model_size (str, optional): Run on this model size instead of
+                the transcriber's own
+            cancel (CancelToken, optional): Stops decode, inference and
+                correction early (raises TranscriptionCancelled)
+            decoding (dict, optional): Whisper decoding options (see
+                decoding_profiles.py; default: Whisper's own)
         
         Returns:
             dict: {
@@ -99,79 +127,456 @@ class MultilingualTranscriber:
         
         print(f"Transcribing: {audio_path}")
         
+        # Decode to a waveform here (in-process for 16kHz PCM WAV) so
+        # Whisper doesn't spawn its own FFmpeg to read the file again
+        with cancellable(cancel):
+            audio = load_audio(audio_path)
+        
+        result, detected_lang = self.run_inference(
+            audio, detect_language, force_language, word_timestamps, vocabulary, model_size, cancel,
+            decoding
+        )
+        transcription_data = self.build_transcription(result, detected_lang, vocabulary, cancel)
+        
+        # Save transcript to file
+        self._save_transcript(transcription_data)
+        
+        print(f"Transcription complete. Detected language: {transcription_data['language_name']} ({detected_lang})")
+        return transcription_data
+    
+    def run_inference(self, audio, detect_language=True, force_language=None, word_timestamps=False,
+                      vocabulary=None, model_size=None, cancel=None, decoding=None):
+        """
+        Run Whisper on a decoded waveform (the inference stage on its own).
+        
+        Args:
+            audio (np.ndarray): 16kHz mono float32 waveform
+            detect_language (bool): Whether to auto-detect language
+            force_language (str): Force specific language code (optional)
+            word_timestamps (bool): Also time each word (slower)
+            vocabulary (Vocabulary, optional): Terms to bias decoding towards
+            model_size (str, optional): Run on this model size instead of
+                the transcriber's own (e.g. as chosen by the model router)
+            cancel (CancelToken, optional): Checked before every forward pass
+            decoding (dict, optional): Whisper decoding options (see decoding_profiles.py)
+        
+        Returns:
+            tuple: (raw Whisper result dict, language code)
+        
+        Raises:
+            TranscriptionCancelled: If cancel trips
+        """
+        options = self._decode_options(word_timestamps, decoding)
+        if self._batchable(options, vocabulary):
+            result = self._batcher(model_size).transcribe(audio, force_language, options, cancel)
+            return result, force_language or result['language']
+        model, inference_lock = self._model_for(model_size)
+        
         # Transcribe with or without language specification
-        if force_language:
-            print(f"Forcing language: {force_language}")
-            result = self.model.transcribe(audio_path, language=force_language)
-            detected_lang = force_language
-        elif detect_language:
-            print("Auto-detecting language...")
-            result = self.model.transcribe(audio_path)
-            detected_lang = result.get('language', 'unknown')
-        else:
-            result = self.model.transcribe(audio_path)
-            detected_lang = result.get('language', 'unknown')
+        with inference_lock, cancellable(cancel), self._biasing(vocabulary):
+            if force_language:
+                print(f"Forcing language: {force_language}")
+                result = model.transcribe(audio, language=force_language, **options)
+                detected_lang = force_language
+            elif detect_language:
+                print("Auto-detecting language...")
+                result = model.transcribe(audio, **options)
+                detected_lang = result.get('language', 'unknown')
+            else:
+                result = model.transcribe(audio, **options)
+                detected_lang = result.get('language', 'unknown')
+        
+        return result, detected_lang
+    
+    def build_transcription(self, result, detected_lang, vocabulary=None, cancel=None, correct=True,
+                            shift=0.0):
+        """
+        Apply NLP correction to a Whisper result and build the transcription
+        data (the correction stage on its own).
         
-        language_name = self.SUPPORTED_LANGUAGES.get(detected_lang, 'Unknown')
+        Args:
+            result (dict): Raw Whisper result from run_inference()
+            detected_lang (str): Language code
+            vocabulary (Vocabulary, optional): Terms to snap near misses to
+            cancel (CancelToken, optional): Checked between corrections
+            correct (bool): Apply NLP correction (without it the corrected
+                text and segments are the raw ones)
+            shift (float): Seconds to add to every timestamp (where the
+                audio Whisper ran on starts in the recording)
         
-        # Get raw transcript
+        Returns:
+            dict: Transcription data as returned by transcribe_audio()
+        """
         raw_text = result['text'].strip()
+        raw_segments = [self._segment_dict(seg, shift) for seg in result.get('segments', [])]
+        corrected_text, corrections_info, corrected_segments = raw_text, None, raw_segments
+        if correct:
+            with cancellable(cancel):
+                corrected_text, corrections_info = self._correct_text(raw_text, detected_lang)
+                corrected_segments = self._correct_segments(raw_segments, detected_lang)
+        
+        # Snap near misses to vocabulary terms last, so grammar correction
+        # can't undo the listed spellings
+        snaps = None
+        if vocabulary:
+            corrected_text, snaps = vocabulary.snap(corrected_text)
+            corrected_segments = vocabulary.snap_segments(corrected_segments)
         
-        # Apply NLP correction if enabled
+        data = self._transcription_data(
+            detected_lang, raw_text, corrected_text, raw_segments, corrected_segments,
+            self._calculate_confidence(result), corrections_info
+        )
+        if snaps is not None:
+            data['vocabulary_snaps'] = snaps
+        return data
+    
+    def stream_transcription(self, audio, force_language=None, word_timestamps=False, vocabulary=None,
+                             model_size=None, cancel=None, decoding=None, shift=0.0, save=True):
+        """
+        Transcribe a waveform chunk by chunk, yielding segments as they finish.
+        
+        The audio is fed to Whisper in STREAM_CHUNK_SECONDS chunks. Every
+        segment of a chunk except the last is final; the last one may be cut
+        off at the chunk boundary, so the next chunk starts where it began
+        and transcribes it again. The language is detected on the first
+        chunk and kept for the rest. The inference lock is taken per chunk,
+        so a long stream doesn't hold the model for its whole duration.
+        
+        This is stream_windows() (Whisper) followed by collect_stream() (NLP
+        correction), which the pipeline runs in different stages.
+        
+        Args:
+            audio (np.ndarray): 16kHz mono float32 waveform
+            force_language (str): Force specific language code (optional)
+            word_timestamps (bool): Also time each word (slower)
+            vocabulary (Vocabulary, optional): Terms to bias decoding towards
+                and snap near misses to
+            model_size (str, optional): Run on this model size instead of
+                the transcriber's own
+            cancel (CancelToken, optional): Stops inference and correction
+                early (raises TranscriptionCancelled)
+            decoding (dict, optional): Whisper decoding options (see decoding_profiles.py)
+            shift (float): Seconds into the recording where audio starts
+            save (bool): Save the transcript at the end (see finish_transcription())
+        
+        Yields:
+            tuple: ('segment', corrected segment dict) for each finished
+                segment, then ('done', transcription data) once at the end
+        """
+        windows = self.stream_windows(
+            audio, force_language, word_timestamps, vocabulary, model_size, cancel, decoding, shift
+        )
+        yield from self.collect_stream(windows, force_language, vocabulary, cancel, save=save)
+    
+    def stream_windows(self, audio, force_language=None, word_timestamps=False, vocabulary=None,
+                       model_size=None, cancel=None, decoding=None, shift=0.0):
+        """
+        Run Whisper over a waveform chunk by chunk (the inference half of
+        stream_transcription()).
+        
+        Yields:
+            dict: Each window, as transcribe_window(correct=False) returns it
+        """
+        chunk_size = STREAM_CHUNK_SECONDS * TARGET_SAMPLE_RATE
+        language = force_language
+        whisper_segments = []
+        offset = 0
+        
+        while offset < len(audio):
+            chunk = audio[offset:offset + chunk_size]
+            window = self.transcribe_window(
+                chunk, shift + offset / TARGET_SAMPLE_RATE, language=language,
+                prompt=self.prompt_from(whisper_segments, decoding),
+                final=offset + chunk_size >= len(audio), require_progress=True,
+                word_timestamps=word_timestamps, vocabulary=vocabulary,
+                model_size=model_size, cancel=cancel, decoding=decoding, correct=False
+            )
+            if language is None:
+                language = window['language']
+                print(f"Detected language: {language}")
+            
+            whisper_segments.extend(window['segments'])
+            offset += window['consumed']
+            yield window
+    
+    def collect_stream(self, windows, language=None, vocabulary=None, cancel=None, correct=True, save=True):
+        """
+        Correct windows from stream_windows() as they arrive and build the
+        transcription data at the end (the correction half of
+        stream_transcription()).
+        
+        Args:
+            windows (iterable): Uncorrected windows, in order
+            language (str, optional): Language code until a window reports one
+            vocabulary (Vocabulary, optional): Terms to snap near misses to
+            cancel (CancelToken, optional): Stops the NLP correction early
+            correct (bool): Apply NLP correction (vocabulary snapping applies either way)
+            save (bool): Save the transcript at the end (see finish_transcription())
+        
+        Yields:
+            tuple: ('segment', corrected segment dict) for each finished
+                segment, then ('done', transcription data) once at the end
+        """
+        whisper_segments = []
+        raw_segments = []
+        corrected_segments = []
+        for window in windows:
+            self.correct_window(window, vocabulary, cancel, correct)
+            language = window['language']
+            whisper_segments.extend(window['segments'])
+            raw_segments.extend(window['raw_segments'])
+            corrected_segments.extend(window['corrected_segments'])
+            for segment in window['corrected_segments']:
+                yield 'segment', segment
+        
+        yield 'done', self.finish_transcription(
+            language, whisper_segments, raw_segments, corrected_segments, vocabulary, cancel, save,
+            correct=correct
+        )
+    
+    def transcribe_window(self, audio, offset=0.0, language=None, prompt=None, final=True,
+                          require_progress=False, word_timestamps=False, vocabulary=None,
+                          model_size=None, cancel=None, decoding=None, correct=True):
+        """
+        Transcribe one stretch of a longer recording and split off the
+        segments that are final.
+        
+        Unless final is set, the last segment may be cut off where the audio
+        ends, so it is returned as tentative and not consumed: the caller
+        passes the audio from its start again next time.
+        
+        Args:
+            audio (np.ndarray): 16kHz mono float32 waveform of the stretch
+            offset (float): Seconds into the recording where audio starts
+            language (str, optional): Language code (detected when None)
+            prompt (str, optional): Text preceding the stretch (see prompt_from())
+            final (bool): The recording ends with this stretch; everything is final
+            require_progress (bool): If only one (possibly cut off) segment
+                was found, make it final anyway rather than consume nothing
+            word_timestamps (bool): Also time each word (slower)
+            vocabulary (Vocabulary, optional): Terms to bias decoding towards
+                and snap near misses to
+            model_size (str, optional): Run on this model size instead of
+                the transcriber's own
+            cancel (CancelToken, optional): Stops inference and correction early
+            decoding (dict, optional): Whisper decoding options (see decoding_profiles.py)
+            correct (bool): Correct the final segments here (off: the
+                corrected segments are left to correct_window())
+        
+        Returns:
+            dict: {
+                'language': language code,
+                'segments': final Whisper segments (as Whisper returns them),
+                'raw_segments': final segment dicts (times in the recording),
+                'corrected_segments': the same after NLP correction,
+                'tentative_segments': segment dicts that may still change,
+                'consumed': samples of audio covered by the final segments
+            }
+        """
+        options = self._decode_options(word_timestamps, decoding)
+        if self._batchable(options, vocabulary, prompt):
+            result = self._batcher(model_size).transcribe(audio, language, options, cancel)
+        else:
+            model, inference_lock = self._model_for(model_size)
+            with inference_lock, cancellable(cancel), self._biasing(vocabulary):
+                result = model.transcribe(audio, language=language, initial_prompt=prompt, **options)
+        
+        segments = result.get('segments', [])
+        tentative = []
+        consumed = len(audio)
+        if not final and (len(segments) > 1 or (segments and not require_progress)):
+            # The last segment may be cut off; redo it with the next stretch
+            start = min(int(segments[-1]['start'] * TARGET_SAMPLE_RATE), len(audio))
+            if start or not require_progress:
+                tentative = segments[-1:]
+                segments = segments[:-1]
+                consumed = start
+        
+        language = language or result.get('language', 'unknown')
+        raw_segments = [self._segment_dict(seg, offset) for seg in segments]
+        window = {
+            'language': language,
+            'segments': segments,
+            'raw_segments': raw_segments,
+            'corrected_segments': raw_segments,
+            'tentative_segments': [self._segment_dict(seg, offset) for seg in tentative],
+            'consumed': consumed
+        }
+        return self.correct_window(window, vocabulary, cancel) if correct else window
+    
+    def correct_window(self, window, vocabulary=None, cancel=None, correct=True):
+        """
+        Fill in the corrected segments of a window from transcribe_window(correct=False).
+        
+        Args:
+            window (dict): The window (updated in place)
+            vocabulary (Vocabulary, optional): Terms to snap near misses to
+            cancel (CancelToken, optional): Stops the NLP correction early
+            correct (bool): Apply NLP correction (vocabulary snapping applies either way)
+        
+        Returns:
+            dict: The window
+        """
+        corrected_segments = window['raw_segments']
+        if correct:
+            with cancellable(cancel):
+                corrected_segments = self._correct_segments(corrected_segments, window['language'])
+        if vocabulary:
+            corrected_segments = vocabulary.snap_segments(corrected_segments)
+        window['corrected_segments'] = corrected_segments
+        return window
+    
+    def prompt_from(self, whisper_segments, decoding=None):
+        """
+        Prompt for the next window: the text of the last few final segments
+        (None when the decoding options turn off conditioning on previous text).
+        """
+        if decoding and decoding.get('condition_on_previous_text') is False:
+            return None
+        return ''.join(seg['text'] for seg in whisper_segments[-STREAM_PROMPT_SEGMENTS:]) or None
+    
+    def finish_transcription(self, language, whisper_segments, raw_segments, corrected_segments,
+                             vocabulary=None, cancel=None, save=True, correct=True):
+        """
+        Build and save the transcription data for a recording transcribed
+        window by window (see transcribe_window()).
+        
+        Args:
+            language (str): Language code
+            whisper_segments (list): Final Whisper segments of every window
+            raw_segments (list): Their segment dicts
+            corrected_segments (list): Their corrected segment dicts
+            vocabulary (Vocabulary, optional): Terms to snap near misses to
+            cancel (CancelToken, optional): Stops the NLP correction early
+            save (bool): Save the transcript (off when the caller saves it
+                itself, e.g. the pipeline's persistence stage)
+            correct (bool): Apply NLP correction to the full text
+        
+        Returns:
+            dict: Transcription data as returned by transcribe_audio()
+        """
+        raw_text = ''.join(seg['text'] for seg in whisper_segments).strip()
+        corrected_text, corrections_info = raw_text, None
+        if correct:
+            with cancellable(cancel):
+                corrected_text, corrections_info = self._correct_text(raw_text, language)
+        snaps = None
+        if vocabulary:
+            corrected_text, snaps = vocabulary.snap(corrected_text)
+        data = self._transcription_data(
+            language or 'unknown', raw_text, corrected_text, raw_segments, corrected_segments,
+            self._calculate_confidence({'segments': whisper_segments}), corrections_info
+        )
+        if snaps is not None:
+            data['vocabulary_snaps'] = snaps
+        if save:
+            self._save_transcript(data)
+        return data
+    
+    def _decode_options(self, word_timestamps, decoding):
+        """Keyword arguments for model.transcribe()."""
+        options = dict(decoding or {})
+        if word_timestamps:
+            options['word_timestamps'] = True
+        return options
+    
+    def batches(self, word_timestamps=False, vocabulary=None, decoding=None):
+        """Whether transcribe_audio() with these options goes through the window batcher."""
+        return self._batchable(self._decode_options(word_timestamps, decoding), vocabulary)
+    
+    def _batchable(self, options, vocabulary, prompt=None):
+        """Whether a decode can go through the window batcher (see batched_decoding.py)."""
+        return (batched_decoding.batched_decoding_enabled() and not vocabulary
+                and batched_decoding.supports(options, prompt))
+    
+    def _batcher(self, model_size):
+        """Window batcher of a model size (the transcriber's own by default)."""
+        return batched_decoding.get_batcher(model_size or self.model_size)
+    
+    def _model_for(self, model_size):
+        """Model and inference lock for a size (the transcriber's own by default)."""
+        if not model_size or model_size == self.model_size:
+            return self.model, self._inference_lock
+        registry = get_registry()
+        return registry.get(model_size), registry.inference_lock(model_size)
+    
+    def _biasing(self, vocabulary):
+        """Vocabulary prompt biasing for this thread's decodes (no-op without a vocabulary)."""
+        return vocabulary.biasing() if vocabulary else contextlib.nullcontext()
+    
+    def _segment_dict(self, seg, shift=0.0):
+        """Keep the fields of a Whisper segment the API returns, offset by shift seconds."""
+        segment = {
+            'start': round(seg['start'] + shift, 3),
+            'end': round(seg['end'] + shift, 3),
+            'text': seg['text'].strip()
+        }
+        if 'words' in seg:
+            segment['words'] = [
+                {
+                    'word': word['word'].strip(),
+                    'start': round(float(word['start']) + shift, 3),
+                    'end': round(float(word['end']) + shift, 3),
+                    'probability': round(float(word['probability']), 3)
+                }
+                for word in seg['words']
+            ]
+        return segment
+    
+    def _correct_text(self, raw_text, language):
+        """
+        Apply NLP correction to a transcript.
+        
+        Returns:
+            tuple: (corrected text, corrections info or None)
+        """
         corrected_text = raw_text
         corrections_info = None
         
-        if self.enable_nlp_correction and self.nlp_corrector:
+        if self.enable_nlp_correction and self.nlp_correctors:
             print("Applying NLP corrections...")
             try:
-                correction_result = self.nlp_corrector.correct_text(raw_text, detected_lang)
+                correction_result = self.nlp_correctors.correct_text(raw_text, language)
                 corrected_text = correction_result['corrected_text']
                 corrections_info = {
                     'corrections_made': correction_result['corrections_made'],
                     'filler_words_removed': correction_result['filler_words_removed']
                 }
                 print(f"✓ Applied {correction_result['corrections_made']} corrections")
+            except TranscriptionCancelled:
+                raise
             except Exception as e:
                 print(f"⚠️  NLP correction failed: {e}")
                 corrected_text = raw_text
         
-        # Process segments
-        raw_segments = [
-            {
-                'start': seg['start'],
-                'end': seg['end'],
-                'text': seg['text'].strip()
-            }
-            for seg in result.get('segments', [])
-        ]
-        
-        # Apply correction to segments if enabled
-        corrected_segments = raw_segments
-        if self.enable_nlp_correction and self.nlp_corrector:
+        return corrected_text, corrections_info
+    
+    def _correct_segments(self, raw_segments, language):
+        """Apply NLP correction to segments (unchanged if correction is off or fails)."""
+        if self.enable_nlp_correction and self.nlp_correctors:
             try:
-                corrected_segments = self.nlp_corrector.correct_segments(raw_segments, detected_lang)
+                return self.nlp_correctors.correct_segments(raw_segments, language)
+            except TranscriptionCancelled:
+                raise
             except Exception as e:
                 print(f"⚠️  Segment correction failed: {e}")
-        
-        # Build response
-        transcription_data = {
-            'language': detected_lang,
-            'language_name': language_name,
+        return raw_segments
+    
+    def _transcription_data(self, language, raw_text, corrected_text, raw_segments,
+                            corrected_segments, confidence, corrections_info):
+        """Build the transcription data dict."""
+        return {
+            'language': language,
+            'language_name': self.SUPPORTED_LANGUAGES.get(language, 'Unknown'),
             'raw_text': raw_text,
             'corrected_text': corrected_text,
             'text': corrected_text,  # For backward compatibility
             'raw_segments': raw_segments,
             'corrected_segments': corrected_segments,
             'segments': corrected_segments,  # For backward compatibility
-            'confidence': self._calculate_confidence(result),
+            'confidence': confidence,
             'nlp_corrections': corrections_info
         }
-        
-        # Save transcript to file
-        self._save_transcript(transcription_data)
-        
-        print(f"Transcription complete. Detected language: {language_name} ({detected_lang})")
-        return transcription_data
     
     def _calculate_confidence(self, result):
         """Calculate average confidence from segments."""
@@ -184,7 +589,12 @@ class MultilingualTranscriber:
         return round(total_confidence / len(segments), 2)
     
     def _save_transcript(self, data):
-        """Save transcript to file."""
+        """
+        Save transcript to file and index it (sets data['transcript_id']).
+        
+        Returns:
+            str: Path of the text transcript (the JSON sits next to it)
+        """
         output_dir = 'output'
         os.makedirs(output_dir, exist_ok=True)
         
@@ -192,8 +602,19 @@ class MultilingualTranscriber:
         filename = f"transcript_{data['language']}_{timestamp}.txt"
         filepath = os.path.join(output_dir, filename)
         
+        # Several transcripts can finish within the same second (batch jobs),
+        # so claim the name exclusively and add a counter on collision
+        suffix = 1
+        while True:
+            try:
+                f = open(filepath, 'x', encoding='utf-8')
+                break
+            except FileExistsError:
+                filepath = os.path.join(output_dir, f"transcript_{data['language']}_{timestamp}_{suffix}.txt")
+                suffix += 1
+        
         # Save text transcript
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with f:
             f.write(f"Language: {data['language_name']} ({data['language']})\n")
             f.write(f"Confidence: {data['confidence']}\n")
             f.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
@@ -204,13 +625,23 @@ class MultilingualTranscriber:
             for seg in data['segments']:
                 f.write(f"[{seg['start']:.2f}s - {seg['end']:.2f}s] {seg['text']}\n")
         
-        # Save JSON version
+        # Save JSON version (without the backward-compatibility aliases
+        # 'text' and 'segments', which repeat corrected_text/corrected_segments)
         json_filepath = filepath.replace('.txt', '.json')
+        saved = {key: value for key, value in data.items() if key not in ('text', 'segments')}
         with open(json_filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            json.dump(saved, f, ensure_ascii=False, indent=2)
         
         print(f"Transcript saved: {filepath}")
         print(f"JSON data saved: {json_filepath}")
+        
+        # Index it for search; the files are kept even if indexing fails
+        # (transcript_store.py backfill picks them up later)
+        try:
+            data['transcript_id'] = get_transcript_store().add(saved, filepath)
+        except Exception as e:
+            print(f"⚠️  Transcript indexing failed: {e}")
+        return filepath
     
     def _get_language_name(self, lang_code):
         """Get full language name from code."""
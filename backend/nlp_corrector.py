@@ -1,10 +1,126 @@
 """
 NLP-based text correction module for improving transcription quality.
 Handles grammar correction, sentence normalization, and filler word removal.
+
+Capitalization and spacing rules are compiled once per script (Latin,
+Devanagari, Arabic, CJK) and filler patterns once per language; every
+corrector shares them. CorrectorManager keeps one corrector, with its own
+LanguageTool server, per language in use and closes the least recently used
+ones when there are too many or their servers take too much memory.
 """
+import collections
+import contextlib
+import os
 import re
+import threading
 import language_tool_python
 from typing import Dict, List
+from cancellation import checkpoint
+from admission import resident_memory_mb
+from metrics import get_metrics
+
+
+# Common filler words to remove, per language
+FILLER_WORDS = {
+    'en': ['uh', 'um', 'hmm', 'hm', 'er', 'ah', 'like', 'you know', 'basically', 'actually'],
+    'es': ['eh', 'este', 'pues', 'bueno', 'entonces'],
+    'fr': ['euh', 'ben', 'quoi', 'genre'],
+    'de': ['äh', 'ähm', 'also', 'ja'],
+    'it': ['ehm', 'uhm', 'mah'],
+    'pt': ['hum', 'hã', 'né', 'tipo'],
+    'nl': ['eh', 'ehm', 'uhm', 'nou'],
+    'ru': ['э', 'эм', 'ну', 'типа', 'короче'],
+    'hi': ['हम्म', 'उम्म', 'मतलब'],
+    'ja': ['えーと', 'えっと', 'あのー', 'えー'],
+    'zh': ['嗯', '呃'],
+}
+
+# Languages LanguageTool checks, with the variant to use where it needs one
+# (the bare code would skip the spelling rules)
+LANGUAGETOOL_CODES = {
+    'ar': 'ar', 'ast': 'ast', 'be': 'be', 'br': 'br', 'ca': 'ca-ES', 'da': 'da', 'de': 'de-DE',
+    'el': 'el', 'en': 'en-US', 'eo': 'eo', 'es': 'es', 'fa': 'fa', 'fr': 'fr', 'ga': 'ga',
+    'gl': 'gl', 'it': 'it', 'ja': 'ja-JP', 'km': 'km', 'nl': 'nl', 'pl': 'pl', 'pt': 'pt-BR',
+    'ro': 'ro', 'ru': 'ru', 'sk': 'sk', 'sl': 'sl', 'sv': 'sv', 'ta': 'ta', 'tl': 'tl',
+    'uk': 'uk', 'zh': 'zh-CN',
+}
+
+# Script of each language whose punctuation isn't Latin (the rest use Latin rules)
+LANGUAGE_SCRIPTS = {
+    'hi': 'devanagari', 'mr': 'devanagari', 'ne': 'devanagari', 'sa': 'devanagari',
+    'ar': 'arabic', 'fa': 'arabic', 'ur': 'arabic', 'ps': 'arabic', 'sd': 'arabic',
+    'zh': 'cjk', 'ja': 'cjk', 'yue': 'cjk',
+}
+
+
+def base_language(language):
+    """'en-US' -> 'en'."""
+    return (language or 'en').split('-')[0].lower()
+
+
+class ScriptRules:
+    """Capitalization and spacing rules for one script, compiled once."""
+
+    def __init__(self, name, sentence_end, marks, full_stop='.', cased=True, spaced=True):
+        """
+        Args:
+            name (str): Script name
+            sentence_end (str): Characters that end a sentence
+            marks (str): All punctuation that attaches to the preceding word
+            full_stop (str): Appended to text that ends without sentence_end
+            cased (bool): Whether sentences start with a capital letter
+            spaced (bool): Whether words (and punctuation) are separated by spaces
+        """
+        self.name = name
+        self.sentence_end = sentence_end
+        self.full_stop = full_stop
+        self.cased = cased
+        self.spaced = spaced
+        pauses = re.escape(''.join(mark for mark in marks if mark not in sentence_end))
+        end, marks = re.escape(sentence_end), re.escape(marks)
+        self.sentence_split = re.compile(rf'([{end}]+\s*)')
+        self.sentence_mark = re.compile(rf'[{end}]+\s*')
+        self.space_before = re.compile(rf'\s+([{marks}])')
+        # Spaced scripts get a space after punctuation followed by a letter;
+        # CJK has no spaces, so any after its punctuation are dropped
+        self.space_after = re.compile(rf'([{marks}])(?=[^\W\d_])') if spaced else re.compile(rf'([{marks}])\s+')
+        self.space_after_repl = r'\1 ' if spaced else r'\1'
+        self.repeated_end = re.compile(rf'([{end}]){{2,}}')
+        # Commas left behind by a removed filler: at the start, or before another mark
+        self.stray_pause = re.compile(rf'^[{pauses}\s]+|[{pauses}]+(?=[{marks}]|$)')
+
+
+SCRIPT_RULES = {
+    'latin': ScriptRules('latin', '.!?', ',.!?;:'),
+    'devanagari': ScriptRules('devanagari', '।॥.!?', ',.!?;:।॥', full_stop='।', cased=False),
+    'arabic': ScriptRules('arabic', '.!?؟', ',.!?;:،؛؟', cased=False),
+    'cjk': ScriptRules('cjk', '。！？.!?', '，。！？；：、,.!?;:', full_stop='。', cased=False, spaced=False),
+}
+
+
+def script_rules(language):
+    """Get the shared ScriptRules for a language."""
+    return SCRIPT_RULES[LANGUAGE_SCRIPTS.get(base_language(language), 'latin')]
+
+
+def _filler_pattern(words, spaced=True):
+    # One alternation, longest first so 'you know' wins over a shorter prefix
+    alternation = '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+    if not spaced:
+        # Unspaced scripts have no word boundaries: a filler sits between other characters
+        return re.compile(alternation, re.IGNORECASE)
+    return re.compile(rf'(?<!\w)(?:{alternation})(?!\w)', re.IGNORECASE)
+
+
+FILLER_PATTERNS = {
+    language: _filler_pattern(words, script_rules(language).spaced)
+    for language, words in FILLER_WORDS.items()
+}
+
+_WHITESPACE = re.compile(r'\s+')
+_DOUBLE_QUOTE = re.compile(r'\s*"\s*')
+_SINGLE_QUOTE = re.compile(r"\s*'\s*")
+_ENGLISH_I = [(re.compile(rf"\bi'{suffix}\b", re.IGNORECASE), f"I'{suffix}") for suffix in ('m', 'll', 've')]
 
 
 class NLPCorrector:
@@ -13,30 +129,46 @@ class NLPCorrector:
     Uses LanguageTool for grammar correction and custom rules for speech-specific issues.
     """
     
-    def __init__(self, language='en-US'):
+    def __init__(self, language='en-US', grammar=True):
         """
         Initialize the NLP corrector.
         
         Args:
             language (str): Language code for correction (default: 'en-US')
+            grammar (bool): Start LanguageTool for grammar correction (if it
+                supports the language)
         """
         self.language = language
+        self.tool = None
+        self.owner_pid = os.getpid()  # the process that started the server
+        self.filler_words = FILLER_WORDS
         print(f"Initializing NLP corrector for language: {language}")
-        try:
-            self.tool = language_tool_python.LanguageTool(language)
-            print("✓ LanguageTool loaded successfully")
-        except Exception as e:
-            print(f"⚠️  LanguageTool initialization warning: {e}")
-            print("   Correction will use basic rules only")
+        if grammar and base_language(language) in LANGUAGETOOL_CODES:
+            try:
+                self.tool = language_tool_python.LanguageTool(language)
+                print("✓ LanguageTool loaded successfully")
+            except Exception as e:
+                print(f"⚠️  LanguageTool initialization warning: {e}")
+                print("   Correction will use basic rules only")
+        elif grammar:
+            print(f"   No LanguageTool rules for {language}, correction will use basic rules only")
+    
+    def server_pid(self):
+        """Get the process ID of this corrector's LanguageTool server (None if it has none)."""
+        server = getattr(self.tool, '_server', None)
+        return server.pid if server is not None and server.poll() is None else None
+    
+    def close(self):
+        """
+        Stop the LanguageTool server (only in the process that started it: a
+        forked worker leaves a server it inherited to its parent).
+        """
+        if self.tool and os.getpid() == self.owner_pid:
+            try:
+                self.tool.close()
+            except Exception as e:
+                print(f"⚠️  LanguageTool shutdown warning: {e}")
             self.tool = None
-        
-        # Common filler words to remove
-        self.filler_words = {
-            'en': ['uh', 'um', 'hmm', 'hm', 'er', 'ah', 'like', 'you know', 'basically', 'actually'],
-            'es': ['eh', 'este', 'pues', 'bueno', 'entonces'],
-            'fr': ['euh', 'ben', 'quoi', 'genre'],
-            'de': ['äh', 'ähm', 'also', 'ja'],
-        }
     
     def correct_text(self, text: str, source_language: str = 'en') -> Dict:
         """
@@ -62,6 +194,9 @@ class NLPCorrector:
                 'filler_words_removed': []
             }
         
+        # Stop here if the request this text belongs to was cancelled
+        checkpoint()
+        
         corrections_log = []
         removed_fillers = []
         
@@ -70,24 +205,26 @@ class NLPCorrector:
         if removed_fillers:
             corrections_log.append(f"Removed {len(removed_fillers)} filler words")
         
+        rules = script_rules(source_language)
+        
         # Step 2: Fix capitalization
-        capitalized_text = self._fix_capitalization(cleaned_text)
+        capitalized_text = self._fix_capitalization(cleaned_text, rules)
         if capitalized_text != cleaned_text:
             corrections_log.append("Fixed capitalization")
         
         # Step 3: Fix spacing and punctuation
-        spaced_text = self._fix_spacing(capitalized_text)
+        spaced_text = self._fix_spacing(capitalized_text, rules)
         if spaced_text != capitalized_text:
             corrections_log.append("Fixed spacing")
         
-        # Step 4: Grammar correction (if LanguageTool is available)
-        if self.tool and source_language.startswith('en'):
+        # Step 4: Grammar correction (if LanguageTool is available for this language)
+        if self.tool and base_language(source_language) == base_language(self.language):
             corrected_text = self._apply_grammar_correction(spaced_text, corrections_log)
         else:
             corrected_text = spaced_text
         
         # Step 5: Final cleanup
-        final_text = self._final_cleanup(corrected_text)
+        final_text = self._final_cleanup(corrected_text, rules, source_language)
         
         return {
             'raw_text': text,
@@ -97,35 +234,34 @@ class NLPCorrector:
         }
     
     def _remove_filler_words(self, text: str, language: str) -> tuple:
-        """Remove filler words based on language."""
-        # Get filler words for the language (default to English)
-        lang_code = language.split('-')[0] if '-' in language else language
-        fillers = self.filler_words.get(lang_code, self.filler_words['en'])
-        
-        removed = []
-        result = text
-        
-        for filler in fillers:
-            # Create pattern: match filler as whole word, case-insensitive
-            pattern = r'\b' + re.escape(filler) + r'\b'
-            matches = re.findall(pattern, result, re.IGNORECASE)
-            if matches:
-                removed.extend(matches)
-                result = re.sub(pattern, '', result, flags=re.IGNORECASE)
+        """Remove filler words based on language (languages without a list keep theirs)."""
+        pattern = FILLER_PATTERNS.get(base_language(language))
+        if pattern is None:
+            return text, []
+        
+        # Match fillers as whole words, case-insensitive
+        removed = pattern.findall(text)
+        result = pattern.sub('', text) if removed else text
         
-        # Clean up extra spaces created by removal
-        result = re.sub(r'\s+', ' ', result).strip()
+        # Clean up extra spaces (and, without spaces, punctuation) created by removal
+        rules = script_rules(language)
+        if removed and not rules.spaced:
+            result = rules.stray_pause.sub('', result)
+        result = _WHITESPACE.sub(' ', result).strip()
         
         return result, removed
     
-    def _fix_capitalization(self, text: str) -> str:
+    def _fix_capitalization(self, text: str, rules: ScriptRules = SCRIPT_RULES['latin']) -> str:
         """Fix sentence capitalization."""
+        if not rules.cased:
+            return text
+        
         # Split into sentences
-        sentences = re.split(r'([.!?]+\s*)', text)
+        sentences = rules.sentence_split.split(text)
         
         fixed_sentences = []
         for i, sentence in enumerate(sentences):
-            if sentence.strip() and not re.match(r'[.!?]+\s*', sentence):
+            if sentence.strip() and not rules.sentence_mark.match(sentence):
                 # Capitalize first letter of sentence
                 sentence = sentence.strip()
                 if sentence:
@@ -142,20 +278,20 @@ class NLPCorrector:
         
         return result
     
-    def _fix_spacing(self, text: str) -> str:
+    def _fix_spacing(self, text: str, rules: ScriptRules = SCRIPT_RULES['latin']) -> str:
         """Fix spacing around punctuation."""
         # Remove spaces before punctuation
-        text = re.sub(r'\s+([,.!?;:])', r'\1', text)
+        text = rules.space_before.sub(r'\1', text)
         
-        # Add space after punctuation if missing
-        text = re.sub(r'([,.!?;:])([A-Za-z])', r'\1 \2', text)
+        # Add space after punctuation if missing (or, in CJK, drop it)
+        text = rules.space_after.sub(rules.space_after_repl, text)
         
         # Fix multiple spaces
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE.sub(' ', text)
         
         # Fix quotes
-        text = re.sub(r'\s*"\s*', '"', text)
-        text = re.sub(r'\s*\'\s*', "'", text)
+        text = _DOUBLE_QUOTE.sub('"', text)
+        text = _SINGLE_QUOTE.sub("'", text)
         
         return text.strip()
     
@@ -183,20 +319,21 @@ class NLPCorrector:
             print(f"⚠️  Grammar correction error: {e}")
             return text
     
-    def _final_cleanup(self, text: str) -> str:
+    def _final_cleanup(self, text: str, rules: ScriptRules = SCRIPT_RULES['latin'],
+                       language: str = 'en') -> str:
         """Final cleanup and normalization."""
         # Remove multiple punctuation marks
-        text = re.sub(r'([.!?]){2,}', r'\1', text)
+        text = rules.repeated_end.sub(r'\1', text)
         
         # Fix common transcription errors
-        text = text.replace(' i ', ' I ')  # Fix lowercase 'i'
-        text = re.sub(r"\bi'm\b", "I'm", text, flags=re.IGNORECASE)
-        text = re.sub(r"\bi'll\b", "I'll", text, flags=re.IGNORECASE)
-        text = re.sub(r"\bi've\b", "I've", text, flags=re.IGNORECASE)
+        if base_language(language) == 'en':
+            text = text.replace(' i ', ' I ')  # Fix lowercase 'i'
+            for pattern, replacement in _ENGLISH_I:
+                text = pattern.sub(replacement, text)
         
         # Ensure sentence ends with punctuation
-        if text and not text[-1] in '.!?':
-            text += '.'
+        if text and not text[-1] in rules.sentence_end:
+            text += rules.full_stop
         
         return text.strip()
     
@@ -227,6 +364,159 @@ class NLPCorrector:
         return corrected_segments
 
 
+def _env_number(name, default, cast=int):
+    """Read a positive number from the environment."""
+    try:
+        value = cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+class CorrectorManager:
+    """
+    Per-language NLP correctors, created on first use.
+
+    Each language with LanguageTool rules gets its own corrector and server,
+    so requests in different languages are checked concurrently; the rest
+    get a rules-only corrector, which costs nothing to keep. Correctors with
+    a server are closed least recently used first once more than
+    max_languages are open or their servers use more than max_memory_mb.
+    """
+
+    def __init__(self, max_languages=None, max_memory_mb=None):
+        """
+        Args:
+            max_languages (int): LanguageTool servers kept running at once
+                (NLP_MAX_LANGUAGES, default: 3)
+            max_memory_mb (float): Memory the servers may use together before
+                the least recently used are closed (NLP_MAX_MEMORY_MB,
+                default: no memory check)
+        """
+        self.max_languages = max_languages or _env_number('NLP_MAX_LANGUAGES', 3)
+        self.max_memory_mb = max_memory_mb or _env_number('NLP_MAX_MEMORY_MB', 0.0, float) or None
+        self._correctors = collections.OrderedDict()  # language -> NLPCorrector, least recently used first
+        self._in_use = collections.Counter()  # id(corrector) -> requests using it
+        self._retired = {}  # id(corrector) -> evicted corrector still in use
+        self._creating = {}  # language -> lock held while its corrector is created
+        self._lock = threading.Lock()
+        self._metrics = get_metrics()
+
+    def _server_memory_mb(self):
+        """Resident memory of the running LanguageTool servers (the lock is held)."""
+        total = 0.0
+        for corrector in self._correctors.values():
+            pid = corrector.server_pid()
+            total += (resident_memory_mb(pid) or 0.0) if pid else 0.0
+        return total
+
+    def _evict(self, keep):
+        """Close least recently used servers until within the limits (the lock is held)."""
+        while True:
+            servers = [language for language, corrector in self._correctors.items()
+                       if corrector.tool and language != keep]
+            over_count = len(servers) + 1 > self.max_languages
+            over_memory = self.max_memory_mb and self._server_memory_mb() > self.max_memory_mb
+            if not servers or not (over_count or over_memory):
+                return
+            corrector = self._correctors.pop(servers[0])
+            self._metrics.increment('nlp.evictions')
+            print(f"NLP corrector for {servers[0]} evicted ({'memory' if over_memory else 'languages'} limit)")
+            if self._in_use[id(corrector)]:
+                # Closed by the last request still using it
+                self._retired[id(corrector)] = corrector
+            else:
+                corrector.close()
+
+    def _use(self, language, corrector):
+        """Mark a corrector used and in use (the lock is held)."""
+        self._correctors.move_to_end(language)
+        self._in_use[id(corrector)] += 1
+        if corrector.tool:
+            self._evict(keep=language)
+
+    @contextlib.contextmanager
+    def acquire(self, language):
+        """
+        Use the corrector for a language.
+
+        Args:
+            language (str): Language code ('en', 'es', ...)
+
+        Yields:
+            NLPCorrector: Corrector (not closed while in use, even if evicted)
+        """
+        language = base_language(language)
+        with self._lock:
+            creating = self._creating.setdefault(language, threading.Lock())
+        # Starting a server takes seconds; only requests in the same language wait for it
+        with creating:
+            with self._lock:
+                corrector = self._correctors.get(language)
+                if corrector is not None:
+                    self._use(language, corrector)
+            if corrector is None:
+                corrector = NLPCorrector(LANGUAGETOOL_CODES.get(language, language))
+                with self._lock:
+                    self._correctors[language] = corrector
+                    self._metrics.increment('nlp.correctors_created')
+                    self._use(language, corrector)
+        try:
+            yield corrector
+        finally:
+            with self._lock:
+                self._in_use[id(corrector)] -= 1
+                if not self._in_use[id(corrector)]:
+                    del self._in_use[id(corrector)]
+                    retired = self._retired.pop(id(corrector), None)
+                    if retired is not None:
+                        retired.close()
+
+    def correct_text(self, text, language):
+        """Correct text with its language's corrector (see NLPCorrector.correct_text())."""
+        with self.acquire(language) as corrector:
+            return corrector.correct_text(text, language)
+
+    def correct_segments(self, segments, language):
+        """Correct segments with their language's corrector (see NLPCorrector.correct_segments())."""
+        with self.acquire(language) as corrector:
+            return corrector.correct_segments(segments, language)
+
+    def close(self):
+        """Stop every LanguageTool server."""
+        with self._lock:
+            correctors = list(self._correctors.values()) + list(self._retired.values())
+            self._correctors.clear()
+            self._retired.clear()
+        for corrector in correctors:
+            corrector.close()
+
+    def status(self):
+        """Languages with a corrector, which of them have a LanguageTool server, and its memory."""
+        with self._lock:
+            return {
+                'languages': list(self._correctors),
+                'grammar_languages': [language for language, corrector in self._correctors.items()
+                                      if corrector.tool],
+                'max_languages': self.max_languages,
+                'max_memory_mb': self.max_memory_mb,
+                'server_memory_mb': round(self._server_memory_mb(), 1)
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_corrector_manager():
+    """Get the process-wide CorrectorManager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = CorrectorManager()
+        return _manager
+
+
 # Convenience function for quick correction
 def correct_transcript(text: str, language: str = 'en') -> str:
     """
@@ -239,7 +529,7 @@ def correct_transcript(text: str, language: str = 'en') -> str:
     Returns:
         str: Corrected text
     """
-    corrector = NLPCorrector(language=language if '-' in language else f'{language}-US')
+    corrector = NLPCorrector(language=LANGUAGETOOL_CODES.get(base_language(language), language))
     result = corrector.correct_text(text, language)
     return result['corrected_text']
 
@@ -1,39 +1,246 @@
 """
 Audio preprocessing module using ffmpeg-python.
-Converts any input audio to 16kHz mono WAV format.
+Converts any input audio to 16kHz mono WAV format. Input that is already
+16kHz mono 16-bit PCM (WAV or headerless .pcm/.raw) is handled in-process
+with NumPy instead of spawning FFmpeg.
 """
 import os
 import sys
-import shutil
+import struct
+import wave
+import numpy as np
 import ffmpeg
+from decoder_service import get_decoder_service, DecoderError, DecoderBusyError
+
+
+# Format Whisper consumes
+TARGET_SAMPLE_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_WIDTH = 2  # bytes (16-bit)
+
+# Headerless uploads, taken to be 16kHz mono signed 16-bit little-endian PCM
+RAW_PCM_EXTENSIONS = {'pcm', 'raw'}
+
+# Every input format the API and batch tools accept
+AUDIO_EXTENSIONS = {'mp3', 'wav', 'webm', 'ogg', 'm4a', 'flac', 'aac', 'wma'} | RAW_PCM_EXTENSIONS
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def parse_wav_header(header):
+    """
+    Parse a RIFF/WAVE header far enough to locate the sample data.
+
+    Args:
+        header (bytes): Leading bytes of the file (must cover the 'data' chunk header)
+
+    Returns:
+        dict: {'format', 'channels', 'sample_rate', 'bits', 'data_offset', 'data_size'},
+              or None if the bytes are not a complete WAV header
+    """
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id = header[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', header, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            if body + 16 > len(header):
+                return None
+            audio_format, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', header, body)
+            if audio_format == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40 and body + 26 <= len(header):
+                # Sub-format GUID starts with the actual format code
+                audio_format = struct.unpack_from('<H', header, body + 24)[0]
+            fmt = {'format': audio_format, 'channels': channels, 'sample_rate': sample_rate, 'bits': bits}
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            return dict(fmt, data_offset=body, data_size=chunk_size)
+        # Chunks are padded to an even size
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def is_target_pcm(wav_info):
+    """Check whether parsed WAV parameters already match Whisper's input format."""
+    return (
+        wav_info is not None
+        and wav_info['format'] == WAVE_FORMAT_PCM
+        and wav_info['channels'] == TARGET_CHANNELS
+        and wav_info['sample_rate'] == TARGET_SAMPLE_RATE
+        and wav_info['bits'] == TARGET_SAMPLE_WIDTH * 8
+    )
+
+
+def probe_native_format(path, header_bytes=65536):
+    """
+    Check whether a file can be decoded in-process without FFmpeg.
+
+    Args:
+        path (str): Path to audio file
+        header_bytes (int): How much of the file to read looking for the header
+
+    Returns:
+        tuple: ('wav', data_offset, sample_count) for a compliant WAV,
+               ('raw', 0, sample_count) for a .pcm/.raw file, or None
+    """
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in os.path.basename(path) else ''
+    file_size = os.path.getsize(path)
+
+    if extension in RAW_PCM_EXTENSIONS:
+        return ('raw', 0, file_size // TARGET_SAMPLE_WIDTH)
+
+    with open(path, 'rb') as f:
+        header = f.read(header_bytes)
+    wav_info = parse_wav_header(header)
+    if not is_target_pcm(wav_info):
+        return None
+
+    # Streamed WAVs often carry a placeholder data size; trust the file length
+    data_size = min(wav_info['data_size'], file_size - wav_info['data_offset'])
+    return ('wav', wav_info['data_offset'], data_size // TARGET_SAMPLE_WIDTH)
+
+
+def audio_duration(path):
+    """
+    Get the duration of an audio file in seconds.
+
+    Reads only the header for compliant WAV and raw PCM files; anything
+    else is decoded with load_audio().
+
+    Args:
+        path (str): Path to audio file
+
+    Returns:
+        float: Duration in seconds
+    """
+    native = probe_native_format(path)
+    sample_count = native[2] if native else len(load_audio(path))
+    return round(sample_count / TARGET_SAMPLE_RATE, 2)
+
+
+def pcm16_to_float32(samples):
+    """
+    Scale 16-bit PCM samples to float32 in [-1, 1) with a single allocation.
+
+    Args:
+        samples (np.ndarray): int16 samples (may be a zero-copy view of raw bytes)
+
+    Returns:
+        np.ndarray: float32 waveform
+    """
+    audio = np.empty(samples.shape[0], dtype=np.float32)
+    np.multiply(samples, np.float32(1.0 / 32768.0), out=audio, casting='unsafe')
+    return audio
+
+
+def load_audio(path):
+    """
+    Load audio as a 16kHz mono float32 waveform, as Whisper expects.
+
+    Compliant WAV and raw PCM files are read in-process; anything else is
+    decoded by FFmpeg (the same conversion whisper.load_audio performs).
+
+    Args:
+        path (str): Path to audio file
+
+    Returns:
+        np.ndarray: float32 waveform
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist
+        RuntimeError: If FFmpeg is needed but fails or is not installed
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Audio file not found: {path}")
+
+    native = probe_native_format(path)
+    if native:
+        _, data_offset, sample_count = native
+        samples = np.fromfile(path, dtype='<i2', count=sample_count, offset=data_offset)
+        return pcm16_to_float32(samples)
+
+    if not check_ffmpeg_installed():
+        raise RuntimeError("FFmpeg is not installed or not in PATH.")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-threads", "0", "-i", path,
+        "-f", "s16le", "-ac", str(TARGET_CHANNELS), "-acodec", "pcm_s16le",
+        "-ar", str(TARGET_SAMPLE_RATE), "-"
+    ]
+    try:
+        out = get_decoder_service().run(cmd)
+    except DecoderBusyError:
+        raise
+    except DecoderError as e:
+        raise RuntimeError(f"Failed to load audio: {e}") from e
+    return pcm16_to_float32(np.frombuffer(out, dtype=np.int16))
+
+
+def write_pcm_wav(output_path, chunks):
+    """
+    Wrap 16kHz mono 16-bit PCM bytes in a WAV container.
+
+    Args:
+        output_path (str): Where to write the WAV file
+        chunks (iterable): Byte strings of raw PCM, written as they arrive
+    """
+    with wave.open(output_path, 'wb') as wav:
+        wav.setnchannels(TARGET_CHANNELS)
+        wav.setsampwidth(TARGET_SAMPLE_WIDTH)
+        wav.setframerate(TARGET_SAMPLE_RATE)
+        for chunk in chunks:
+            wav.writeframesraw(chunk)
 
 
 def check_ffmpeg_installed():
     """
     Check if FFmpeg is installed and available in PATH.
     
+    The PATH lookup happens once, when the decoder service starts.
+    
     Returns:
         bool: True if FFmpeg is found, False otherwise
     """
-    return shutil.which("ffmpeg") is not None
+    return get_decoder_service().ffmpeg_available
 
 
 def preprocess_audio(input_path, output_path="output/clean.wav"):
     """
     Convert input audio file to 16kHz mono WAV format.
     
+    A WAV that is already 16kHz mono 16-bit PCM is returned as-is (no copy,
+    no FFmpeg), and raw .pcm/.raw input is wrapped in a WAV header in-process.
+    
     Args:
         input_path (str): Path to input audio file
         output_path (str): Path to save cleaned audio (default: output/clean.wav)
     
     Returns:
-        str: Path to the cleaned audio file
+        str: Path to the cleaned audio file (input_path if already compliant)
     
     Raises:
         FileNotFoundError: If input file doesn't exist
         RuntimeError: If FFmpeg is not installed
         Exception: If audio conversion fails
     """
+    # Fast path: already in Whisper's format, or headerless PCM in that format
+    if os.path.isfile(input_path):
+        native = probe_native_format(input_path)
+        if native and native[0] == 'wav':
+            print(f"✓ Audio already 16kHz mono PCM, skipping conversion: {input_path}")
+            return input_path
+        if native and native[0] == 'raw':
+            output_dir = os.path.dirname(os.path.abspath(output_path))
+            os.makedirs(output_dir, exist_ok=True)
+            with open(input_path, 'rb') as f:
+                write_pcm_wav(output_path, iter(lambda: f.read(65536), b''))
+            print(f"✓ Raw PCM wrapped as WAV: {output_path}")
+            return os.path.abspath(output_path)
+    
     # Check if FFmpeg is installed
     if not check_ffmpeg_installed():
         raise RuntimeError(
@@ -80,16 +287,18 @@ def preprocess_audio(input_path, output_path="output/clean.wav"):
             ar='16000'            # 16kHz sample rate
         )
         
-        # Overwrite output file if it exists
+        # Overwrite output file if it exists (runs in a bounded decode slot)
         print("Running FFmpeg conversion...")
-        ffmpeg.run(stream, overwrite_output=True, quiet=True)
+        stream = stream.global_args('-hide_banner', '-loglevel', 'error')
+        get_decoder_service().run(ffmpeg.compile(stream, overwrite_output=True))
         
         print(f"✓ Audio preprocessed successfully: {output_path}")
         return output_path
     
-    except ffmpeg.Error as e:
-        error_message = e.stderr.decode() if e.stderr else str(e)
-        raise Exception(f"FFmpeg error during audio preprocessing: {error_message}")
+    except DecoderBusyError:
+        raise
+    except DecoderError as e:
+        raise Exception(f"FFmpeg error during audio preprocessing: {e}")
     except FileNotFoundError as e:
         if "ffmpeg" in str(e).lower():
             raise RuntimeError(
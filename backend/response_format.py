@@ -0,0 +1,157 @@
+"""
+Response encodings for transcription results.
+Besides the default JSON, clients can ask for:
+  - compact: segments as parallel arrays of start/end/text ids plus one table
+    of distinct strings, instead of one object per segment
+  - ndjson: one JSON line per segment as it finishes, then a final summary
+"""
+import json
+
+
+RESPONSE_FORMATS = ('json', 'compact', 'ndjson')
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def parse_flag(value):
+    """
+    Read a boolean form/query value.
+
+    Args:
+        value (str): '1', 'true', 'yes' or 'on' (any case) mean True
+
+    Returns:
+        bool: Parsed flag (False when missing)
+    """
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def requested_format(form, accept_mimetypes=None):
+    """
+    Pick the response format for a request.
+
+    Args:
+        form (dict): Request form fields ('format' selects the encoding)
+        accept_mimetypes: Request Accept header (NDJSON if preferred over JSON)
+
+    Returns:
+        str: One of RESPONSE_FORMATS
+
+    Raises:
+        ValueError: If 'format' names an unknown encoding
+    """
+    response_format = (form.get('format') or '').strip().lower()
+    if response_format:
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError('Invalid format. Allowed formats: ' + ', '.join(RESPONSE_FORMATS))
+        return response_format
+    if accept_mimetypes is not None and accept_mimetypes.best_match(
+            ['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return 'ndjson'
+    return 'json'
+
+
+class _StringTable:
+    """Assigns each distinct string an id, in first-seen order."""
+
+    def __init__(self):
+        self.strings = []
+        self._ids = {}
+
+    def id_for(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+
+def compact_segments(segments):
+    """
+    Encode segments as parallel arrays.
+
+    Args:
+        segments (list): Segment dicts with 'start', 'end', 'text' and
+            optionally 'raw_text', 'speaker' and 'words'
+
+    Returns:
+        dict: {
+            'strings': distinct texts (segment texts, raw texts and words),
+            'segments': {'start': [...], 'end': [...], 'text_id': [...]}
+                plus 'raw_text_id' when any raw text differs from the text
+                and 'speaker_id' when segments are labelled with speakers,
+            'words': {'segment': [...], 'start': [...], 'end': [...],
+                'text_id': [...], 'probability': [...]} when words are present
+        }
+    """
+    table = _StringTable()
+    columns = {'start': [], 'end': [], 'text_id': []}
+    raw_text_ids = []
+    speaker_ids = []
+    words = None
+
+    for index, segment in enumerate(segments):
+        columns['start'].append(round(segment['start'], 3))
+        columns['end'].append(round(segment['end'], 3))
+        columns['text_id'].append(table.id_for(segment['text']))
+        raw_text_ids.append(table.id_for(segment.get('raw_text', segment['text'])))
+        if 'speaker' in segment:
+            speaker_ids.append(table.id_for(segment['speaker']))
+
+        if 'words' in segment:
+            if words is None:
+                words = {'segment': [], 'start': [], 'end': [], 'text_id': [], 'probability': []}
+            for word in segment['words']:
+                words['segment'].append(index)
+                words['start'].append(round(word['start'], 3))
+                words['end'].append(round(word['end'], 3))
+                words['text_id'].append(table.id_for(word['word']))
+                words['probability'].append(word['probability'])
+
+    if raw_text_ids != columns['text_id']:
+        columns['raw_text_id'] = raw_text_ids
+    if speaker_ids:
+        columns['speaker_id'] = speaker_ids
+
+    compact = {'strings': table.strings, 'segments': columns}
+    if words is not None:
+        compact['words'] = words
+    return compact
+
+
+def compact_transcription(data):
+    """
+    Encode transcription data from MultilingualTranscriber compactly.
+
+    Drops the duplicated fields of the JSON format (raw/corrected/text
+    copies and raw_segments) and encodes the corrected segments with
+    compact_segments().
+
+    Args:
+        data (dict): Transcription data
+
+    Returns:
+        dict: Compact response body
+    """
+    body = {
+        'success': True,
+        'format': 'compact',
+        'language': data['language'],
+        'language_name': data['language_name'],
+        'text': data['corrected_text'],
+        'confidence': data['confidence'],
+        'transcript_id': data.get('transcript_id')
+    }
+    if data['raw_text'] != data['corrected_text']:
+        body['raw_text'] = data['raw_text']
+    if data.get('speakers') is not None:
+        body['speakers'] = data['speakers']
+    if data.get('vocabulary_snaps'):
+        body['vocabulary_snaps'] = data['vocabulary_snaps']
+    body.update(compact_segments(data['corrected_segments']))
+    return body
+
+
+def ndjson_line(record):
+    """Serialize one NDJSON record (compact separators, UTF-8 text kept as-is)."""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
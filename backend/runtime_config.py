@@ -0,0 +1,224 @@
+"""
+Runtime parallelism configuration.
+Sizes gunicorn workers and PyTorch thread pools from the available CPU cores
+and the Whisper model size, so several workers don't oversubscribe the CPU.
+"""
+import os
+
+
+DEFAULT_MODEL_SIZE = os.environ.get('WHISPER_MODEL_SIZE', 'base')
+
+# Intra-op threads a single transcription can use before extra threads stop
+# paying off (larger models have wider matmuls that scale further)
+MODEL_THREAD_TARGETS = {
+    'tiny': 2,
+    'base': 2,
+    'small': 4,
+    'medium': 4,
+    'large': 8
+}
+
+# Approximate resident memory of one worker with the model loaded (MB)
+MODEL_MEMORY_MB = {
+    'tiny': 450,
+    'base': 700,
+    'small': 1400,
+    'medium': 3500,
+    'large': 7000
+}
+
+
+def _env_int(name, default=None):
+    """Read a positive integer from the environment, falling back to default."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == '':
+        return default
+    try:
+        parsed = int(value)
+    except ValueError:
+        print(f"⚠️  Ignoring invalid {name}={value!r} (expected an integer)")
+        return default
+    return parsed if parsed > 0 else default
+
+
+def _env_flag(name, default=False):
+    """Read a boolean flag from the environment."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def available_cores():
+    """
+    Get the CPU cores this process may run on.
+
+    Returns:
+        list: Sorted core ids (honours cgroup/taskset affinity where supported)
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class RuntimeConfig:
+    """Worker, thread and core-pinning plan for one deployment."""
+
+    def __init__(self, model_size=DEFAULT_MODEL_SIZE, cores=None):
+        """
+        Plan parallelism for the given model size.
+
+        Environment overrides (all optional):
+            WEB_CONCURRENCY        gunicorn worker processes
+            GUNICORN_THREADS       request threads per worker
+            TORCH_NUM_THREADS      torch intra-op threads per worker
+            TORCH_INTEROP_THREADS  torch inter-op threads per worker
+            MEMORY_LIMIT_MB        cap workers so models fit in memory
+            PIN_WORKERS            pin each worker to its own core set (default on)
+
+        Args:
+            model_size (str): Whisper model size the workers will load
+            cores (list, optional): Core ids to plan for (default: available cores)
+        """
+        self.model_size = model_size
+        self.cores = list(cores) if cores is not None else available_cores()
+        core_count = len(self.cores)
+
+        self.threads = _env_int('GUNICORN_THREADS', 1)
+
+        # Give each worker enough cores for its model, then fill the machine
+        per_worker = min(MODEL_THREAD_TARGETS.get(model_size, 2) * self.threads, core_count)
+        workers = max(1, core_count // max(1, per_worker))
+
+        memory_limit = _env_int('MEMORY_LIMIT_MB')
+        if memory_limit:
+            per_worker_mb = MODEL_MEMORY_MB.get(model_size, MODEL_MEMORY_MB['base'])
+            workers = max(1, min(workers, memory_limit // per_worker_mb))
+
+        self.workers = _env_int('WEB_CONCURRENCY', workers)
+        self.cores_per_worker = max(1, core_count // self.workers)
+        self.intra_op_threads = _env_int(
+            'TORCH_NUM_THREADS',
+            max(1, self.cores_per_worker // self.threads)
+        )
+        self.inter_op_threads = _env_int('TORCH_INTEROP_THREADS', 1)
+
+        # Pinning only makes sense when every worker gets a core of its own
+        self.pin_workers = _env_flag('PIN_WORKERS', True) and core_count >= self.workers > 1
+
+    def core_set(self, slot):
+        """
+        Get the cores assigned to a worker slot.
+
+        Args:
+            slot (int): Worker slot index (0 .. workers - 1)
+
+        Returns:
+            list: Core ids for the slot
+        """
+        slot = slot % self.workers
+        start = slot * self.cores_per_worker
+        return self.cores[start:start + self.cores_per_worker]
+
+    def thread_env(self):
+        """Environment variables that size native thread pools (OpenMP/MKL)."""
+        threads = str(self.intra_op_threads)
+        return {
+            'OMP_NUM_THREADS': threads,
+            'MKL_NUM_THREADS': threads,
+            'OPENBLAS_NUM_THREADS': threads
+        }
+
+    def to_dict(self):
+        """Planned settings as a JSON-serializable dict."""
+        return {
+            'model_size': self.model_size,
+            'cores': len(self.cores),
+            'workers': self.workers,
+            'threads_per_worker': self.threads,
+            'cores_per_worker': self.cores_per_worker,
+            'torch_intra_op_threads': self.intra_op_threads,
+            'torch_inter_op_threads': self.inter_op_threads,
+            'pin_workers': self.pin_workers
+        }
+
+
+def apply_torch_threads(config):
+    """
+    Size the torch thread pools for this process.
+
+    Args:
+        config (RuntimeConfig): Runtime plan
+    """
+    import torch
+
+    torch.set_num_threads(config.intra_op_threads)
+    try:
+        torch.set_num_interop_threads(config.inter_op_threads)
+    except RuntimeError:
+        # Can only be set once per process, before any inter-op work starts
+        pass
+
+
+def pin_worker(config, slot):
+    """
+    Pin the current process to the core set of a worker slot.
+
+    Args:
+        config (RuntimeConfig): Runtime plan
+        slot (int): Worker slot index
+
+    Returns:
+        list: Cores the process is now pinned to (empty if pinning is off)
+    """
+    if not config.pin_workers or not hasattr(os, 'sched_setaffinity'):
+        return []
+    cores = config.core_set(slot)
+    try:
+        os.sched_setaffinity(0, cores)
+    except OSError as e:
+        print(f"⚠️  Could not pin worker to cores {cores}: {e}")
+        return []
+    return cores
+
+
+def effective_settings(config):
+    """
+    Report the settings actually in effect in this process.
+
+    Args:
+        config (RuntimeConfig): Runtime plan
+
+    Returns:
+        dict: Planned settings plus live torch thread counts and core affinity
+    """
+    settings = config.to_dict()
+    settings['pid'] = os.getpid()
+    settings['affinity'] = available_cores()
+    try:
+        import torch
+        settings['torch_intra_op_threads'] = torch.get_num_threads()
+        settings['torch_inter_op_threads'] = torch.get_num_interop_threads()
+    except ImportError:
+        pass
+    return settings
+
+
+# Shared plan for this process (gunicorn config and app import the same one)
+_runtime_config = None
+
+def get_runtime_config():
+    """Get or create the process-wide runtime plan."""
+    global _runtime_config
+    if _runtime_config is None:
+        _runtime_config = RuntimeConfig()
+    return _runtime_config
+
+
+if __name__ == "__main__":
+    # Print the plan for this machine
+    config = get_runtime_config()
+    for key, value in config.to_dict().items():
+        print(f"{key}: {value}")
+    for slot in range(config.workers):
+        print(f"worker {slot}: cores {config.core_set(slot)}")
@@ -0,0 +1,302 @@
+"""
+Staged pipeline executor.
+Runs jobs through a fixed sequence of stages (e.g. decode -> inference ->
+correction -> persistence). Each stage has its own worker threads and a
+bounded queue in front of it, so different jobs occupy different stages at
+the same time and a slow stage pushes back on the ones before it. Each
+queue is ordered by job priority, so an urgent job overtakes queued bulk
+work at every stage.
+
+A stage can also be split into lanes (e.g. one per model): each lane has
+its own queue and workers, so a job never waits behind work that needs a
+different resource. A stage function can also pass its job on to the next
+stage before it returns (pass_on()), so both work on one job at once, e.g.
+one producing a stream of results the other consumes.
+"""
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from metrics import get_metrics
+
+
+class Stage:
+    """One step of a pipeline: a function applied to each job."""
+
+    def __init__(self, name, func, workers=1, queue_size=4, lane=None, skip=None):
+        """
+        Args:
+            name (str): Stage name (used in metrics)
+            func (callable): Takes a job and returns the (updated) job
+            workers (int or callable): Threads running this stage; with lanes,
+                threads per lane (or a function of the lane key returning them)
+            queue_size (int): Jobs allowed to wait in front of this stage (per lane)
+            lane (callable, optional): Maps a job to its lane key; each lane
+                gets its own queue and workers, started on its first job
+            skip (callable, optional): Returns True for a job that has nothing
+                to do here, which then goes straight to the next stage
+        """
+        self.name = name
+        self.func = func
+        self._workers = workers
+        self.queue_size = max(1, queue_size)
+        self.lane = lane
+        self.skip = skip
+
+    def workers_for(self, key):
+        """Threads of one lane (key is None for a stage without lanes)."""
+        workers = self._workers(key) if callable(self._workers) else self._workers
+        return max(1, workers)
+
+
+_STOP = object()
+
+# Default job priority (lower runs first); shutdown markers sort after every job
+DEFAULT_PRIORITY = 10
+_STOP_PRIORITY = float('inf')
+
+
+class _Lane:
+    """Queue and worker count of one stage lane."""
+
+    def __init__(self, key, workers, queue_size):
+        self.key = key
+        self.workers = workers
+        self.queue = queue.PriorityQueue(maxsize=queue_size)
+        self.busy = 0
+        self.exited = 0
+
+
+class StagePipeline:
+    """Thread-per-stage pipeline with bounded queues between stages."""
+
+    def __init__(self, stages, name='pipeline'):
+        """
+        Args:
+            stages (list): Stage objects, in order
+            name (str): Pipeline name (used in metrics)
+        """
+        self.name = name
+        self.stages = stages
+        # Lanes of each stage by key; a stage without lanes has the single lane None
+        self._lanes = [{} for _ in stages]
+        self._sequence = itertools.count()  # FIFO order within a priority
+        self._threads = []
+        self._current = threading.local()  # job a worker thread is running: [index, future, priority, passed on]
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._metrics = get_metrics()
+        for index, stage in enumerate(stages):
+            if stage.lane is None:
+                self._lanes[index][None] = _Lane(None, stage.workers_for(None), stage.queue_size)
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+            lanes = [(index, lane) for index in range(len(self.stages)) for lane in self._lanes[index].values()]
+        for index, lane in lanes:
+            self._start_lane(index, lane)
+        return self
+
+    def _start_lane(self, index, lane):
+        stage = self.stages[index]
+        suffix = f"-{lane.key}" if lane.key is not None else ''
+        for worker in range(lane.workers):
+            thread = threading.Thread(
+                target=self._worker, args=(index, lane),
+                name=f"{self.name}-{stage.name}{suffix}-{worker}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _lane(self, index, job):
+        """The lane of a stage a job goes to (created and started on first use)."""
+        stage = self.stages[index]
+        if stage.lane is None:
+            return self._lanes[index][None]
+        key = stage.lane(job)
+        with self._lock:
+            lane = self._lanes[index].get(key)
+            if lane is not None:
+                return lane
+            lane = self._lanes[index][key] = _Lane(key, stage.workers_for(key), stage.queue_size)
+        self._start_lane(index, lane)
+        return lane
+
+    def submit(self, job, priority=DEFAULT_PRIORITY):
+        """
+        Queue a job at the first stage.
+
+        Blocks while the first stage's queue is full, which is what bounds
+        the amount of work (and memory) in flight.
+
+        Args:
+            job: Anything the first stage's function accepts
+            priority (int): Lower values are taken first at every stage
+                (ties keep submission order)
+
+        Returns:
+            Future: Resolves to the job returned by the last stage, or to the
+                exception raised by whichever stage failed
+        """
+        if self._closed:
+            raise RuntimeError(f"Pipeline '{self.name}' is closed")
+        self.start()
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self._enqueue(0, job, future, priority)
+        return future
+
+    def _enqueue(self, index, job, future, priority):
+        try:
+            while index < len(self.stages) and self.stages[index].skip and self.stages[index].skip(job):
+                self._metrics.increment(f'{self.name}.{self.stages[index].name}.skipped')
+                index += 1
+            if index == len(self.stages):
+                future.set_result(job)
+                return
+            lane = self._lane(index, job)
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        lane.queue.put((priority, next(self._sequence), time.perf_counter(), job, future))
+
+    def _worker(self, index, lane):
+        stage = self.stages[index]
+        inbox = lane.queue
+        last_stage = index + 1 == len(self.stages)
+        gauge = f'{self.name}.{stage.name}' if lane.key is None else f'{self.name}.{stage.name}.{lane.key}'
+
+        while True:
+            priority, _, enqueued, job, future = inbox.get()
+            if job is _STOP:
+                break
+
+            with self._lock:
+                lane.busy += 1
+                busy = lane.busy
+            start = time.perf_counter()
+            self._metrics.set_gauge(f'{gauge}.queued', inbox.qsize())
+            self._metrics.set_gauge(f'{gauge}.busy', busy)
+            self._metrics.record_timing(f'{self.name}.{stage.name}_wait_seconds', start - enqueued)
+            current = self._current.job = [index, future, priority, False]
+            try:
+                job = stage.func(job)
+            except BaseException as e:
+                if current[3]:
+                    # The next stage owns the job's future now
+                    print(f"⚠️  {self.name}.{stage.name} failed after passing its job on: {e}")
+                else:
+                    future.set_exception(e)
+                continue
+            finally:
+                self._current.job = None
+                with self._lock:
+                    lane.busy -= 1
+                    busy = lane.busy
+                self._metrics.set_gauge(f'{gauge}.busy', busy)
+                self._metrics.record_timing(f'{self.name}.{stage.name}_seconds', time.perf_counter() - start)
+
+            if current[3]:
+                continue
+            if last_stage:
+                future.set_result(job)
+            else:
+                self._enqueue(index + 1, job, future, priority)
+
+        # The last worker of a stage to exit passes the shutdown on (every
+        # job has then been handed to the next stage, so its lanes all exist)
+        with self._lock:
+            lane.exited += 1
+            last = all(l.exited == l.workers for l in self._lanes[index].values())
+        if last and not last_stage:
+            self._stop_stage(index + 1)
+
+    def pass_on(self, job):
+        """
+        Send the job a stage function is running on to the next stage now,
+        while the function keeps going. Call it from inside the function;
+        what the function then returns is discarded, and failures have to
+        reach the next stage through the job itself.
+
+        Args:
+            job: The job, as the next stage's function accepts it
+
+        Raises:
+            RuntimeError: If not called from a stage function, or from the last stage
+        """
+        current = getattr(self._current, 'job', None)
+        if current is None or current[3] or current[0] + 1 == len(self.stages):
+            raise RuntimeError('pass_on() needs a stage function with a next stage')
+        index, future, priority, _ = current
+        current[3] = True
+        self._enqueue(index + 1, job, future, priority)
+
+    def close(self, wait=True):
+        """
+        Stop accepting jobs and shut down once queued jobs have finished.
+
+        Args:
+            wait (bool): Block until every worker has exited
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if not self._started:
+            return
+        self._stop_stage(0)
+        if wait:
+            for thread in list(self._threads):
+                thread.join()
+
+    def _stop_stage(self, index):
+        """Send every worker of a stage its shutdown marker (a stage with no lanes yet passes it on)."""
+        with self._lock:
+            lanes = list(self._lanes[index].values())
+        if not lanes and index + 1 < len(self.stages):
+            self._stop_stage(index + 1)
+        for lane in lanes:
+            for _ in range(lane.workers):
+                self._put_stop(lane)
+
+    def _put_stop(self, lane):
+        lane.queue.put((_STOP_PRIORITY, next(self._sequence), 0.0, _STOP, None))
+
+    def queue_depths(self):
+        """Jobs waiting in front of each stage."""
+        with self._lock:
+            lanes = [list(stage_lanes.values()) for stage_lanes in self._lanes]
+        return {
+            stage.name: sum(lane.queue.qsize() for lane in stage_lanes)
+            for stage, stage_lanes in zip(self.stages, lanes)
+        }
+
+    def status(self):
+        """Per-stage workers, busy workers and queue depth (and per lane, for stages with lanes)."""
+        status = {}
+        with self._lock:
+            for stage, stage_lanes in zip(self.stages, self._lanes):
+                lanes = {
+                    str(lane.key): {
+                        'workers': lane.workers,
+                        'busy': lane.busy,
+                        'queued': lane.queue.qsize(),
+                        'queue_size': stage.queue_size
+                    }
+                    for lane in stage_lanes.values()
+                }
+                status[stage.name] = {
+                    'workers': sum(lane['workers'] for lane in lanes.values()),
+                    'busy': sum(lane['busy'] for lane in lanes.values()),
+                    'queued': sum(lane['queued'] for lane in lanes.values()),
+                    'queue_size': stage.queue_size
+                }
+                if stage.lane is not None:
+                    status[stage.name]['lanes'] = lanes
+        return status
@@ -0,0 +1,375 @@
+"""
+Indexed transcript store.
+Every saved transcript is also written to a SQLite database with an FTS5
+index over its segments, so past transcripts can be found by id, language,
+date range or text without opening the files in output/. Text queries
+return the matching segments with their timestamps.
+
+The files stay the source of truth; the database is rebuilt from them with:
+
+    python transcript_store.py backfill [output_dir]
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+
+# Results per query unless the caller asks for fewer
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    language TEXT NOT NULL,
+    language_name TEXT,
+    created_at TEXT NOT NULL,
+    confidence REAL,
+    duration REAL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_created ON transcripts (created_at);
+CREATE INDEX IF NOT EXISTS transcripts_language ON transcripts (language, created_at);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    transcript_id INTEGER NOT NULL REFERENCES transcripts (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    text TEXT NOT NULL,
+    speaker TEXT
+);
+CREATE INDEX IF NOT EXISTS segments_transcript ON segments (transcript_id, position);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5 (
+    text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+# transcript_<lang>_<YYYYmmdd_HHMMSS>[_<n>].json, as written by _save_transcript
+_FILENAME_PATTERN = re.compile(r'^transcript_([A-Za-z-]+)_(\d{8}_\d{6})(?:_\d+)?\.json$')
+_QUERY_TERM = re.compile(r'\w+\*?', re.UNICODE)
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query: every word must appear, a trailing
+    '*' matches a prefix, and any other FTS5 syntax is taken literally.
+
+    Args:
+        query (str): Search text, e.g. 'blood press*'
+
+    Returns:
+        str: FTS5 MATCH expression
+
+    Raises:
+        ValueError: If the query has no words
+    """
+    terms = _QUERY_TERM.findall(query or '')
+    if not terms:
+        raise ValueError('Search query must contain at least one word')
+    return ' '.join(
+        f'"{term[:-1]}"*' if term.endswith('*') else f'"{term}"' for term in terms
+    )
+
+
+def parse_timestamp(value, end_of_day=False):
+    """
+    Read an ISO date or date-time from a query parameter.
+
+    Args:
+        value (str): e.g. '2025-12-26' or '2025-12-26T21:13:28'
+        end_of_day (bool): A bare date means its last second (for 'to')
+
+    Returns:
+        str: Normalized 'YYYY-MM-DDTHH:MM:SS', or None if value is empty
+
+    Raises:
+        ValueError: If value is not an ISO date
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}' (use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)")
+    if end_of_day and len(value.strip()) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+    return parsed.replace(tzinfo=None).isoformat(timespec='seconds')
+
+
+class TranscriptStore:
+    """SQLite index of saved transcripts, with full-text search over segments."""
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str): Database file (TRANSCRIPT_DB, default: 'output/transcripts.db')
+        """
+        self.path = path or os.environ.get('TRANSCRIPT_DB', os.path.join('output', 'transcripts.db'))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+            # Databases created before segments had speakers
+            columns = [row['name'] for row in connection.execute('PRAGMA table_info(segments)')]
+            if 'speaker' not in columns:
+                connection.execute('ALTER TABLE segments ADD COLUMN speaker TEXT')
+
+    def _connection(self):
+        """
+        This thread's connection (SQLite connections aren't shared across
+        threads, nor across a fork: a worker forked from a preloaded master
+        opens its own instead of reusing the master's).
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # WAL lets searches run while a transcript is being written
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def add(self, data, path=None, created_at=None):
+        """
+        Index a transcript.
+
+        Args:
+            data (dict): Transcription data (as built by MultilingualTranscriber)
+            path (str, optional): File the transcript was saved to; a path
+                that is already indexed is not added again
+            created_at (datetime, optional): When it was transcribed (default: now)
+
+        Returns:
+            int: Transcript id
+        """
+        segments = data.get('corrected_segments') or data.get('segments') or []
+        text = data.get('corrected_text') or data.get('text') or ''
+        created_at = (created_at or datetime.now()).isoformat(timespec='seconds')
+        duration = max((seg.get('end', 0) for seg in segments), default=None)
+
+        connection = self._connection()
+        with connection:
+            if path is not None:
+                row = connection.execute('SELECT id FROM transcripts WHERE path = ?', (path,)).fetchone()
+                if row is not None:
+                    return row['id']
+            transcript_id = connection.execute(
+                'INSERT INTO transcripts (path, language, language_name, created_at, confidence, duration, text) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (path, data.get('language') or 'unknown', data.get('language_name'), created_at,
+                 data.get('confidence'), duration, text)
+            ).lastrowid
+            for position, seg in enumerate(segments):
+                segment_text = (seg.get('text') or '').strip()
+                segment_id = connection.execute(
+                    'INSERT INTO segments (transcript_id, position, start, end, text, speaker) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (transcript_id, position, seg.get('start', 0.0), seg.get('end', 0.0), segment_text,
+                     seg.get('speaker'))
+                ).lastrowid
+                connection.execute(
+                    'INSERT INTO segments_fts (rowid, text) VALUES (?, ?)', (segment_id, segment_text)
+                )
+        return transcript_id
+
+    def get(self, transcript_id, segments=True):
+        """
+        Look up a transcript.
+
+        Args:
+            transcript_id (int): Transcript id
+            segments (bool): Include its segments
+
+        Returns:
+            dict: The transcript, or None if the id is unknown
+        """
+        row = self._connection().execute('SELECT * FROM transcripts WHERE id = ?', (transcript_id,)).fetchone()
+        if row is None:
+            return None
+        transcript = dict(row)
+        if segments:
+            transcript['segments'] = list(self.iter_segments(transcript_id))
+        return transcript
+
+    def iter_segments(self, transcript_id, batch_size=500):
+        """
+        Yield a transcript's segments in order, a batch of rows at a time
+        (so long transcripts can be streamed without loading them whole).
+
+        Yields:
+            dict: Segment with 'position', 'start', 'end', 'text' and 'speaker'
+        """
+        cursor = self._connection().execute(
+            'SELECT position, start, end, text, speaker FROM segments WHERE transcript_id = ? ORDER BY position',
+            (transcript_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+
+    def search(self, query=None, language=None, since=None, until=None, limit=DEFAULT_LIMIT, offset=0):
+        """
+        Find transcripts, or the segments matching a text query, newest first.
+
+        Args:
+            query (str, optional): Words every matching segment must contain
+            language (str, optional): Language code
+            since (str, optional): Earliest creation time (ISO, inclusive)
+            until (str, optional): Latest creation time (ISO, inclusive)
+            limit (int): Results to return (at most MAX_LIMIT)
+            offset (int): Results to skip (paging)
+
+        Returns:
+            list: Transcripts (without query) or segment hits, each with its
+                transcript's id, language and creation time plus the
+                segment's start/end and a highlighted snippet
+
+        Raises:
+            ValueError: If the query has no words
+        """
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        offset = max(0, int(offset))
+        filters, params = [], []
+        if language:
+            filters.append('t.language = ?')
+            params.append(language)
+        if since:
+            filters.append('t.created_at >= ?')
+            params.append(since)
+        if until:
+            filters.append('t.created_at <= ?')
+            params.append(until)
+
+        connection = self._connection()
+        if not query:
+            where = ' WHERE ' + ' AND '.join(filters) if filters else ''
+            rows = connection.execute(
+                'SELECT t.id, t.language, t.language_name, t.created_at, t.confidence, t.duration, '
+                'substr(t.text, 1, 200) AS preview FROM transcripts t' + where +
+                ' ORDER BY t.created_at DESC, t.id DESC LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            )
+            return [dict(row) for row in rows]
+
+        if since or until:
+            # Narrow the full-text scan to the segments of transcripts in the
+            # date range, so an old range doesn't walk every newer match first
+            bounds = self._segment_bounds(connection, since, until)
+            if bounds is None:
+                return []
+            filters.append('segments_fts.rowid BETWEEN ? AND ?')
+            params.extend(bounds)
+
+        # Newest first: FTS5 walks its index in rowid order and stops after
+        # `limit` hits, where ranking would score every match of a common word
+        where = ' AND '.join(['segments_fts MATCH ?'] + filters)
+        rows = connection.execute(
+            'SELECT t.id AS transcript_id, t.language, t.created_at, s.position, s.start, s.end, s.text, '
+            "snippet(segments_fts, 0, '[', ']', '…', 16) AS snippet "
+            'FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid '
+            'JOIN transcripts t ON t.id = s.transcript_id WHERE ' + where +
+            ' ORDER BY segments_fts.rowid DESC LIMIT ? OFFSET ?',
+            [match_expression(query)] + params + [limit, offset]
+        )
+        return [dict(row) for row in rows]
+
+    def _segment_bounds(self, connection, since, until):
+        """
+        Smallest and largest segment id of the transcripts created in a date
+        range (segments are inserted right after their transcript, so ids
+        grow with transcript ids), or None if there are none.
+        """
+        first, last = connection.execute(
+            'SELECT min(id), max(id) FROM transcripts WHERE created_at >= ? AND created_at <= ?',
+            (since or '', until or '9999')
+        ).fetchone()
+        if first is None:
+            return None
+        low = connection.execute(
+            'SELECT id FROM segments WHERE transcript_id >= ? ORDER BY transcript_id, position LIMIT 1',
+            (first,)
+        ).fetchone()
+        high = connection.execute(
+            'SELECT id FROM segments WHERE transcript_id <= ? ORDER BY transcript_id DESC, position DESC LIMIT 1',
+            (last,)
+        ).fetchone()
+        if low is None or high is None:
+            return None
+        return low[0], high[0]
+
+    def backfill(self, output_dir='output'):
+        """
+        Index transcript files saved before the store existed (or while it
+        was unavailable). Files already indexed are skipped.
+
+        Args:
+            output_dir (str): Directory holding transcript_*.json files
+
+        Returns:
+            int: Transcripts added
+        """
+        added = 0
+        for name in sorted(os.listdir(output_dir)):
+            match = _FILENAME_PATTERN.match(name)
+            if not match:
+                continue
+            json_path = os.path.join(output_dir, name)
+            # Transcripts are indexed under the path of their text file
+            path = json_path[:-len('.json')] + '.txt'
+            if self._connection().execute('SELECT 1 FROM transcripts WHERE path = ?', (path,)).fetchone():
+                continue
+            try:
+                with open(json_path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Skipping {json_path}: {e}")
+                continue
+            data.setdefault('language', match.group(1))
+            self.add(data, path, datetime.strptime(match.group(2), '%Y%m%d_%H%M%S'))
+            added += 1
+        return added
+
+    def status(self):
+        """Database path and transcripts indexed."""
+        return {
+            'path': self.path,
+            'transcripts': self._connection().execute('SELECT count(*) FROM transcripts').fetchone()[0]
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store():
+    """Get or create global transcript store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TranscriptStore()
+        return _store
+
+
+if __name__ == "__main__":
+    # Index the transcripts already in output/ (e.g. after upgrading)
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'backfill':
+        print("Usage: python transcript_store.py backfill [output_dir]")
+        sys.exit(1)
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else 'output'
+    store = TranscriptStore()
+    print(f"Indexed {store.backfill(output_dir)} transcripts from {output_dir} into {store.path}")
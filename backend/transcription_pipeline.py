@@ -0,0 +1,510 @@
+"""
+Staged transcription pipeline.
+Splits a MultilingualTranscriber's work into decode, VAD, inference, NLP
+correction and persistence stages, each with its own workers and a bounded
+queue in front of it. Under concurrent load one request's decode and
+correction overlap another's inference instead of each request holding the
+CPU (or the LanguageTool JVM) idle while it waits for its own turn.
+
+Every transcription endpoint goes through this one pipeline, so what is
+added here (caching, batching, metrics) applies to all of them. Jobs choose
+what they need: plain transcriptions skip NLP correction and persistence,
+streamed ones get their segments as they finish. The stages themselves are
+pluggable, and a configuration can be benchmarked without the web app:
+
+    python transcription_pipeline.py benchmark a.wav b.wav --model base --jobs 8 \
+        --stages decode,vad,inference,correction
+"""
+import argparse
+import os
+import queue
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from preprocess_audio import load_audio, TARGET_SAMPLE_RATE
+from stage_pipeline import Stage, StagePipeline, DEFAULT_PRIORITY
+from cancellation import cancellable, TranscriptionCancelled
+from diarization import get_diarizer, assign_speakers
+from audio_conditioning import condition_audio, speech_bounds
+from metrics import get_metrics
+import batched_decoding
+
+
+# Built-in stages, in the order they run
+STAGES = ('decode', 'vad', 'inference', 'correction', 'persistence')
+REQUIRED_STAGES = ('decode', 'inference')
+
+
+def _env_workers(name, default):
+    """Read a positive worker/queue count from the environment."""
+    try:
+        value = int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def vad_enabled():
+    """Whether pipelines include the VAD stage by default (PIPELINE_VAD, default: off)."""
+    return os.environ.get('PIPELINE_VAD', '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+class TranscriptionPipeline:
+    """Runs transcription jobs through overlapping pipeline stages."""
+
+    def __init__(self, transcriber, name='transcribe', decode_workers=None,
+                 correction_workers=None, persistence_workers=None, queue_size=None, router=None,
+                 stages=None):
+        """
+        Args:
+            transcriber (MultilingualTranscriber): Transcriber providing the
+                inference, correction and persistence steps
+            name (str): Pipeline name (prefix of its metrics)
+            decode_workers (int): Decode threads (PIPELINE_DECODE_WORKERS, default: 2)
+            correction_workers (int): NLP correction threads
+                (PIPELINE_CORRECTION_WORKERS, default: 2)
+            persistence_workers (int): Transcript writer threads
+                (PIPELINE_PERSISTENCE_WORKERS, default: 1)
+            queue_size (int): Jobs allowed to wait in front of each stage
+                (PIPELINE_QUEUE_SIZE, default: 8)
+            router (ModelRouter, optional): Told how long each inference took,
+                to keep its latency estimates current
+            stages (list, optional): Names from STAGES and/or Stage objects
+                (custom steps taking and returning the job dict), in the
+                order they run. Default: every built-in stage, with 'vad'
+                only when PIPELINE_VAD is set. 'decode' and 'inference' are
+                required.
+
+        Inference has one lane per model size, each with a single worker:
+        a model runs one decode at a time (see ModelRegistry.inference_lock),
+        so more workers would only queue on its lock instead of in the
+        pipeline where they can be seen, while a job for another model
+        doesn't wait behind it. Jobs the window batcher can take (see
+        batched_decoding.py) get a lane of their own per model, with a
+        worker per batch window, so concurrent requests reach the batcher
+        together and share its batches.
+
+        Raises:
+            ValueError: If a stage name is unknown or a required stage is missing
+        """
+        self.transcriber = transcriber
+        self.router = router
+        self.name = name
+        self._metrics = get_metrics()
+        queue_size = queue_size or _env_workers('PIPELINE_QUEUE_SIZE', 8)
+        workers = {
+            'decode': decode_workers or _env_workers('PIPELINE_DECODE_WORKERS', 2),
+            'vad': 1,
+            'correction': correction_workers or _env_workers('PIPELINE_CORRECTION_WORKERS', 2),
+            'persistence': persistence_workers or _env_workers('PIPELINE_PERSISTENCE_WORKERS', 1),
+        }
+        # Jobs that don't need a stage go past its queue instead of waiting in it
+        skips = {
+            'correction': lambda job: not job.get('correct', True) and not job.get('on_segment'),
+            'persistence': lambda job: not job.get('persist', True),
+        }
+        functions = {
+            'decode': self._decode,
+            'vad': self._vad,
+            'inference': self._infer,
+            'correction': self._correct,
+            'persistence': self._persist,
+        }
+        if stages is None:
+            stages = [stage for stage in STAGES if stage != 'vad' or vad_enabled()]
+
+        built = []
+        for stage in stages:
+            if isinstance(stage, str):
+                if stage not in functions:
+                    raise ValueError(f"Unknown pipeline stage '{stage}'. Built-in stages: {', '.join(STAGES)}")
+                inference = stage == 'inference'
+                stage = Stage(stage, functions[stage],
+                              workers=self._inference_workers if inference else workers[stage],
+                              queue_size=queue_size, lane=self._inference_lane if inference else None,
+                              skip=skips.get(stage))
+            built.append(stage)
+        names = [stage.name for stage in built]
+        missing = [stage for stage in REQUIRED_STAGES if stage not in names]
+        if missing:
+            raise ValueError(f"Pipeline needs the {', '.join(missing)} stage(s)")
+        self.stages = names
+        # Streamed jobs hand their windows to a correction stage right after inference
+        self._stream_to_correction = (
+            'correction' in names and names.index('correction') == names.index('inference') + 1
+        )
+        self._pipeline = StagePipeline(built, name=name)
+
+    def _decode(self, job):
+        if job.get('audio') is None:
+            with cancellable(job.get('cancel')):
+                job['audio'] = load_audio(job['path'])
+        job['duration'] = round(len(job['audio']) / TARGET_SAMPLE_RATE, 2)
+        if job.get('condition'):
+            job['audio'] = condition_audio(job['audio'])
+        if job.get('diarize'):
+            # Runs on the diarizer's threads while the job waits for and goes through inference
+            job['speakers'] = get_diarizer().submit(job['audio'], job.get('num_speakers'), job.get('cancel'))
+        return job
+
+    def _vad(self, job):
+        bounds = speech_bounds(job['audio'])
+        if bounds is None:
+            # Nothing but silence: inference is skipped
+            job['silent'] = True
+            self._metrics.increment(f'{self.name}.vad.silent')
+            return job
+        first, end = bounds
+        if first or end < len(job['audio']):
+            trimmed = len(job['audio']) - (end - first)
+            job['audio'] = job['audio'][first:end]
+            job['shift'] = first / TARGET_SAMPLE_RATE
+            self._metrics.increment(f'{self.name}.vad.trimmed_seconds', round(trimmed / TARGET_SAMPLE_RATE, 2))
+        return job
+
+    def _inference_lane(self, job):
+        """Inference lane of a job: its model size, batched or not."""
+        if not job.get('on_segment') and self.transcriber.batches(
+                job.get('word_timestamps', False), job.get('vocabulary'), job.get('decoding')):
+            return f"{job['model_size']}-batched"
+        return job['model_size']
+
+    @staticmethod
+    def _inference_workers(lane):
+        """Workers of an inference lane: one per model, or one per batch window."""
+        return batched_decoding.max_batch_windows() if lane.endswith('-batched') else 1
+
+    def _infer(self, job):
+        audio = job.pop('audio')
+        if job.get('silent'):
+            job['result'] = {'text': '', 'segments': []}
+            job['language'] = job.get('force_language') or 'unknown'
+            return job
+
+        model_size = job['model_size']
+        start = time.perf_counter()
+        if job.get('on_segment'):
+            # Streamed: Whisper's windows go to the correction stage as they
+            # finish, so NLP correction doesn't hold this model's lane
+            windows = self.transcriber.stream_windows(
+                audio, force_language=job.get('force_language'),
+                word_timestamps=job.get('word_timestamps', False),
+                vocabulary=job.get('vocabulary'), model_size=model_size,
+                cancel=job.get('cancel'), decoding=job.get('decoding'), shift=job.get('shift', 0.0)
+            )
+            if self._stream_to_correction:
+                handoff = job['windows'] = queue.Queue()
+                self._pipeline.pass_on(job)
+                try:
+                    for window in windows:
+                        handoff.put(window)
+                    handoff.put(None)
+                except BaseException as e:
+                    # Raised again by the correction stage, which owns the job now
+                    handoff.put(e)
+            else:
+                # No correction stage: segments go out uncorrected
+                self._stream_out(job, windows, correct=False)
+        else:
+            job['result'], job['language'] = self.transcriber.run_inference(
+                audio, detect_language=job.get('detect_language', True),
+                force_language=job.get('force_language'),
+                word_timestamps=job.get('word_timestamps', False),
+                vocabulary=job.get('vocabulary'),
+                model_size=model_size,
+                cancel=job.get('cancel'),
+                decoding=job.get('decoding')
+            )
+        if self.router:
+            self.router.observe(model_size, len(audio) / TARGET_SAMPLE_RATE, time.perf_counter() - start)
+        return job
+
+    def _correct(self, job):
+        if 'windows' in job:
+            self._stream_out(job, self._received(job.pop('windows')), correct=job.get('correct', True))
+        return self._build(job, correct=job.get('correct', True))
+
+    @staticmethod
+    def _received(handoff):
+        """Windows the inference stage hands over, until it is done (or failed)."""
+        while True:
+            window = handoff.get()
+            if window is None:
+                return
+            if isinstance(window, BaseException):
+                raise window
+            yield window
+
+    def _stream_out(self, job, windows, correct):
+        """Correct a streamed job's windows and pass each segment on as it is ready."""
+        for event, payload in self.transcriber.collect_stream(
+                windows, job.get('force_language'), job.get('vocabulary'), job.get('cancel'),
+                correct=correct, save=False):
+            if event == 'segment':
+                job['on_segment'](payload)
+            else:
+                job['data'] = payload
+                job['language'] = payload['language']
+
+    def _build(self, job, correct):
+        """Build the job's transcription data (if inference hasn't) and label its speakers."""
+        if 'data' not in job:
+            job['data'] = self.transcriber.build_transcription(
+                job.pop('result'), job['language'], job.get('vocabulary'), job.get('cancel'),
+                correct=correct, shift=job.get('shift', 0.0)
+            )
+        if 'speakers' in job:
+            turns = job.pop('speakers').result()
+            assign_speakers(job['data']['raw_segments'], turns)
+            assign_speakers(job['data']['corrected_segments'], turns)
+            job['data']['speakers'] = list(dict.fromkeys(turn['speaker'] for turn in turns))
+        return job
+
+    def _persist(self, job):
+        if job.get('cancel') is not None:
+            job['cancel'].check()
+        # A job that skipped correction gets its (uncorrected) data here
+        job = self._build(job, correct=False)
+        job['transcript_path'] = self.transcriber._save_transcript(job['data'])
+        return job
+
+    def submit(self, audio_path, detect_language=True, force_language=None, word_timestamps=False,
+               vocabulary=None, model_size=None, priority=DEFAULT_PRIORITY, cancel=None,
+               diarize=False, num_speakers=None, condition=False, decoding=None,
+               correct=True, persist=True, audio=None, on_segment=None):
+        """
+        Queue an audio file for transcription.
+
+        Blocks while the first stage's queue is full.
+
+        Args:
+            audio_path (str): Path to audio file (None when audio is given)
+            detect_language (bool): Whether to auto-detect language
+            force_language (str): Force specific language code (optional)
+            word_timestamps (bool): Add per-word timings to each segment
+            vocabulary (Vocabulary, optional): Terms to bias decoding towards
+            model_size (str, optional): Model to run (default: the transcriber's)
+            priority (int): Lower values overtake queued jobs at every stage
+            cancel (CancelToken, optional): Every stage stops early (or skips
+                the job) once it trips
+            diarize (bool): Label each segment with its 'speaker'
+                (diarization runs alongside inference)
+            num_speakers (int, optional): Known number of speakers
+            condition (bool): Denoise and normalize the audio before inference
+                (see audio_conditioning.py)
+            decoding (dict, optional): Whisper decoding options (see decoding_profiles.py)
+            correct (bool): Apply NLP correction in the correction stage
+                (off: a job that isn't streamed skips that stage)
+            persist (bool): Save and index the transcript in the persistence
+                stage (off: the job skips it)
+            audio (np.ndarray, optional): Already decoded 16kHz waveform
+                (the decode stage then only conditions it)
+            on_segment (callable, optional): Stream the transcription: called
+                from the correction stage with each corrected segment as it
+                finishes (the job enters that stage as soon as inference starts)
+
+        Returns:
+            Future: Resolves to the finished job dict ('data' holds the
+                transcription data once the correction stage has run, plus
+                'duration' and 'transcript_path')
+        """
+        return self._pipeline.submit({
+            'path': audio_path,
+            'audio': audio,
+            'detect_language': detect_language,
+            'force_language': force_language,
+            'word_timestamps': word_timestamps,
+            'vocabulary': vocabulary,
+            'model_size': model_size or self.transcriber.model_size,
+            'cancel': cancel,
+            'diarize': diarize,
+            'num_speakers': num_speakers,
+            'condition': condition,
+            'decoding': decoding,
+            'correct': correct,
+            'persist': persist,
+            'on_segment': on_segment
+        }, priority=priority)
+
+    def transcribe(self, audio_path, detect_language=True, force_language=None, word_timestamps=False,
+                   vocabulary=None, model_size=None, priority=DEFAULT_PRIORITY, cancel=None,
+                   diarize=False, num_speakers=None, condition=False, decoding=None,
+                   correct=True, persist=True):
+        """
+        Transcribe one file through the pipeline and wait for the result.
+
+        Args:
+            audio_path (str): Path to audio file
+            detect_language (bool): Whether to auto-detect language
+            force_language (str): Force specific language code (optional)
+            word_timestamps (bool): Add per-word timings to each segment
+            vocabulary (Vocabulary, optional): Terms to bias decoding towards
+            model_size (str, optional): Model to run (default: the transcriber's)
+            priority (int): Lower values overtake queued jobs at every stage
+            cancel (CancelToken, optional): Every stage stops early (or skips
+                the job) once it trips
+            diarize (bool): Label each segment with its 'speaker'
+                (diarization runs alongside inference)
+            num_speakers (int, optional): Known number of speakers
+            condition (bool): Denoise and normalize the audio before inference
+                (see audio_conditioning.py)
+            decoding (dict, optional): Whisper decoding options (see decoding_profiles.py)
+            correct (bool): Apply NLP correction (off: the corrected text and
+                segments are the raw ones)
+            persist (bool): Save and index the transcript
+
+        Returns:
+            dict: Transcription data, as MultilingualTranscriber.transcribe_audio() returns
+
+        Raises:
+            TranscriptionCancelled: If cancel trips first (the job is then
+                dropped at its next stage)
+        """
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+        future = self.submit(
+            audio_path, detect_language, force_language, word_timestamps, vocabulary, model_size,
+            priority, cancel, diarize, num_speakers, condition, decoding, correct, persist
+        )
+        job = self._wait(future, cancel)
+        print(f"Transcription complete. Detected language: {job['data']['language_name']} ({job['language']})")
+        return job['data']
+
+    def stream(self, audio, force_language=None, word_timestamps=False, vocabulary=None, model_size=None,
+               priority=DEFAULT_PRIORITY, cancel=None, condition=False, decoding=None):
+        """
+        Transcribe a waveform through the pipeline, yielding segments as they finish.
+
+        Args:
+            audio (np.ndarray): 16kHz mono float32 waveform
+            force_language (str): Force specific language code (optional)
+            word_timestamps (bool): Add per-word timings to each segment
+            vocabulary (Vocabulary, optional): Terms to bias decoding towards
+                and snap near misses to
+            model_size (str, optional): Model to run (default: the transcriber's)
+            priority (int): Lower values overtake queued jobs at every stage
+            cancel (CancelToken, optional): Every stage stops early (or skips
+                the job) once it trips; closing the generator trips it
+            condition (bool): Denoise and normalize the audio before inference
+            decoding (dict, optional): Whisper decoding options (see decoding_profiles.py)
+
+        Yields:
+            tuple: ('segment', corrected segment dict) for each finished
+                segment, then ('done', transcription data) once at the end
+        """
+        segments = queue.Queue()
+        future = self.submit(
+            None, force_language=force_language, word_timestamps=word_timestamps,
+            vocabulary=vocabulary, model_size=model_size, priority=priority, cancel=cancel,
+            condition=condition, decoding=decoding, audio=audio, on_segment=segments.put
+        )
+        future.add_done_callback(lambda _: segments.put(None))
+        try:
+            while True:
+                segment = segments.get()
+                if segment is None:
+                    break
+                yield 'segment', segment
+            job = self._wait(future, cancel)
+        finally:
+            if not future.done() and cancel is not None:
+                # Nobody is reading any more
+                cancel.cancel('disconnected')
+        yield 'done', job['data']
+
+    def _wait(self, future, cancel):
+        """Wait for a job (not past the deadline) and make sure it has its transcription data."""
+        try:
+            job = future.result(timeout=cancel.remaining() if cancel else None)
+        except FutureTimeout:
+            cancel.cancel('deadline')
+            raise TranscriptionCancelled('deadline')
+        # Without a correction stage the data is built (uncorrected) here
+        return self._build(job, correct=False)
+
+    def close(self, wait=True):
+        """Stop accepting jobs and shut the stages down once queued jobs finish."""
+        self._pipeline.close(wait=wait)
+
+    def status(self):
+        """Per-stage workers, busy workers and queue depth."""
+        return self._pipeline.status()
+
+
+def benchmark(paths, model_size='base', stages=None, jobs=None, language=None, decoding=None):
+    """
+    Run files through a pipeline of the given stages, outside the web app,
+    all jobs queued at once.
+
+    Args:
+        paths (list): Audio files
+        model_size (str): Whisper model to run
+        stages (list, optional): Stage names (default: as the app configures them)
+        jobs (int, optional): Jobs to run, cycling through the files
+            (default: one per file)
+        language (str, optional): Language code (skips detection)
+        decoding (dict, optional): Whisper decoding options
+
+    Returns:
+        dict: 'jobs', 'audio_seconds', 'wall_seconds', 'realtime_factor' and
+            per stage ('stages') its average and longest seconds and average
+            wait in front of it
+    """
+    from multilingual_transcribe import MultilingualTranscriber
+
+    transcriber = MultilingualTranscriber(
+        model_size=model_size, enable_nlp_correction=stages is None or 'correction' in stages
+    )
+    pipeline = TranscriptionPipeline(transcriber, name='benchmark', stages=stages)
+    files = [paths[index % len(paths)] for index in range(jobs or len(paths))]
+
+    start = time.perf_counter()
+    futures = [pipeline.submit(path, force_language=language, decoding=decoding) for path in files]
+    finished = [pipeline._wait(future, None) for future in futures]
+    wall_seconds = time.perf_counter() - start
+    pipeline.close()
+
+    timings = get_metrics().snapshot()['timings']
+    audio_seconds = sum(job['duration'] for job in finished)
+    return {
+        'jobs': len(finished),
+        'audio_seconds': round(audio_seconds, 2),
+        'wall_seconds': round(wall_seconds, 3),
+        'realtime_factor': round(audio_seconds / wall_seconds, 2) if wall_seconds else None,
+        'stages': {
+            name: {
+                'avg_seconds': timings.get(f'benchmark.{name}_seconds', {}).get('avg', 0.0),
+                'max_seconds': timings.get(f'benchmark.{name}_seconds', {}).get('max', 0.0),
+                'avg_wait_seconds': timings.get(f'benchmark.{name}_wait_seconds', {}).get('avg', 0.0)
+            }
+            for name in pipeline.stages
+        }
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcription pipeline tools")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    bench = subcommands.add_parser('benchmark', help="Time each stage of a pipeline configuration")
+    bench.add_argument('audio', nargs='+', help="Audio files")
+    bench.add_argument('--model', default='base', help="Whisper model size (default: base)")
+    bench.add_argument('--stages', default='decode,inference,correction',
+                       help="Comma-separated stages, in order (default: decode,inference,correction; "
+                            "adding persistence saves the transcripts)")
+    bench.add_argument('--jobs', type=int, default=None,
+                       help="Jobs to run, cycling through the files (default: one per file; repeated "
+                            "files hit the encoder cache unless ENCODER_CACHE_MB=0)")
+    bench.add_argument('--language', default=None, help="Language code (default: detect)")
+    bench.add_argument('--decoding', default=None, help="Decoding profile (default: DECODING_PROFILE, see decoding_profiles.py)")
+    args = parser.parse_args()
+
+    from decoding_profiles import decoding_options
+    _, decoding = decoding_options({'decoding': args.decoding})
+    results = benchmark(
+        args.audio, args.model, [stage.strip() for stage in args.stages.split(',') if stage.strip()],
+        args.jobs, args.language, decoding
+    )
+    print(f"{'stage':<14}{'avg s':>9}{'max s':>9}{'wait s':>9}")
+    for name, row in results['stages'].items():
+        print(f"{name:<14}{row['avg_seconds']:>9}{row['max_seconds']:>9}{row['avg_wait_seconds']:>9}")
+    print(f"\n{results['jobs']} job(s), {results['audio_seconds']}s of audio in {results['wall_seconds']}s "
+          f"({results['realtime_factor']}x real time)")
@@ -0,0 +1,369 @@
+"""
+Streaming multipart upload handling.
+Parses the request body incrementally and pipes the audio part straight into
+FFmpeg as it arrives, so decoding overlaps the upload and per-request memory
+stays bounded by one read buffer no matter how large the file is.
+
+Streaming decodes are capped by DECODER_MAX_STREAMING, apart from the decode
+slots: once that many uploads are feeding FFmpeg, further ones are spooled
+to disk and decoded in a decode slot after they arrive, so slow clients
+can't keep the decoder idle.
+"""
+import os
+import subprocess
+import tempfile
+import wave
+import ffmpeg
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from werkzeug.utils import secure_filename
+from decoder_service import get_decoder_service, DecoderTimeoutError
+from preprocess_audio import (
+    preprocess_audio, parse_wav_header, is_target_pcm,
+    RAW_PCM_EXTENSIONS, TARGET_SAMPLE_RATE, TARGET_CHANNELS, TARGET_SAMPLE_WIDTH
+)
+
+
+# Bytes read from the request per step (also the largest audio buffer held)
+CHUNK_SIZE = 64 * 1024
+
+# Largest accepted non-file form field
+MAX_FIELD_SIZE = 64 * 1024
+
+# Most WAV bytes held while looking for the 'data' chunk header
+MAX_WAV_HEADER_SIZE = 64 * 1024
+
+# Containers FFmpeg can decode from a non-seekable pipe. Others (m4a keeps its
+# index at the end of the file, wma/asf needs seeking) are spooled to disk in
+# CHUNK_SIZE pieces and converted once the upload completes.
+PIPE_DECODABLE_EXTENSIONS = {'mp3', 'wav', 'webm', 'ogg', 'flac', 'aac'}
+
+
+class UploadError(ValueError):
+    """Client-side upload problem, reported with an HTTP status code."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StreamedUpload:
+    """Result of a streamed upload: form fields plus the decoded 16kHz WAV."""
+
+    def __init__(self):
+        self.filename = None
+        self.form = {}
+        self.audio_path = None
+        self.spooled_path = None
+        self.bytes_received = 0
+
+    def cleanup(self):
+        """Remove the temporary files created for this upload."""
+        for path in (self.spooled_path, self.audio_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+class _PipeDecoder:
+    """
+    FFmpeg process converting audio written to its stdin into a 16kHz mono WAV.
+    The caller has taken a streaming slot (DecoderService.try_acquire_stream()),
+    which is returned when decoding ends.
+    """
+
+    def __init__(self, output_path):
+        self._service = get_decoder_service()
+        self._released = False
+        try:
+            stream = ffmpeg.input('pipe:0')
+            stream = ffmpeg.output(stream, output_path, acodec='pcm_s16le', ac=1, ar='16000')
+            args = self._service.command(
+                ffmpeg.compile(stream.global_args('-hide_banner', '-loglevel', 'error'), overwrite_output=True)
+            )
+            # stderr goes to a file so a chatty decoder can never block on a full pipe
+            self._stderr = tempfile.TemporaryFile()
+        except BaseException:
+            self._release()
+            raise
+        try:
+            self._process = subprocess.Popen(
+                args, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr
+            )
+        except BaseException:
+            self._stderr.close()
+            self._release()
+            raise
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self._service.release_stream()
+
+    def write(self, data):
+        try:
+            self._process.stdin.write(data)
+        except BrokenPipeError:
+            # FFmpeg gave up on the input; finish() reports why
+            pass
+
+    def finish(self):
+        """Close stdin, wait for FFmpeg and raise if decoding failed."""
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            returncode = self._process.wait(timeout=self._service.job_timeout)
+        except subprocess.TimeoutExpired:
+            self.abort()
+            raise DecoderTimeoutError("Audio decoding timed out")
+        self._release()
+        self._stderr.seek(0)
+        error_output = self._stderr.read().decode(errors='replace').strip()
+        self._stderr.close()
+        if returncode != 0:
+            raise Exception(f"FFmpeg error during audio preprocessing: {error_output}")
+
+    def abort(self):
+        """Stop FFmpeg without waiting for the rest of the input."""
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._stderr.close()
+        self._release()
+
+
+class _FileSink:
+    """Writes received bytes to a file (already-compliant WAV or seek-only formats)."""
+
+    def __init__(self, path, on_finish=None):
+        self._file = open(path, 'wb')
+        self._on_finish = on_finish
+
+    def write(self, data):
+        self._file.write(data)
+
+    def finish(self):
+        self._file.close()
+        if self._on_finish:
+            self._on_finish()
+
+    def abort(self):
+        self._file.close()
+
+
+class _RawPcmSink:
+    """Wraps headerless 16kHz mono PCM in a WAV container as it arrives, without FFmpeg."""
+
+    def __init__(self, output_path):
+        self._wav = wave.open(output_path, 'wb')
+        self._wav.setnchannels(TARGET_CHANNELS)
+        self._wav.setsampwidth(TARGET_SAMPLE_WIDTH)
+        self._wav.setframerate(TARGET_SAMPLE_RATE)
+
+    def write(self, data):
+        self._wav.writeframesraw(data)
+
+    def finish(self):
+        self._wav.close()
+
+    def abort(self):
+        self._wav.close()
+
+
+class _WavSniffer:
+    """
+    Holds the first bytes of a WAV upload until its header is readable, then
+    either passes the file through untouched (already 16kHz mono 16-bit PCM)
+    or hands everything to FFmpeg.
+    """
+
+    def __init__(self, upload):
+        self._upload = upload
+        self._header = bytearray()
+        self._target = None
+
+    def _decide(self):
+        if is_target_pcm(parse_wav_header(bytes(self._header))):
+            self._target = _FileSink(self._upload.audio_path)
+        else:
+            self._target = _decoding_sink(self._upload)
+        self._target.write(bytes(self._header))
+        self._header = None
+
+    def write(self, data):
+        if self._target is not None:
+            self._target.write(data)
+            return
+        self._header.extend(data)
+        if parse_wav_header(bytes(self._header)) is not None or len(self._header) >= MAX_WAV_HEADER_SIZE:
+            self._decide()
+
+    def finish(self):
+        if self._target is None:
+            self._decide()
+        self._target.finish()
+
+    def abort(self):
+        if self._target is not None:
+            self._target.abort()
+
+    @property
+    def passthrough(self):
+        return isinstance(self._target, _FileSink)
+
+
+def _temp_path(suffix):
+    """Create an empty, uniquely named temp file and return its path."""
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix='upload_')
+    os.close(fd)
+    return path
+
+
+def receive_audio_upload(request, field_name='audio', allowed_extensions=None, default_filename=None):
+    """
+    Receive a multipart audio upload, decoding it while it streams in.
+
+    Must be called before anything touches request.form or request.files,
+    which would make Werkzeug buffer the whole body first.
+
+    Args:
+        request: Flask request with a multipart/form-data body
+        field_name (str): Form field holding the audio file (default: 'audio')
+        allowed_extensions (set, optional): Accepted file extensions. When
+            given, the client filename must be present and match one of them.
+        default_filename (str, optional): Filename to use instead of the
+            client's (e.g. 'recording.webm' for browser recordings)
+
+    Returns:
+        StreamedUpload: Form fields and the path of the decoded 16kHz mono WAV
+
+    Raises:
+        UploadError: If the request has no usable audio part (400) or is too
+            large (413)
+        RuntimeError: If FFmpeg is needed but not installed
+        DecoderBusyError: If no decode slot frees up in time
+        Exception: If FFmpeg cannot decode the audio
+    """
+    if request.mimetype != 'multipart/form-data' or 'boundary' not in request.mimetype_params:
+        raise UploadError('No audio file provided')
+
+    upload = StreamedUpload()
+    decoder = MultipartDecoder(request.mimetype_params['boundary'].encode('latin-1'))
+    field_name_current = None   # name of the form field being received, if any
+    field_value = None
+    sink = None                 # FFmpeg pipe or spool file while the audio part is open
+
+    try:
+        while True:
+            try:
+                chunk = request.stream.read(CHUNK_SIZE)
+            except RequestEntityTooLarge:
+                raise UploadError('File too large', 413)
+            upload.bytes_received += len(chunk)
+            decoder.receive_data(chunk or None)
+
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, File) and event.name == field_name and upload.audio_path is None:
+                    sink = _open_audio_sink(upload, event.filename, allowed_extensions, default_filename)
+                elif isinstance(event, Field):
+                    field_name_current = event.name
+                    field_value = bytearray()
+                elif isinstance(event, Data):
+                    if sink is not None:
+                        sink.write(event.data)
+                        if not event.more_data:
+                            _finish_audio(upload, sink)
+                            sink = None
+                    elif field_value is not None:
+                        field_value.extend(event.data)
+                        if len(field_value) > MAX_FIELD_SIZE:
+                            raise UploadError(f"Form field '{field_name_current}' is too large")
+                        if not event.more_data:
+                            upload.form[field_name_current] = field_value.decode('utf-8', 'replace')
+                            field_value = None
+                    # Data of any other file part is discarded
+                event = decoder.next_event()
+
+            if not chunk:
+                break
+
+        if upload.audio_path is None:
+            raise UploadError('No audio file provided')
+        if sink is not None:
+            raise UploadError('Audio upload ended before the file was complete')
+        return upload
+
+    except BaseException:
+        if sink is not None:
+            sink.abort()
+        upload.cleanup()
+        raise
+
+
+def _open_audio_sink(upload, client_filename, allowed_extensions, default_filename):
+    """
+    Start receiving the audio part. Compliant WAV and raw PCM are written out
+    in-process, pipe-friendly formats stream into FFmpeg, and seek-only
+    formats are spooled to disk for conversion after the upload.
+    """
+    upload.filename = _accept_filename(client_filename, allowed_extensions, default_filename)
+    extension = upload.filename.rsplit('.', 1)[-1].lower() if '.' in upload.filename else ''
+    upload.audio_path = _temp_path('.wav')
+    if extension == 'wav':
+        return _WavSniffer(upload)
+    if extension in RAW_PCM_EXTENSIONS:
+        return _RawPcmSink(upload.audio_path)
+    if extension in PIPE_DECODABLE_EXTENSIONS or not extension:
+        return _decoding_sink(upload)
+    return _spooled_sink(upload)
+
+
+def _decoding_sink(upload):
+    """
+    Stream a pipe-friendly upload into FFmpeg while a streaming slot is free;
+    otherwise spool it and decode it (in a decode slot) once it has arrived,
+    so slow uploads can't keep every decoder waiting on their bytes.
+    """
+    if get_decoder_service().try_acquire_stream():
+        return _PipeDecoder(upload.audio_path)
+    return _spooled_sink(upload)
+
+
+def _spooled_sink(upload):
+    """Spool the upload to disk and convert it once it is complete."""
+    upload.spooled_path = _temp_path(f'_{upload.filename}')
+
+    def convert_spooled():
+        cleaned_path = preprocess_audio(upload.spooled_path, output_path=upload.audio_path)
+        if cleaned_path == os.path.abspath(upload.spooled_path):
+            # Already compliant: the spooled file is the cleaned audio
+            os.replace(upload.spooled_path, upload.audio_path)
+        else:
+            os.remove(upload.spooled_path)
+        upload.spooled_path = None
+
+    return _FileSink(upload.spooled_path, on_finish=convert_spooled)
+
+
+def _accept_filename(client_filename, allowed_extensions, default_filename):
+    """Validate the client filename (when required) and pick the name to use."""
+    if allowed_extensions is not None:
+        if not client_filename:
+            raise UploadError('No file selected')
+        if '.' not in client_filename or client_filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+            raise UploadError('Invalid file type. Allowed types: ' + ', '.join(allowed_extensions))
+    return secure_filename(default_filename or client_filename or 'audio')
+
+
+def _finish_audio(upload, sink):
+    """Complete decoding once the audio part has been fully received."""
+    spooled = upload.spooled_path is not None
+    sink.finish()
+    if isinstance(sink, _WavSniffer) and sink.passthrough or isinstance(sink, _RawPcmSink):
+        print(f"✓ PCM audio received without conversion: {upload.audio_path}")
+    elif spooled:
+        print(f"✓ Audio decoded after upload: {upload.audio_path}")
+    else:
+        print(f"✓ Audio decoded while streaming: {upload.audio_path}")
@@ -0,0 +1,409 @@
+"""
+Custom vocabulary (hotword) biasing.
+Each tenant can register domain terms (product names, medical vocabulary).
+They are used twice:
+  - During decoding: the terms are tokenized once and their token ids are
+    put at the front of Whisper's prompt for every 30-second window, which
+    makes the decoder much more likely to spell them the way they're listed.
+  - After decoding: a fuzzy matcher snaps near misses in the transcript
+    ("hyper tension", "Zenthra" for "Xenthra") to the listed spelling.
+    Lookups use a symmetric-delete index over each term's first characters,
+    so each transcript word costs a bounded number of dictionary probes and
+    the pass is linear in the text.
+"""
+import dataclasses
+import json
+import os
+import re
+import threading
+import whisper.tokenizer
+from decode_hooks import decode_hook
+
+
+# Prompt tokens reserved for vocabulary terms (Whisper's prompt holds 223)
+DEFAULT_PROMPT_TOKENS = 100
+
+# Terms kept per vocabulary
+MAX_TERMS = 1000
+
+# Shortest (normalized) text that may be snapped to a term it doesn't match exactly
+MIN_FUZZY_LENGTH = 5
+
+# Words a transcript phrase may span when matching multi-word terms
+MAX_PHRASE_WORDS = 4
+
+# Leading characters indexed for fuzzy lookup (SymSpell's prefix trick: keeps
+# the number of delete variants per word small; candidates are then checked
+# against the whole word)
+INDEX_PREFIX_LENGTH = 7
+
+# Distinct words whose match result is remembered
+MATCH_CACHE_SIZE = 50000
+
+_TENANT_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+_EDGE_PUNCTUATION = re.compile(r'^(\W*)(.*?)(\W*)$', re.UNICODE | re.DOTALL)
+
+
+def _normalize(text):
+    """Lowercase and drop spaces/punctuation, so 'Hyper-Tension' == 'hypertension'."""
+    return _NON_WORD.sub('', text.lower())
+
+
+def _max_distance(length):
+    """Edits allowed when snapping text of this (normalized) length."""
+    if length < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if length <= 8 else 2
+
+
+def _deletes(word, distance):
+    """All strings obtained by deleting up to distance characters from word."""
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {
+            variant[:i] + variant[i + 1:]
+            for variant in frontier if len(variant) > 1
+            for i in range(len(variant))
+        }
+        variants |= frontier
+    return variants
+
+
+def _edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 if it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class Vocabulary:
+    """A list of terms with cached prompt tokens and a fuzzy snap index."""
+
+    def __init__(self, terms, max_prompt_tokens=None):
+        """
+        Args:
+            terms (list): Terms in priority order (earlier terms win the
+                prompt budget when there are too many to fit)
+            max_prompt_tokens (int, optional): Prompt tokens the terms may use
+                (VOCABULARY_PROMPT_TOKENS, default: 100)
+        """
+        seen = set()
+        self.terms = []
+        for term in terms:
+            term = ' '.join(str(term).split())
+            if term and _normalize(term) and term.lower() not in seen:
+                seen.add(term.lower())
+                self.terms.append(term)
+        self.terms = self.terms[:MAX_TERMS]
+        self.max_prompt_tokens = max_prompt_tokens or int(
+            os.environ.get('VOCABULARY_PROMPT_TOKENS', DEFAULT_PROMPT_TOKENS)
+        )
+        self._prompt_tokens = {}
+        self._lock = threading.Lock()
+        self._build_index()
+
+    def _build_index(self):
+        """Index every term by its normalized form and its deletion variants."""
+        self._canonical = {}
+        self._index = {}
+        self._match_cache = {}
+        self._min_key_length = min((len(_normalize(term)) for term in self.terms), default=0)
+        self._max_key_length = 0
+        self._max_phrase_words = 1
+        for term in self.terms:
+            key = _normalize(term)
+            self._canonical.setdefault(key, term)
+            self._max_key_length = max(self._max_key_length, len(key))
+            # A term may also be heard split into one extra word
+            self._max_phrase_words = min(MAX_PHRASE_WORDS, max(self._max_phrase_words, len(term.split()) + 1))
+            for variant in _deletes(key[:INDEX_PREFIX_LENGTH], _max_distance(len(key))):
+                self._index.setdefault(variant, set()).add(key)
+
+    def prompt_tokens(self, model):
+        """
+        Token ids of the terms for a model's tokenizer (computed once).
+
+        Whole terms are added in order until the token budget is used up.
+
+        Args:
+            model (whisper.model.Whisper): Model the prompt is for
+
+        Returns:
+            list: Token ids
+        """
+        cache_key = (model.is_multilingual, model.num_languages)
+        tokens = self._prompt_tokens.get(cache_key)
+        if tokens is not None:
+            return tokens
+
+        with self._lock:
+            if cache_key not in self._prompt_tokens:
+                tokenizer = whisper.tokenizer.get_tokenizer(
+                    model.is_multilingual, num_languages=model.num_languages
+                )
+                tokens = []
+                for term in self.terms:
+                    term_tokens = tokenizer.encode(f" {term},")
+                    if len(tokens) + len(term_tokens) > self.max_prompt_tokens:
+                        break
+                    tokens.extend(term_tokens)
+                self._prompt_tokens[cache_key] = tokens
+            return self._prompt_tokens[cache_key]
+
+    def biasing(self):
+        """
+        Context manager that prefixes this thread's Whisper decodes with the
+        vocabulary prompt.
+
+        Whisper keeps the previous text as the prompt for each window and
+        trims it from the front, which would push the terms out after the
+        first window; the hook re-adds them to every window and trims the
+        previous text instead.
+        """
+        def hook(model, mel, options, decode):
+            vocabulary_tokens = self.prompt_tokens(model)
+            if not vocabulary_tokens:
+                return decode(mel, options)
+            previous = options.prompt or []
+            if isinstance(previous, str):
+                tokenizer = whisper.tokenizer.get_tokenizer(
+                    model.is_multilingual, num_languages=model.num_languages
+                )
+                previous = tokenizer.encode(" " + previous.strip())
+            room = model.dims.n_text_ctx // 2 - 1 - len(vocabulary_tokens)
+            prompt = vocabulary_tokens + (list(previous[-room:]) if room > 0 and previous else [])
+            return decode(mel, dataclasses.replace(options, prompt=prompt))
+
+        return decode_hook(hook)
+
+    def match(self, text):
+        """
+        Find the term closest to a piece of text.
+
+        Args:
+            text (str): Word or phrase from a transcript
+
+        Returns:
+            str or None: The term's listed spelling, if one is close enough
+        """
+        term, _ = self._lookup(_normalize(text))
+        return term
+
+    def _lookup(self, key):
+        """Closest term to a normalized key as (term, edit distance), or (None, None)."""
+        if not key:
+            return None, None
+        cached = self._match_cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = (None, None)
+        limit = _max_distance(len(key))
+        if key in self._canonical:
+            result = (self._canonical[key], 0)
+        elif limit and self._min_key_length - limit <= len(key) <= self._max_key_length + limit:
+            candidates = set()
+            for variant in _deletes(key[:INDEX_PREFIX_LENGTH], limit):
+                candidates |= self._index.get(variant, set())
+            best_distance = limit + 1
+            for candidate in sorted(candidates):
+                allowed = min(limit, _max_distance(len(candidate)))
+                distance = _edit_distance(key, candidate, allowed)
+                if distance <= allowed and distance < best_distance:
+                    result, best_distance = (self._canonical[candidate], distance), distance
+
+        # Transcripts repeat words a lot; remember answers (bounded)
+        if len(self._match_cache) >= MATCH_CACHE_SIZE:
+            self._match_cache.clear()
+        self._match_cache[key] = result
+        return result
+
+    def snap(self, text):
+        """
+        Replace near misses of vocabulary terms in a transcript.
+
+        At each word, phrases of up to one word more than the longest term
+        are tried (so 'hyper tension' can become 'hypertension' and
+        multi-word terms match as a whole). The closest match wins, and the
+        longer phrase wins a tie. Punctuation around the replaced words is
+        kept.
+
+        Args:
+            text (str): Transcript text
+
+        Returns:
+            tuple: (snapped text, list of {'from', 'to'} replacements)
+        """
+        if not self.terms or not text:
+            return text, []
+
+        words = list(re.finditer(r'\S+', text))
+        pieces = []
+        snaps = []
+        position = 0
+        i = 0
+        while i < len(words):
+            best = None   # (distance, -words, term, core, leading, trailing)
+            for n in range(1, min(self._max_phrase_words, len(words) - i) + 1):
+                span = text[words[i].start():words[i + n - 1].end()]
+                leading, core, trailing = _EDGE_PUNCTUATION.match(span).groups()
+                term, distance = self._lookup(_normalize(core))
+                if term is not None and (best is None or (distance, -n) < best[:2]):
+                    best = (distance, -n, term, core, leading, trailing)
+            if best is None:
+                i += 1
+                continue
+
+            _, negative_n, term, core, leading, trailing = best
+            n = -negative_n
+            if core != term:
+                pieces.append(text[position:words[i].start()])
+                pieces.append(f"{leading}{term}{trailing}")
+                position = words[i + n - 1].end()
+                snaps.append({'from': core, 'to': term})
+            i += n
+        pieces.append(text[position:])
+        return ''.join(pieces), snaps
+
+    def snap_segments(self, segments):
+        """
+        Snap the text of each segment (see snap()).
+
+        Args:
+            segments (list): Segment dicts with 'text'
+
+        Returns:
+            list: Copies of the segments with snapped text
+        """
+        snapped = []
+        for segment in segments:
+            segment = dict(segment)
+            segment['text'], _ = self.snap(segment['text'])
+            snapped.append(segment)
+        return snapped
+
+
+class VocabularyStore:
+    """Per-tenant vocabularies kept as JSON files, cached in memory."""
+
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str, optional): Where vocabularies are stored
+                (VOCABULARY_DIR, default: 'vocabularies')
+        """
+        self.directory = directory or os.environ.get('VOCABULARY_DIR', 'vocabularies')
+        self._cache = {}   # tenant -> (file mtime, Vocabulary)
+        self._lock = threading.Lock()
+
+    def _path(self, tenant):
+        if not _TENANT_PATTERN.match(tenant or ''):
+            raise ValueError('Invalid tenant id (use letters, digits, "-" and "_", at most 64)')
+        return os.path.join(self.directory, f'{tenant}.json')
+
+    def get(self, tenant):
+        """
+        Get a tenant's vocabulary.
+
+        Args:
+            tenant (str): Tenant id
+
+        Returns:
+            Vocabulary or None: None if the tenant has no vocabulary
+
+        Raises:
+            ValueError: If the tenant id is invalid
+        """
+        path = self._path(tenant)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        cached = self._cache.get(tenant)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with self._lock:
+            cached = self._cache.get(tenant)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            with open(path, encoding='utf-8') as f:
+                vocabulary = Vocabulary(json.load(f).get('terms', []))
+            self._cache[tenant] = (mtime, vocabulary)
+            print(f"✓ Vocabulary loaded for tenant '{tenant}': {len(vocabulary.terms)} terms")
+            return vocabulary
+
+    def save(self, tenant, terms):
+        """
+        Store a tenant's vocabulary (replacing any previous one).
+
+        Args:
+            tenant (str): Tenant id
+            terms (list): Terms in priority order
+
+        Returns:
+            Vocabulary: The stored vocabulary
+
+        Raises:
+            ValueError: If the tenant id or terms are invalid
+        """
+        path = self._path(tenant)
+        if not isinstance(terms, list) or not all(isinstance(term, str) for term in terms):
+            raise ValueError("'terms' must be a list of strings")
+        vocabulary = Vocabulary(terms)
+
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'terms': vocabulary.terms}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._cache[tenant] = (os.path.getmtime(path), vocabulary)
+        return vocabulary
+
+    def for_request(self, tenant=None, hotwords=None):
+        """
+        Build the vocabulary for one request.
+
+        Args:
+            tenant (str, optional): Tenant whose stored vocabulary applies
+            hotwords (str, optional): Extra comma-separated terms for this request only
+
+        Returns:
+            Vocabulary or None: None if neither gives any terms
+
+        Raises:
+            ValueError: If the tenant id is invalid
+        """
+        stored = self.get(tenant) if tenant else None
+        extra = [term for term in (hotwords or '').split(',') if term.strip()]
+        if not extra:
+            return stored
+        # Request terms go first so they always fit in the prompt
+        return Vocabulary(extra + (stored.terms if stored else []))
+
+
+# Global vocabulary store instance
+_store = None
+
+def get_vocabulary_store():
+    """Get or create global vocabulary store."""
+    global _store
+    if _store is None:
+        _store = VocabularyStore()
+    return _store
@@ -17,6 +17,9 @@ const api = axios.create({
   },
 });
 
+// Tell the server when we stop waiting, so it abandons the transcription too
+const deadlineHeader = { 'X-Request-Deadline': String(api.defaults.timeout / 1000) };
+
 /**
  * Upload and transcribe audio file
  * @param {FormData} formData - FormData containing audio file and optional language
@@ -27,6 +30,7 @@ export const uploadAudio = async (formData) => {
     const response = await api.post('/api/transcribe', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
+        ...deadlineHeader,
       },
     });
     return response.data;
@@ -46,6 +50,7 @@ export const startLiveRecording = async (formData) => {
     const response = await api.post('/api/live', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
+        ...deadlineHeader,
       },
     });
     return response.data;
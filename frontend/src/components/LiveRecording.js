@@ -2,6 +2,9 @@ import React, { useState, useRef } from 'react';
 import './LiveRecording.css';
 import { startLiveRecording } from '../api';
 
+// Length of each recorded chunk sent to the server's live session
+const CHUNK_MS = 5000;
+
 const LiveRecording = ({ setRawTranscript: setParentRaw, setCorrectedTranscript: setParentCorrected, setDetectedLanguage: setParentLanguage, setTranslatedText: setParentTranslation }) => {
   const [isRecording, setIsRecording] = useState(false);
   const [transcript, setTranscript] = useState('');
@@ -13,7 +16,10 @@ const LiveRecording = ({ setRawTranscript: setParentRaw, setCorrectedTranscript:
   const [error, setError] = useState('');
   const [isProcessing, setIsProcessing] = useState(false);
   const mediaRecorderRef = useRef(null);
-  const chunksRef = useRef([]);
+  const sessionIdRef = useRef(null);
+  const stoppingRef = useRef(false);
+  const sendQueueRef = useRef(Promise.resolve());
+  const chunkTimerRef = useRef(null);
 
   // Supported languages (same as AudioUpload)
   const languages = [
@@ -53,24 +59,11 @@ const LiveRecording = ({ setRawTranscript: setParentRaw, setCorrectedTranscript:
   const startRecording = async () => {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-      mediaRecorderRef.current = new MediaRecorder(stream);
-      chunksRef.current = [];
-
-      mediaRecorderRef.current.ondataavailable = (e) => {
-        if (e.data.size > 0) {
-          chunksRef.current.push(e.data);
-        }
-      };
-
-      mediaRecorderRef.current.onstop = async () => {
-        const audioBlob = new Blob(chunksRef.current, { type: 'audio/webm' });
-        await sendAudioToServer(audioBlob);
-        
-        // Stop all tracks
-        stream.getTracks().forEach(track => track.stop());
-      };
+      sessionIdRef.current = null;
+      stoppingRef.current = false;
+      sendQueueRef.current = Promise.resolve();
+      recordChunk(stream);
 
-      mediaRecorderRef.current.start();
       setIsRecording(true);
       setError('');
       setTranscript('');
@@ -82,17 +75,65 @@ const LiveRecording = ({ setRawTranscript: setParentRaw, setCorrectedTranscript:
     }
   };
 
+  // Record CHUNK_MS of audio as a standalone file, then start the next one.
+  // Each chunk goes to the server's live session as soon as it is done, so
+  // the transcript grows while recording. The next recorder starts before
+  // the current one stops, so no audio is lost between chunks.
+  const recordChunk = (stream) => {
+    const recorder = new MediaRecorder(stream);
+    const chunks = [];
+
+    recorder.ondataavailable = (e) => {
+      if (e.data.size > 0) {
+        chunks.push(e.data);
+      }
+    };
+
+    recorder.onstop = () => {
+      // Only the recorder running when the user stopped sends the final chunk
+      const final = stoppingRef.current && mediaRecorderRef.current === recorder;
+      if (final) {
+        // Stop all tracks
+        stream.getTracks().forEach(track => track.stop());
+      }
+      const audioBlob = new Blob(chunks, { type: 'audio/webm' });
+      // Send chunks one at a time, in order
+      sendQueueRef.current = sendQueueRef.current.then(() => sendChunkToServer(audioBlob, final));
+    };
+
+    mediaRecorderRef.current = recorder;
+    recorder.start();
+    chunkTimerRef.current = setTimeout(() => {
+      if (recorder.state === 'recording' && !stoppingRef.current) {
+        recordChunk(stream);
+        recorder.stop();
+      }
+    }, CHUNK_MS);
+  };
+
   const stopRecording = () => {
     if (mediaRecorderRef.current && isRecording) {
+      stoppingRef.current = true;
+      clearTimeout(chunkTimerRef.current);
       mediaRecorderRef.current.stop();
       setIsRecording(false);
     }
   };
 
-  const sendAudioToServer = async (audioBlob) => {
-    setIsProcessing(true);
+  const sendChunkToServer = async (audioBlob, final) => {
+    if (final) {
+      setIsProcessing(true);
+    }
     const formData = new FormData();
     formData.append('audio', audioBlob, 'recording.webm');
+    if (sessionIdRef.current) {
+      formData.append('session_id', sessionIdRef.current);
+    } else {
+      formData.append('session', '1');
+    }
+    if (final) {
+      formData.append('final', '1');
+    }
     
     // Add language preference if not auto-detect
     if (selectedLanguage !== 'auto') {
@@ -103,18 +144,22 @@ const LiveRecording = ({ setRawTranscript: setParentRaw, setCorrectedTranscript:
       const data = await startLiveRecording(formData);
 
       if (data.success) {
-        // Set transcript locally for display
-        setTranscript(data.corrected_text || data.text);
+        sessionIdRef.current = data.session_id;
+        // Set transcript locally for display (final and tentative text while recording)
+        setTranscript(final ? (data.corrected_text || data.text) : data.text);
         setDetectedLanguage(data.language);
-        setLanguageName(data.language_name);
-        setConfidence(data.confidence);
         setSegments(data.segments || []);
         
-        // Update parent state with both raw and corrected
-        if (setParentRaw) setParentRaw(data.raw_text || data.text);
-        if (setParentCorrected) setParentCorrected(data.corrected_text || data.text);
-        if (setParentLanguage) setParentLanguage(data.language);
-        if (setParentTranslation) setParentTranslation('');
+        if (final) {
+          setLanguageName(data.language_name);
+          setConfidence(data.confidence);
+          
+          // Update parent state with both raw and corrected
+          if (setParentRaw) setParentRaw(data.raw_text || data.text);
+          if (setParentCorrected) setParentCorrected(data.corrected_text || data.text);
+          if (setParentLanguage) setParentLanguage(data.language);
+          if (setParentTranslation) setParentTranslation('');
+        }
       } else {
         setError(data.error || 'Failed to transcribe recording');
       }
@@ -122,7 +167,9 @@ const LiveRecording = ({ setRawTranscript: setParentRaw, setCorrectedTranscript:
       setError(err.error || 'Failed to connect to the server. Make sure the backend is running.');
       console.error('Upload error:', err);
     } finally {
-      setIsProcessing(false);
+      if (final) {
+        setIsProcessing(false);
+      }
     }
   };
 
@@ -182,7 +229,7 @@ const LiveRecording = ({ setRawTranscript: setParentRaw, setCorrectedTranscript:
       {transcript && (
         <div className="transcription-result">
           <div className="result-header">
-            <h3>✅ Transcription Complete</h3>
+            <h3>{isRecording ? '🔴 Transcribing...' : '✅ Transcription Complete'}</h3>
             <div className="result-info">
               {languageName && (
                 <span className="language-badge">